@@ -0,0 +1 @@
+"""Benchmarks of rationalbreaks and its streamlit front end, run with python -m benchmarks.<name>"""
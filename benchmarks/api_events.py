@@ -0,0 +1,125 @@
+"""
+Fan-out of the timer event stream (GET /timers/<id>/events of rationalbreaks.api).
+Starts the server in a subprocess unless --port points to a running one, subscribes
+--subscribers connections to one timer, then drives --rounds transitions of that timer
+(start, then ratio changes: short rests would add rest_consumed events in between).
+For each one it measures how long it takes until every subscriber received the event,
+and it reads the server CPU from /stats.
+
+    python -m benchmarks.api_events --subscribers 5000 --rounds 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+from time import perf_counter
+from typing import Optional
+
+from benchmarks.api_load import HOST, _request, _start_server
+from rationalbreaks.api import DEFAULT_PORT
+
+TIMER_ID = "fan-out"
+
+
+class _Subscriber(asyncio.Protocol):
+    """Counts the events received, an event ends with an empty line"""
+    def __init__(self, counter: "_Counter"):
+        self._counter = counter
+        self._last = b""
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        transport.write(_request("GET", f"/timers/{TIMER_ID}/events"))
+
+    def data_received(self, data: bytes) -> None:
+        events = data.count(b"\n\n") + (self._last == b"\n" and data[:1] == b"\n")
+        self._last = data[-1:]
+        self._counter.add(events)
+
+
+class _Counter:
+    def __init__(self):
+        self.received = 0
+        self.target = 0
+        self.reached = asyncio.Event()
+
+    def add(self, events: int) -> None:
+        self.received += events
+        if self.received >= self.target:
+            self.reached.set()
+
+    async def wait_for(self, target: int) -> None:
+        self.target = target
+        self.reached.clear()
+        if self.received >= target:
+            return
+        await self.reached.wait()
+
+
+async def _server_cpu(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> float:
+    writer.write(_request("GET", "/stats"))
+    return json.loads(await _read_body(reader))["cpu_seconds"]
+
+
+async def _read_body(reader: asyncio.StreamReader) -> bytes:
+    head = await reader.readuntil(b"\r\n\r\n")
+    length_start = head.index(b"Content-Length: ") + 16
+    return await reader.readexactly(int(head[length_start:head.index(b"\r\n", length_start)]))
+
+
+async def _measure(port: int, subscribers: int, rounds: int) -> dict:
+    loop = asyncio.get_running_loop()
+    counter = _Counter()
+    connections = []
+    for _ in range(subscribers):
+        transport, _ = await loop.create_connection(lambda: _Subscriber(counter), HOST, port)
+        connections.append(transport)
+    await counter.wait_for(subscribers)  # snapshot events, once subscribed
+
+    reader, writer = await asyncio.open_connection(HOST, port)
+    cpu_before = await _server_cpu(reader, writer)
+    requests = [_request("POST", f"/timers/{TIMER_ID}/start")] \
+        + [_request("POST", f"/timers/{TIMER_ID}/ratio", json.dumps({"ratio": 2 + round_number % 2}).encode())
+           for round_number in range(1, rounds)]
+    latencies = []
+    for round_number, request in enumerate(requests, start=2):
+        start = perf_counter()
+        writer.write(request)
+        await counter.wait_for(subscribers * round_number)
+        latencies.append(perf_counter() - start)
+        await _read_body(reader)
+    cpu_seconds = await _server_cpu(reader, writer) - cpu_before
+    writer.close()
+    for transport in connections:
+        transport.close()
+    return {"median_fan_out_ms": statistics.median(latencies) * 1000,
+            "max_fan_out_ms": max(latencies) * 1000,
+            "server_cpu_us_per_delivery": cpu_seconds * 1e6 / (subscribers * rounds)}
+
+
+def run(subscribers: int, rounds: int, port: Optional[int] = None) -> dict:
+    server = None
+    if port is None:
+        port = DEFAULT_PORT + 2
+        server = _start_server(port)
+    try:
+        return asyncio.run(_measure(port, subscribers, rounds))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--port", type=int, help="port of a running server, one is started otherwise")
+    args = parser.parse_args()
+    result = run(args.subscribers, args.rounds, args.port)
+    print(f"fan-out to {args.subscribers} subscribers, median {result['median_fan_out_ms']:.1f} ms, "
+          f"max {result['max_fan_out_ms']:.1f} ms")
+    print(f"server CPU per delivered event {result['server_cpu_us_per_delivery']:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
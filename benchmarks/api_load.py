@@ -0,0 +1,141 @@
+"""
+Load generator for the timer API (rationalbreaks.api).
+Starts the server in a subprocess (one core, timers in memory) unless --port points to a
+running one, then keeps --connections keep-alive connections per client process busy for
+--seconds. Every connection walks its own timer through start, rest, continue and reset,
+with a snapshot after each action. With --batch N, each request is a /batch of N operations.
+Server CPU is read from /stats before and after, so the rate is also given per server core.
+
+    python -m benchmarks.api_load --processes 3 --connections 16 --seconds 5
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import subprocess
+import sys
+from time import monotonic, sleep
+from typing import Optional
+
+from rationalbreaks.api import DEFAULT_PORT
+
+HOST = "127.0.0.1"
+# request cycle of one connection, every action is allowed after the previous one
+CYCLE = (("POST", "start"), ("GET", None), ("POST", "rest"), ("GET", None),
+         ("POST", "continue"), ("GET", None), ("POST", "reset"), ("GET", None))
+
+
+def _request(method: str, target: str, body: bytes = b"") -> bytes:
+    return (f"{method} {target} HTTP/1.1\r\nHost: {HOST}\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+def _cycle_requests(timer_id: str, batch: int) -> list:
+    if not batch:
+        return [_request(method, f"/timers/{timer_id}" + (f"/{action}" if action else ""))
+                for method, action in CYCLE]
+    # batch: the same cycle over batch timers, one request per step
+    return [_request("POST", "/batch",
+                     json.dumps([{"timer": f"{timer_id}-{index}", "action": action or "snapshot"}
+                                 for index in range(batch)]).encode())
+            for _, action in CYCLE]
+
+
+async def _read_response(reader: asyncio.StreamReader) -> int:
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head[9:12])
+    length_start = head.index(b"Content-Length: ") + 16
+    await reader.readexactly(int(head[length_start:head.index(b"\r\n", length_start)]))
+    return status
+
+
+async def _connection(port: int, timer_id: str, batch: int, until: float, counts: dict) -> None:
+    reader, writer = await asyncio.open_connection(HOST, port)
+    requests = _cycle_requests(timer_id, batch)
+    step = 0
+    while monotonic() < until:
+        writer.write(requests[step])
+        status = await _read_response(reader)
+        counts["requests"] += 1
+        counts["errors"] += status != 200
+        step = (step + 1) % len(requests)
+    writer.close()
+
+
+def _client(port: int, process: int, connections: int, batch: int, until: float) -> dict:
+    counts = {"requests": 0, "errors": 0}
+
+    async def connect_all():
+        await asyncio.gather(*(_connection(port, f"load-{process}-{connection}", batch, until, counts)
+                               for connection in range(connections)))
+
+    asyncio.run(connect_all())
+    return counts
+
+
+def _server_cpu(port: int) -> float:
+    with socket.create_connection((HOST, port)) as connection:
+        connection.sendall(_request("GET", "/stats").replace(b"\r\n\r\n", b"\r\nConnection: close\r\n\r\n"))
+        response = b""
+        while chunk := connection.recv(65536):
+            response += chunk
+    return json.loads(response.split(b"\r\n\r\n", 1)[1])["cpu_seconds"]
+
+
+def _start_server(port: int) -> subprocess.Popen:
+    # pylint: disable-next=consider-using-with  # the caller stops it
+    server = subprocess.Popen([sys.executable, "-m", "rationalbreaks.api", "--port", str(port)],
+                              stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection((HOST, port)).close()
+            return server
+        except OSError:
+            sleep(0.05)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def run(processes: int, connections: int, seconds: float, batch: int = 0, port: Optional[int] = None) -> dict:
+    server = None
+    if port is None:
+        port = DEFAULT_PORT + 1
+        server = _start_server(port)
+    try:
+        cpu_before = _server_cpu(port)
+        until = monotonic() + seconds
+        with multiprocessing.Pool(processes) as pool:
+            counts = pool.starmap(_client, [(port, process, connections, batch, until)
+                                            for process in range(processes)])
+        cpu_seconds = _server_cpu(port) - cpu_before
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    requests = sum(count["requests"] for count in counts)
+    return {"requests_per_second": requests / seconds,
+            "operations_per_second": requests * max(batch, 1) / seconds,
+            "errors": sum(count["errors"] for count in counts),
+            "server_cpu_share": cpu_seconds / seconds,
+            "requests_per_cpu_second": requests / cpu_seconds if cpu_seconds else 0.0}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=3, help="client processes")
+    parser.add_argument("--connections", type=int, default=16, help="keep-alive connections per client process")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--batch", type=int, default=0, help="operations per /batch request, 0 for single requests")
+    parser.add_argument("--port", type=int, help="port of a running server, one is started otherwise")
+    args = parser.parse_args()
+    result = run(args.processes, args.connections, args.seconds, args.batch, args.port)
+    print(f"requests/s            {result['requests_per_second']:10.0f}")
+    if args.batch:
+        print(f"timer operations/s    {result['operations_per_second']:10.0f}")
+    print(f"errors                {result['errors']:10d}")
+    print(f"server CPU (cores)    {result['server_cpu_share']:10.2f}")
+    print(f"requests/server CPU s {result['requests_per_cpu_second']:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
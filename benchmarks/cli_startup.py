@@ -0,0 +1,61 @@
+"""
+Cold start of the terminal front end (python -m rationalbreaks).
+Runs python -m rationalbreaks status --json against a temporary database --runs times and
+takes the fastest run, next to an interpreter doing nothing (python -c pass), which is the
+floor no module can go below. -X importtime of the same command gives the time spent in the
+imports after the interpreter's own startup, and every module imported.
+Exits with status 1 when the start takes longer than --budget-ms. tests/test_cli.py only checks
+the modules imported, timings of a loaded test machine say too little about the code.
+
+    python -m benchmarks.cli_startup --runs 10
+"""
+import argparse
+import subprocess
+import sys
+from os import path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from benchmarks.import_time import ROOT, importtime
+
+BUDGET_MS = 100
+
+
+def _fastest_ms(command: list, runs: int) -> float:
+    fastest = None
+    for _ in range(runs):
+        start = perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        elapsed = perf_counter() - start
+        fastest = elapsed if fastest is None else min(fastest, elapsed)
+    return fastest * 1000
+
+
+def run(runs: int = 10) -> dict:
+    with TemporaryDirectory() as directory:
+        command = [sys.executable, "-m", "rationalbreaks", "--db", path.join(directory, "events.sqlite3"),
+                   "status", "--json"]
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)  # creates the database
+        result = {"interpreter_ms": _fastest_ms([sys.executable, "-c", "pass"], runs),
+                  "startup_ms": _fastest_ms(command, runs)}
+        result.update(importtime(command[1:]))
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    args = parser.parse_args()
+    result = run(args.runs)
+    print(f"python -c pass                      {result['interpreter_ms']:7.1f} ms")
+    print(f"python -m rationalbreaks status     {result['startup_ms']:7.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print("imports after site (-X importtime, slower than without):")
+    for name, milliseconds, level in result["imports"]:
+        print(f"{'    ' * (level + 1)}{name:<{34 - 4 * level}} {milliseconds:7.1f} ms")
+    if result["startup_ms"] > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
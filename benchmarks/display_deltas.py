@@ -0,0 +1,62 @@
+"""
+Metric updates (websocket deltas) per minute of the server side clock, display_timers.
+One minute of each state is simulated on a VirtualClock, sleeps advance it instantly.
+The previous loop sent both metrics on every tick, 2 * 60 * update_per_sec per minute.
+
+    python -m benchmarks.display_deltas --ratio 3 --update-per-sec 10
+"""
+import argparse
+from unittest.mock import MagicMock, patch
+
+from benchmarks.hot_paths import timer_in
+from frontend import st_front_objects
+from rationalbreaks.clocks import NS_PER_SECOND, VirtualClock
+from rationalbreaks.formatting import Precision
+
+SIMULATED_SECONDS = 60
+
+
+class _MinuteOver(Exception):
+    pass
+
+
+def deltas_per_minute(status: str, precision: Precision, ratio: float, update_per_sec: int) -> tuple:
+    """:return: (metric updates, wake ups) in one simulated minute"""
+    clock = VirtualClock()
+    timer = timer_in(status, clock, ratio)  # half an hour of work, so there is rest to count down
+    end = clock.now_ns() + SIMULATED_SECONDS * NS_PER_SECOND
+    wake_ups = 0
+
+    def virtual_sleep(seconds: float) -> None:
+        nonlocal wake_ups
+        wake_ups += 1
+        clock.advance(seconds)
+        if clock.now_ns() >= end:
+            raise _MinuteOver
+
+    work_display, rest_display = MagicMock(), MagicMock()
+    with patch.object(st_front_objects, "sleep", virtual_sleep), \
+            patch.object(st_front_objects.st, "session_state", {"status": status}):
+        try:
+            st_front_objects.display_timers(timer, work_display, rest_display, update_per_sec=update_per_sec,
+                                            precision=precision, clock=clock)
+        except _MinuteOver:
+            pass
+    return work_display.metric.call_count + rest_display.metric.call_count, wake_ups
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ratio", type=float, default=3)
+    parser.add_argument("--update-per-sec", type=int, default=10)
+    args = parser.parse_args()
+    before = 2 * SIMULATED_SECONDS * args.update_per_sec
+    print(f"{'status':<13}{'precision':<14}{'deltas/min':>11}{'before':>8}{'wake ups/min':>14}")
+    for status in ("Not started", "Working", "Resting"):
+        for precision in Precision:
+            deltas, wake_ups = deltas_per_minute(status, precision, args.ratio, args.update_per_sec)
+            print(f"{status:<13}{precision.name.lower():<14}{deltas:>11}{before:>8}{wake_ups:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Micro-benchmarks of the timer hot paths, with JSON baselines and a regression gate.
+Each case is timed in batches sized to take about --seconds, for --rounds rounds, and reported
+in operations per second (median). Timers run on a VirtualClock, half an hour into work (and
+one minute into a rest for Resting), so every call takes the same path each time.
+The display tick is one iteration of frontend.st_front_objects.display_timers (centiseconds,
+so every tick sends both metrics to a display stub), with sleeps advancing the virtual clock.
+
+The speed of a shared machine drifts by a third within seconds, far more than the regressions
+to catch. So every batch is timed right after a batch of a fixed pure Python workload, and the
+gate compares the ratio of both ("relative", median of the rounds), which cancels the drift.
+
+    python -m benchmarks.hot_paths --save       # writes benchmarks/baselines/hot_paths.json
+    python -m benchmarks.hot_paths --compare    # exit status 1 if a case lost more than --max-regression %
+
+Baselines only compare on the machine and Python version they were recorded with.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+from datetime import timedelta
+from os import makedirs, path
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+from unittest.mock import patch
+
+from rationalbreaks.clocks import VirtualClock
+from rationalbreaks.formatting import Precision
+from rationalbreaks.scheduler import DeadlineScheduler
+from rationalbreaks.timers import RatioNalTimer, SimpleTime
+
+BASELINE_PATH = path.join(path.dirname(path.abspath(__file__)), "baselines", "hot_paths.json")
+MAX_REGRESSION_PERCENT = 15
+STATUSES = ("Not started", "Working", "Resting")
+
+
+def timer_in(status: str, clock: VirtualClock, ratio: float = 3,
+             scheduler: Optional[DeadlineScheduler] = None) -> RatioNalTimer:
+    """Timer in status on clock, half an hour into work (and one minute into a rest for Resting)"""
+    timer = RatioNalTimer(ratio=ratio, clock=clock, scheduler=scheduler)
+    if status != "Not started":
+        timer.start()
+        clock.advance(30 * 60)
+    if status == "Resting":
+        timer.rest()
+        clock.advance(60)
+    return timer
+
+
+def _calls(function: Callable[[], object]) -> Callable[[int], float]:
+    """Times number calls of function, the loop is unrolled by ten to keep its own cost low"""
+    def timed(number: int) -> float:
+        tens = range(max(number // 10, 1))
+        start = perf_counter()
+        for _ in tens:
+            function(); function(); function(); function(); function()  # pylint: disable=multiple-statements
+            function(); function(); function(); function(); function()  # pylint: disable=multiple-statements
+        return perf_counter() - start
+    return timed
+
+
+class _Display:
+    """Stands in for an st.empty() placeholder"""
+    def metric(self, label: str, value: str) -> None:
+        pass
+
+
+class _TicksDone(Exception):
+    pass
+
+
+def display_ticks(status: str) -> Callable[[int], float]:
+    from frontend import st_front_objects  # imports streamlit, only for this case
+
+    def timed(number: int) -> float:
+        clock = VirtualClock()
+        timer = timer_in(status, clock)
+        ticks = 0
+
+        def virtual_sleep(seconds: float) -> None:
+            nonlocal ticks
+            ticks += 1
+            if ticks >= number:
+                raise _TicksDone
+            clock.advance(seconds)
+
+        with patch.object(st_front_objects, "sleep", virtual_sleep), \
+                patch.object(st_front_objects.st, "session_state", {"status": status}):
+            start = perf_counter()
+            try:
+                st_front_objects.display_timers(timer, _Display(), _Display(), precision=Precision.CENTISECONDS,
+                                                clock=clock)
+            except _TicksDone:
+                pass
+            return perf_counter() - start
+    return timed
+
+
+def cases() -> Dict[str, Callable[[int], float]]:
+    """Case name -> function timing that many operations, in seconds"""
+    timed = {}
+    for status in STATUSES:
+        timer = timer_in(status, VirtualClock())
+        timed[f"work_and_rest_time[{status}]"] = _calls(timer.work_and_rest_time)
+        timed[f"rest_time[{status}]"] = _calls(timer.rest_time)
+        timed[f"snapshot[{status}]"] = _calls(timer.snapshot)
+    resting = timer_in("Resting", VirtualClock())
+    timed["all_rest_consumed[Resting]"] = _calls(resting.all_rest_consumed)
+    # with a scheduler the flag is set by the deadline instead of recalculated
+    scheduled = timer_in("Resting", VirtualClock(), scheduler=DeadlineScheduler(autostart=False))
+    timed["all_rest_consumed[Resting, scheduler]"] = _calls(scheduled.all_rest_consumed)
+    delta = timedelta(hours=1, minutes=2, seconds=3, microseconds=450_000)
+    timed["SimpleTime()"] = _calls(lambda: SimpleTime(delta))
+    # a new instance each time, str of the same one would only read its cached units
+    timed["str(SimpleTime())"] = _calls(lambda: str(SimpleTime(delta)))
+    for status in ("Working", "Resting"):
+        timed[f"display_timers tick[{status}]"] = display_ticks(status)
+    return timed
+
+
+def _calibration() -> int:
+    # dict, arithmetic and calls, the mix of the hot paths measured
+    values = {}
+    for key in range(16):
+        values[key] = key * 3 // 2
+    return sum(values.values())
+
+
+def _batch_size(timed: Callable[[int], float], seconds: float) -> int:
+    """Number of operations taking about seconds"""
+    number = 10
+    while (elapsed := timed(number)) < seconds / 10:
+        number *= 10
+    return max(round(number * seconds / elapsed), 10)
+
+
+def run(seconds: float = 0.05, rounds: int = 10, selected: Optional[List[str]] = None) -> Dict[str, dict]:
+    """:return: case -> {"ops_per_second": median, "relative": median of ops/s over calibration ops/s}"""
+    timed = {name: function for name, function in cases().items()
+             if not selected or any(pattern in name for pattern in selected)}
+    calibration = _calls(_calibration)
+    calibration_number = _batch_size(calibration, seconds)
+    numbers = {name: _batch_size(function, seconds) for name, function in timed.items()}
+    measured = {name: ([], []) for name in timed}
+    for _ in range(rounds):
+        for name, function in timed.items():
+            calibration_ops = calibration_number / calibration(calibration_number)
+            ops = numbers[name] / function(numbers[name])
+            measured[name][0].append(ops)
+            measured[name][1].append(ops / calibration_ops)
+    return {name: {"ops_per_second": statistics.median(ops), "relative": statistics.median(relative)}
+            for name, (ops, relative) in measured.items()}
+
+
+def environment() -> dict:
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "processor": platform.processor(), "node": platform.node()}
+
+
+def save(results: Dict[str, dict], baseline_path: str = BASELINE_PATH) -> None:
+    makedirs(path.dirname(baseline_path), exist_ok=True)
+    with open(baseline_path, "w", encoding="utf-8") as file:
+        json.dump({"environment": environment(), "cases": results}, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def load(baseline_path: str = BASELINE_PATH) -> dict:
+    with open(baseline_path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def change_percent(baseline: dict, result: dict) -> float:
+    """Change of the relative speed of a case, in percent"""
+    return (result["relative"] / baseline["relative"] - 1) * 100
+
+
+def compare(baseline: Dict[str, dict], results: Dict[str, dict],
+            max_regression: float = MAX_REGRESSION_PERCENT) -> Dict[str, float]:
+    """:return: case -> change in percent, of the cases slower than the baseline by more than max_regression %
+    Cases missing on either side are not compared."""
+    regressions = {}
+    for name, result in results.items():
+        if name in baseline:
+            change = change_percent(baseline[name], result)
+            if change < -max_regression:
+                regressions[name] = change
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cases", nargs="*", help="only the cases containing one of these")
+    parser.add_argument("--seconds", type=float, default=0.05, help="duration of one timed batch")
+    parser.add_argument("--rounds", type=int, default=10, help="batches per case, the median counts")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    mode.add_argument("--compare", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument("--max-regression", type=float, default=MAX_REGRESSION_PERCENT,
+                        help="percent of ops/sec a case may lose in --compare")
+    args = parser.parse_args()
+
+    baseline = load(args.baseline) if args.compare else None
+    if baseline is not None and baseline["environment"] != environment():
+        print(f"warning: baseline recorded on {baseline['environment']}", file=sys.stderr)
+    results = run(args.seconds, args.rounds, args.cases)
+    reference = baseline["cases"] if baseline is not None else {}
+    for name, result in results.items():
+        line = f"{name:<42}{result['ops_per_second']:>14,.0f} ops/s{result['relative']:>9.3f}"
+        if name in reference:
+            line += f"{change_percent(reference[name], result):+8.1f} %"
+        print(line)
+    if args.save:
+        save(results, args.baseline)
+        print(f"saved {args.baseline}")
+    if baseline is not None:
+        regressions = compare(reference, results, args.max_regression)
+        for name, change in regressions.items():
+            print(f"REGRESSION {name}: {change:+.1f} % (max -{args.max_regression:g} %)", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
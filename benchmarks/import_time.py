@@ -0,0 +1,77 @@
+"""
+Import time of the rationalbreaks core and of each module loaded on demand.
+Every import runs in a fresh interpreter with -X importtime, the time counted is everything
+imported after the interpreter's own startup (site), median of --runs. The core is what
+import rationalbreaks loads, each lazy module is shown as what it adds to it.
+Exits with status 1 when the core grows past CORE_BUDGET_MS. tests/test_imports.py fails when
+the core imports a module outside of it, or grows past TEST_BUDGET_MS, a margin over the budget
+that a loaded CI machine stays within.
+
+    python -m benchmarks.import_time --runs 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from os import path
+
+CORE_BUDGET_MS = 20
+TEST_BUDGET_MS = 4 * CORE_BUDGET_MS
+# what import rationalbreaks may load from the package, numpy, asyncio and sqlite3 stay out
+CORE_MODULES = {"rationalbreaks", "rationalbreaks.clocks", "rationalbreaks.formatting", "rationalbreaks.history",
+                "rationalbreaks.scheduler", "rationalbreaks.timers"}
+LAZY_MODULES = ("eventlog", "registry", "sounds", "cli", "events", "metrics", "api", "batch")
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+
+def importtime(python_args: list) -> dict:
+    """Runs python -X importtime with python_args.
+    :return: total ms imported after site, imports down to the second level as (name, ms, level),
+             every module imported after site
+    """
+    stderr = subprocess.run([sys.executable, "-X", "importtime"] + python_args, cwd=ROOT, check=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+    imports, modules, after_site, total_us = [], set(), False, 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if after_site:
+            modules.add(name.strip())
+            level = (len(name) - len(name.lstrip()) - 1) // 2  # one space, then two per level
+            total_us += int(cumulative) if level == 0 else 0
+            if level <= 2:
+                imports.append((name.strip(), int(cumulative) / 1000, level))
+        after_site = after_site or name.strip() == "site"
+    # importtime prints a module after its own imports
+    imports.reverse()
+    return {"total_ms": total_us / 1000, "imports": imports, "modules": modules}
+
+
+def core_ms(runs: int = 5) -> (float, set):
+    """Median total of import rationalbreaks, and the modules it imported"""
+    measures = [importtime(["-c", "import rationalbreaks"]) for _ in range(runs)]
+    return statistics.median(measure["total_ms"] for measure in measures), measures[0]["modules"]
+
+
+def lazy_ms(module: str, runs: int = 5) -> float:
+    """Median total of import rationalbreaks.<module>, core included"""
+    return statistics.median(importtime(["-c", f"import rationalbreaks; import rationalbreaks.{module}"])["total_ms"]
+                             for _ in range(runs))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    core, modules = core_ms(args.runs)
+    print(f"import rationalbreaks          {core:7.1f} ms (budget {CORE_BUDGET_MS} ms)")
+    print(f"    package modules: {', '.join(sorted(name for name in modules if name.startswith('rationalbreaks')))}")
+    for module in LAZY_MODULES:
+        print(f"  + rationalbreaks.{module:<12} {lazy_ms(module, args.runs) - core:+7.1f} ms")
+    if core > CORE_BUDGET_MS:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Cost of the instrumentation (rationalbreaks.metrics) on the instrumented hot paths.
+Disabled, every instrumented spot is one `if metrics.enabled:` check. The check is timed on
+its own, over an empty loop, and multiplied by the checks each operation passes: that is the
+whole cost of the instrumentation while it is off, shown relative to the operation.
+Each operation is also timed with metrics disabled and enabled, batches of both alternating,
+fastest of --rounds (ns per operation).
+Exits with status 1 when the disabled instrumentation costs more than --budget-percent.
+
+    python -m benchmarks.metrics_overhead --rounds 20
+"""
+import argparse
+import sys
+from itertools import repeat
+from os import path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable, Dict
+from unittest.mock import patch
+
+from benchmarks.hot_paths import display_ticks
+from rationalbreaks import metrics
+from rationalbreaks.clocks import VirtualClock
+from rationalbreaks.eventlog import EventLog
+from rationalbreaks.timers import RatioNalTimer
+
+BUDGET_PERCENT = 1.0
+# `if metrics.enabled:` checks passed by one operation, display_timers has one and a local None check
+GUARDS = {"display_timers tick[Working]": 2, "display_timers tick[Resting]": 2, "transition start+reset": 2}
+
+
+def guard_ns(number: int = 1_000_000, rounds: int = 5) -> float:
+    """ns of one disabled `if metrics.enabled:`, fastest of rounds"""
+    def guarded() -> float:
+        start = perf_counter()
+        for _ in repeat(None, number):
+            if metrics.enabled:
+                pass
+        return perf_counter() - start
+
+    def empty() -> float:
+        start = perf_counter()
+        for _ in repeat(None, number):
+            pass
+        return perf_counter() - start
+
+    metrics.disable()
+    return max(min(guarded() for _ in range(rounds)) - min(empty() for _ in range(rounds)), 0) / number * 1e9
+
+
+def _transitions() -> Callable[[int], float]:
+    from frontend import st_front_objects  # imports streamlit, only for this case
+
+    # logged, as in the app
+    directory = TemporaryDirectory()  # pylint: disable=consider-using-with
+    event_log = EventLog(path.join(directory.name, "events.sqlite3"))
+    control = st_front_objects.StatusControl(RatioNalTimer(clock=VirtualClock()), log=event_log,
+                                             timer_id="benchmark")
+    state = {"status": "Not started", "alert": {"play_sound": True, "muted": False}}
+
+    def timed(number: int) -> float:
+        with patch.object(st_front_objects.st, "session_state", state):
+            start = perf_counter()
+            for _ in repeat(None, number):
+                control.transition("start")
+                control.transition("reset")
+            return perf_counter() - start
+    timed.directory = directory  # removed with the function
+    return timed
+
+
+def cases() -> Dict[str, Callable[[int], float]]:
+    return {"display_timers tick[Working]": display_ticks("Working"),
+            "display_timers tick[Resting]": display_ticks("Resting"),
+            "transition start+reset": _transitions()}
+
+
+def _batch_ns(timed: Callable[[int], float], number: int, enabled: bool) -> float:
+    if enabled:
+        metrics.enable()
+    else:
+        metrics.disable()
+    try:
+        return timed(number) / number * 1e9
+    finally:
+        metrics.disable()
+
+
+def run(seconds: float = 0.05, rounds: int = 10) -> dict:
+    """:return: guard ns, and per case: disabled and enabled ns per operation,
+    disabled_percent (estimated cost of the disabled checks) and enabled_percent"""
+    check_ns = guard_ns()
+    results = {}
+    for name, timed in cases().items():
+        number = max(round(seconds / (_batch_ns(timed, 100, False) / 1e9)), 10)
+        disabled, enabled = [], []
+        for _ in range(rounds):
+            disabled.append(_batch_ns(timed, number, False))
+            enabled.append(_batch_ns(timed, number, True))
+        disabled_ns, enabled_ns = min(disabled), min(enabled)
+        results[name] = {"disabled_ns": disabled_ns, "enabled_ns": enabled_ns,
+                         "disabled_percent": GUARDS[name] * check_ns / disabled_ns * 100,
+                         "enabled_percent": (enabled_ns / disabled_ns - 1) * 100}
+    return {"guard_ns": check_ns, "cases": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=0.05, help="duration of one timed batch")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--budget-percent", type=float, default=BUDGET_PERCENT)
+    args = parser.parse_args()
+    result = run(args.seconds, args.rounds)
+    print(f"if metrics.enabled (disabled)  {result['guard_ns']:8.1f} ns")
+    print(f"{'':<30}{'disabled':>12}{'enabled':>12}{'off cost':>10}{'on cost':>10}")
+    over = False
+    for name, case in result["cases"].items():
+        print(f"{name:<30}{case['disabled_ns']:>9.0f} ns{case['enabled_ns']:>9.0f} ns"
+              f"{case['disabled_percent']:>9.2f}%{case['enabled_percent']:>+9.1f}%")
+        over = over or case["disabled_percent"] > args.budget_percent
+    if over:
+        print(f"disabled instrumentation over {args.budget_percent:g} %", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Server CPU per session of the server side clock (display_timers) by page activity.
+Every session runs its loop in its own thread on the real clock, as script threads do.
+After a warm up second, the process CPU time spent while they run is divided by
+sessions and seconds.
+
+    python -m benchmarks.parked_sessions --sessions 50 --seconds 5
+"""
+import argparse
+import threading
+from time import process_time_ns, sleep
+from unittest.mock import patch
+
+from frontend import st_front_objects
+from rationalbreaks.timers import RatioNalTimer
+
+PAGES = {"visible": {"visible": True, "idle": False},
+         "idle": {"visible": True, "idle": True},
+         "hidden": {"visible": False, "idle": False}}
+
+
+class _Stopped(Exception):
+    pass
+
+
+class _Display:
+    """Stands in for st.empty(), counts the metrics sent"""
+    def __init__(self):
+        self.sent = 0
+
+    def metric(self, _label: str, _value: str) -> None:
+        self.sent += 1
+
+
+def cpu_per_session(page: dict, sessions: int, seconds: float) -> float:
+    """:return: CPU microseconds per session and second"""
+    stop = threading.Event()
+
+    def interruptible_sleep(duration: float) -> None:
+        if stop.wait(duration):
+            raise _Stopped  # as a rerun would, at the next yield point
+
+    def session_loop() -> None:
+        timer = RatioNalTimer()
+        timer.start()
+        try:
+            st_front_objects.display_timers(timer, _Display(), _Display(), page=page)
+        except _Stopped:
+            pass
+
+    with patch.object(st_front_objects, "sleep", interruptible_sleep), \
+            patch.object(st_front_objects.st, "session_state", {"status": "Working"}):
+        threads = [threading.Thread(target=session_loop) for _ in range(sessions)]
+        for thread in threads:
+            thread.start()
+        sleep(1)  # thread start and first render are not counted
+        start = process_time_ns()
+        sleep(seconds)
+        cpu_ns = process_time_ns() - start
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return cpu_ns / 1000 / sessions / seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+    for name, page in PAGES.items():
+        cpu_us = cpu_per_session(page, args.sessions, args.seconds)
+        print(f"{name:<9}{cpu_us:10.1f} us CPU per session and second")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+"""
+Load test of the web app: one Streamlit server, --sessions simulated browser tabs.
+The server (streamlit run streamlit_ui.py, headless, on a temporary event log and cache) is started in
+a subprocess. Every session speaks the websocket protocol of the Streamlit frontend as far as
+this app needs it: script reruns carrying the widget values kept so far, button clicks (scoped
+to their fragment when they are in one), the periodic reruns of fragments with run_every, and
+the values the components send back: the clock reporting the end of the rest, the alarm muted
+by the user, the page hidden or shown.
+
+Every session follows its own seeded schedule: start, work, rest, sometimes past the end of
+the rest so the alarm rings (and is muted, or not), continue, ... Sessions connect spread over
+--ramp-up seconds, the following --seconds are measured:
+  - server CPU per session, utime + stime of the server process (/proc)
+  - websocket bytes and messages per session and minute, both ways, frame headers included
+  - script runs per interaction (clicks, mutes, tab switches), next to the runs the app asks
+    for itself (clock resyncs, the end of a rest)
+  - click latency, from the click to the next status button
+  - with --clock server, lateness of the clock ticks: how much later than the most punctual
+    tick of the same working stretch each worked time arrives (10 ms resolution)
+
+Everything runs on the real clock: script threads, the rest scheduler and the websockets all
+sleep on it, so the schedules are short by default (--work, --rest). Linux only, for /proc.
+
+    python -m benchmarks.session_load --sessions 50 --seconds 60
+    python -m benchmarks.session_load --sessions 50 --seconds 60 --clock server --hidden 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from time import monotonic, sleep, time
+from typing import Dict, List, Optional, Tuple
+from urllib.request import urlopen
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from tornado.websocket import websocket_connect
+
+from benchmarks.import_time import ROOT
+
+HOST = "127.0.0.1"
+APP_FILE = "streamlit_ui.py"
+STATUS_LABELS = ("Start", "Rest", "Continue")
+# why a script run was requested, user interactions first
+INTERACTIONS = ("click", "mute", "tab")
+CAUSES = INTERACTIONS + ("load", "resync", "rest over")
+# seconds a user takes to read the page before clicking
+THINK_SECONDS = (1.0, 3.0)
+
+
+def frame_bytes(payload: int, masked: bool) -> int:
+    """Size of a websocket frame on the wire, frames of clients are masked"""
+    header = 2 if payload < 126 else 4 if payload < 65536 else 10
+    return payload + header + (4 if masked else 0)
+
+
+def clock_seconds(text: str) -> float:
+    """Seconds shown by a clock metric at centisecond precision (the default), [HH:]MM:SS:cc"""
+    return sum(int(part) * unit for part, unit in zip(reversed(text.split(":")), (0.01, 1, 60, 3600)))
+
+
+def tick_lateness(ticks: List[Tuple[int, float, float]]) -> List[float]:
+    """:param ticks: (working stretch, arrival, seconds shown) of every worked time a session received
+    :return: ms each tick arrived later than the most punctual tick of its stretch"""
+    offsets = {}
+    for stretch, arrived, shown in ticks:
+        offsets.setdefault(stretch, []).append(arrived - shown)
+    return [(offset - min(stretch_offsets)) * 1000
+            for stretch_offsets in offsets.values() for offset in stretch_offsets]
+
+
+def percentiles(values: List[float], points: Tuple[int, ...] = (50, 90, 99)) -> Optional[Dict[int, float]]:
+    if len(values) < 2:
+        return {point: values[0] for point in points} if values else None
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {point: cuts[point - 1] for point in points}
+
+
+class SimulatedSession:
+    """One browser tab and its user.
+    :param behaviour: work and rest (min, max seconds), mute (share of alarms muted),
+                      hidden (True for a user switching to another tab between clicks)
+    :param window: {"open": bool}, shared by all sessions, counting only happens while it is open
+    """
+    def __init__(self, rng: random.Random, behaviour: dict, window: dict):
+        self.rng = rng
+        self.behaviour = behaviour
+        self.window = window
+        self.connection = None
+        self.reader: Optional[asyncio.Task] = None
+        self.query_string = ""
+        self.page_script_hash = ""
+        self.values: Dict[str, str] = {}  # widget id -> json value, the browser sends them with every rerun
+        self.buttons: Dict[str, Tuple[str, str]] = {}  # label -> (widget id, fragment id)
+        self.components: Dict[str, Tuple[str, str]] = {}  # component -> (widget id, fragment id)
+        self.status_label: Optional[str] = None
+        self.status_changed = asyncio.Event()
+        self.cause = "load"
+        self.auto_reruns: Dict[str, asyncio.Task] = {}
+        self.rest_report: Optional[asyncio.TimerHandle] = None
+        self.alarm: Optional[asyncio.TimerHandle] = None
+        self.ring = self.rung_ring = None
+        self.ringing = False
+        self.visible = True
+        self.clicked_at: Optional[float] = None
+        self.stretch = 0
+        self.stats = {"received_bytes": 0, "received_messages": 0, "sent_bytes": 0, "sent_messages": 0,
+                      "runs": dict.fromkeys(CAUSES, 0), "interactions": dict.fromkeys(INTERACTIONS, 0),
+                      "click_ms": [], "ticks": [], "errors": []}
+
+    async def connect(self, url: str) -> None:
+        self.connection = await websocket_connect(url, subprotocols=["streamlit"])
+        self.reader = asyncio.ensure_future(self._read())
+        self.send("load")
+
+    def close(self) -> None:
+        for task in (self.reader, *self.auto_reruns.values()):
+            if task is not None:
+                task.cancel()
+        for handle in (self.rest_report, self.alarm):
+            if handle is not None:
+                handle.cancel()
+        if self.connection is not None:
+            self.connection.close()
+
+    def send(self, cause: str, fragment_id: str = "", trigger: Optional[str] = None, auto: bool = False) -> None:
+        """Requests a script run, as the frontend does on every interaction"""
+        message = BackMsg()
+        state = message.rerun_script
+        state.query_string = self.query_string
+        state.page_script_hash = self.page_script_hash
+        state.fragment_id = fragment_id
+        state.is_auto_rerun = auto
+        for widget_id, value in self.values.items():
+            state.widget_states.widgets.add(id=widget_id, json_value=value)
+        if trigger is not None:
+            state.widget_states.widgets.add(id=trigger, trigger_value=True)
+        data = message.SerializeToString()
+        self.connection.write_message(data, binary=True)
+        self.cause = cause
+        if self.window["open"]:
+            self.stats["sent_bytes"] += frame_bytes(len(data), masked=True)
+            self.stats["sent_messages"] += 1
+            if cause in INTERACTIONS:
+                self.stats["interactions"][cause] += 1
+
+    def set_value(self, component: str, value, cause: str) -> None:
+        widget_id, fragment_id = self.components[component]
+        self.values[widget_id] = json.dumps(value)
+        self.send(cause, fragment_id)
+
+    async def _read(self) -> None:
+        while (data := await self.connection.read_message()) is not None:
+            if self.window["open"]:
+                self.stats["received_bytes"] += frame_bytes(len(data), masked=False)
+                self.stats["received_messages"] += 1
+            self.handle(ForwardMsg.FromString(data), monotonic())
+
+    def handle(self, message: ForwardMsg, received_at: float) -> None:
+        kind = message.WhichOneof("type")
+        if kind == "new_session":
+            self.page_script_hash = message.new_session.page_script_hash
+            if self.window["open"]:
+                self.stats["runs"][self.cause] += 1
+            if not message.new_session.fragment_ids_this_run:
+                # a full run registers its run_every fragments again
+                for task in self.auto_reruns.values():
+                    task.cancel()
+                self.auto_reruns.clear()
+        elif kind == "page_info_changed":
+            self.query_string = message.page_info_changed.query_string
+        elif kind == "auto_rerun":
+            self._auto_rerun(message.auto_rerun.interval, message.auto_rerun.fragment_id)
+        elif kind == "delta" and message.delta.WhichOneof("type") == "new_element":
+            self._element(message.delta.new_element, message.delta.fragment_id, received_at)
+
+    def _element(self, element, fragment_id: str, received_at: float) -> None:
+        kind = element.WhichOneof("type")
+        if kind == "button":
+            self.buttons[element.button.label] = (element.button.id, fragment_id)
+            if element.button.label in STATUS_LABELS and element.button.label != self.status_label:
+                if self.clicked_at is not None and self.window["open"]:
+                    self.stats["click_ms"].append((received_at - self.clicked_at) * 1000)
+                self.clicked_at = None
+                self.status_label = element.button.label
+                self.stretch += 1
+                self.status_changed.set()
+        elif kind == "metric" and element.metric.label == "Worked time" and self.status_label == "Rest":
+            if self.window["open"]:
+                self.stats["ticks"].append((self.stretch, received_at, clock_seconds(element.metric.body)))
+        elif kind == "component_instance":
+            name = element.component_instance.component_name.rsplit(".", 1)[-1]
+            self.components[name] = (element.component_instance.id, fragment_id)
+            args = json.loads(element.component_instance.json_args)
+            if name == "timer_clock":
+                self._render_clock(args)
+            elif name == "alarm_player":
+                self._render_alarm(args)
+        elif kind == "exception":
+            self.stats["errors"].append(element.exception.message)
+
+    def _auto_rerun(self, interval: float, fragment_id: str) -> None:
+        async def rerun():
+            while True:
+                await asyncio.sleep(interval)
+                self.send("resync", fragment_id, auto=True)
+
+        if fragment_id in self.auto_reruns:
+            self.auto_reruns[fragment_id].cancel()
+        self.auto_reruns[fragment_id] = asyncio.ensure_future(rerun())
+
+    # components/timer_clock: reports the time once the rest shown runs out
+    def _render_clock(self, args: dict) -> None:
+        if self.rest_report is not None:
+            self.rest_report.cancel()
+            self.rest_report = None
+        if args["status"] == "Resting" and args["rest"] > 0:
+            self.rest_report = asyncio.get_event_loop().call_later(
+                args["rest"], lambda: self.set_value("timer_clock", int(time() * 1000), "rest over"))
+
+    # components/alarm_player: rings when told to or when armed, each rest period once
+    def _render_alarm(self, args: dict) -> None:
+        self.ring = args["ring"]
+        if self.alarm is not None:
+            self.alarm.cancel()
+            self.alarm = None
+        if args["play"]:
+            self._start_ringing()
+        elif args["arm_in"] is not None:
+            self.alarm = asyncio.get_event_loop().call_later(args["arm_in"], self._start_ringing)
+        else:
+            self.ringing = False
+
+    def _start_ringing(self) -> None:
+        self.alarm = None
+        if self.rung_ring == self.ring:
+            return
+        self.rung_ring = self.ring
+        self.ringing = True
+        if self.rng.random() < self.behaviour["mute"]:
+            asyncio.get_event_loop().call_later(self.rng.uniform(*THINK_SECONDS), self._mute)
+
+    def _mute(self) -> None:
+        if self.ringing:
+            self.ringing = False
+            self.set_value("alarm_player", self.ring, "mute")
+
+    def _show(self, visible: bool) -> None:
+        self.visible = visible
+        self.set_value("page_activity", {"visible": visible, "idle": False}, "tab")
+
+    async def click(self, label: str) -> None:
+        widget_id, fragment_id = self.buttons[label]
+        self.status_changed.clear()
+        self.clicked_at = monotonic()
+        self.send("click", fragment_id, trigger=widget_id)
+        await self.status_changed.wait()
+
+    async def user(self, until: float) -> None:
+        """Start, work, rest, continue, ... until until (monotonic)"""
+        await self.status_changed.wait()  # page loaded
+        while True:
+            label = self.status_label
+            seconds = self.rng.uniform(*{"Start": THINK_SECONDS, "Rest": self.behaviour["work"],
+                                         "Continue": self.behaviour["rest"]}[label])
+            if monotonic() + seconds > until:
+                return
+            if self.behaviour["hidden"] and label != "Start":
+                self._show(False)
+            await asyncio.sleep(seconds)
+            if not self.visible:
+                self._show(True)
+                await asyncio.sleep(self.rng.uniform(*THINK_SECONDS))
+            await self.click(label)
+
+
+def process_cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat", encoding="ascii") as file:
+        fields = file.read().rsplit(")", 1)[1].split()
+    # utime and stime are fields 14 and 15 of stat, the split starts at field 3
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def process_rss_mib(pid: int) -> float:
+    with open(f"/proc/{pid}/status", encoding="ascii") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind((HOST, 0))
+        return probe.getsockname()[1]
+
+
+def _start_server(port: int, db_path: str, clock: str) -> subprocess.Popen:
+    # pylint: disable-next=consider-using-with  # the caller stops it
+    server = subprocess.Popen([sys.executable, "-m", "streamlit", "run", APP_FILE,
+                               "--server.headless", "true", "--server.address", HOST, "--server.port", str(port),
+                               "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+                              cwd=ROOT, env=dict(os.environ, RATIONALBREAKS_DB=db_path, RATIONALBREAKS_CLOCK=clock,
+                                                 RATIONALBREAKS_CACHE=os.path.join(os.path.dirname(db_path), "cache")),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(300):
+        try:
+            with urlopen(f"http://{HOST}:{port}/_stcore/health", timeout=1) as response:
+                if response.read() == b"ok":
+                    return server
+        except OSError:
+            sleep(0.1)
+    server.kill()
+    raise RuntimeError("streamlit did not start")
+
+
+async def _drive(url: str, pid: int, sessions: int, seconds: float, ramp_up: float,
+                 behaviour: dict, seed: int) -> dict:
+    window = {"open": False}
+    rng = random.Random(seed)
+    simulated = [SimulatedSession(random.Random(rng.random()),
+                                  dict(behaviour, hidden=rng.random() < behaviour["hidden"]), window)
+                 for _ in range(sessions)]
+
+    async def life(session: SimulatedSession, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await session.connect(url)
+        await session.user(until)
+
+    # the first page load imports what the app needs, the memory of a session is measured after it
+    warm_up = SimulatedSession(random.Random(seed), behaviour, {"open": False})
+    await warm_up.connect(url)
+    await warm_up.status_changed.wait()
+    warm_up.close()
+    rss_before = process_rss_mib(pid)
+    measure_from = monotonic() + ramp_up
+    until = measure_from + seconds
+    lives = [asyncio.ensure_future(life(session, rng.uniform(0, ramp_up))) for session in simulated]
+    await asyncio.sleep(measure_from - monotonic())
+    cpu_before, harness_before = process_cpu_seconds(pid), sum(os.times()[:2])
+    window["open"] = True
+    await asyncio.sleep(until - monotonic())
+    window["open"] = False
+    cpu, harness = process_cpu_seconds(pid) - cpu_before, sum(os.times()[:2]) - harness_before
+    rss = process_rss_mib(pid)
+    for task in lives:
+        task.cancel()
+    for session in simulated:
+        session.close()
+    return {"server_cpu_seconds": cpu, "harness_cpu_seconds": harness, "rss_before_mib": rss_before,
+            "rss_mib": rss, "stats": [session.stats for session in simulated]}
+
+
+def summarize(measured: dict, sessions: int, seconds: float) -> dict:
+    stats = measured["stats"]
+    per_session_minute = sessions * seconds / 60
+
+    def total(key: str) -> int:
+        return sum(session[key] for session in stats)
+
+    runs = {cause: sum(session["runs"][cause] for session in stats) for cause in CAUSES}
+    interactions = {kind: sum(session["interactions"][kind] for session in stats) for kind in INTERACTIONS}
+    errors = [error for session in stats for error in session["errors"]]
+    return {"server_cpu_ms_per_session_second": measured["server_cpu_seconds"] * 1000 / (sessions * seconds),
+            "server_cpu_share": measured["server_cpu_seconds"] / seconds,
+            "harness_cpu_share": measured["harness_cpu_seconds"] / seconds,
+            "rss_mib": measured["rss_mib"],
+            "rss_mib_per_session": (measured["rss_mib"] - measured["rss_before_mib"]) / sessions,
+            "received_bytes_per_session_minute": total("received_bytes") / per_session_minute,
+            "sent_bytes_per_session_minute": total("sent_bytes") / per_session_minute,
+            "received_messages_per_session_minute": total("received_messages") / per_session_minute,
+            "sent_messages_per_session_minute": total("sent_messages") / per_session_minute,
+            "interactions": interactions,
+            "runs": runs,
+            "runs_per_interaction": sum(runs[kind] for kind in INTERACTIONS) / max(sum(interactions.values()), 1),
+            "click_ms": percentiles([latency for session in stats for latency in session["click_ms"]]),
+            "tick_lateness_ms": percentiles([lateness for session in stats
+                                             for lateness in tick_lateness(session["ticks"])]),
+            "errors": errors}
+
+
+def run(sessions: int = 20, seconds: float = 60, ramp_up: float = 10, clock: str = "client",
+        work: Tuple[float, float] = (20, 60), rest: Tuple[float, float] = (5, 30),
+        mute: float = 0.7, hidden: float = 0.0, seed: int = 0) -> dict:
+    with TemporaryDirectory() as directory:
+        port = _free_port()
+        server = _start_server(port, os.path.join(directory, "events.sqlite3"), clock)
+        try:
+            measured = asyncio.run(_drive(f"ws://{HOST}:{port}/_stcore/stream", server.pid, sessions, seconds,
+                                          ramp_up, {"work": work, "rest": rest, "mute": mute, "hidden": hidden},
+                                          seed))
+        finally:
+            server.terminate()
+            server.wait()
+    return summarize(measured, sessions, seconds)
+
+
+def _milliseconds(values: Optional[Dict[int, float]]) -> str:
+    if values is None:
+        return "-"
+    return " / ".join(f"{value:.0f}" for value in values.values()) + " ms (p50 / p90 / p99)"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=60, help="measured, after the ramp up")
+    parser.add_argument("--ramp-up", type=float, default=10, help="sessions connect spread over these seconds")
+    parser.add_argument("--clock", choices=("client", "server"), default="client",
+                        help="where the clock ticks, the browser or the display_timers loop")
+    parser.add_argument("--work", type=float, nargs=2, default=(20, 60), metavar=("MIN", "MAX"),
+                        help="seconds worked before resting")
+    parser.add_argument("--rest", type=float, nargs=2, default=(5, 30), metavar=("MIN", "MAX"),
+                        help="seconds rested before continuing, longer than earned rings the alarm")
+    parser.add_argument("--mute", type=float, default=0.7, help="share of the alarms muted")
+    parser.add_argument("--hidden", type=float, default=0.0,
+                        help="share of the users switching to another tab between their clicks")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    result = run(args.sessions, args.seconds, args.ramp_up, args.clock, tuple(args.work), tuple(args.rest),
+                 args.mute, args.hidden, args.seed)
+
+    interactions, runs = result["interactions"], result["runs"]
+    print(f"{args.sessions} sessions, {args.clock} clock, {args.seconds:g} s measured")
+    print(f"server CPU per session        {result['server_cpu_ms_per_session_second']:8.2f} ms/s"
+          f"  ({result['server_cpu_share']:.2f} cores in total, harness {result['harness_cpu_share']:.2f})")
+    print(f"server memory                 {result['rss_mib']:8.1f} MiB  ({result['rss_mib_per_session']:+.2f} per session)")
+    print(f"websocket per session/minute  {result['received_bytes_per_session_minute'] / 1024:8.1f} KiB in "
+          f"({result['received_messages_per_session_minute']:.0f} messages), "
+          f"{result['sent_bytes_per_session_minute'] / 1024:.1f} KiB out "
+          f"({result['sent_messages_per_session_minute']:.0f} messages)")
+    print(f"script runs per interaction   {result['runs_per_interaction']:8.2f}  "
+          f"({', '.join(f'{count} {kind}' for kind, count in interactions.items())})")
+    print(f"other script runs             {', '.join(f'{runs[cause]} {cause}' for cause in CAUSES[len(INTERACTIONS):])}")
+    print(f"click latency                 {_milliseconds(result['click_ms'])}")
+    if args.clock == "server":
+        print(f"tick lateness                 {_milliseconds(result['tick_lateness_ms'])}")
+    if result["errors"]:
+        print(f"{len(result['errors'])} script errors, first: {result['errors'][0]}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Script CPU per interaction of streamlit_ui.py.
+The app is driven with AppTest. As in the browser, a widget inside a fragment gets a fragment
+scoped run and any other widget a full run. CPU time of the script thread is measured per run,
+which includes the widget callbacks. Run from the repository root on two commits to compare:
+
+    python -m benchmarks.ui_fragments --repeat 20
+"""
+# pylint: disable=protected-access  # patches the script runner of Streamlit, as the server uses it
+import argparse
+import inspect
+import os
+import statistics
+import tempfile
+from time import thread_time_ns
+from typing import Optional
+
+os.environ.setdefault("RATIONALBREAKS_DB", os.path.join(tempfile.mkdtemp(), "events.sqlite3"))
+
+# pylint: disable=wrong-import-position  # after the event log of the app is set
+from streamlit.runtime.fragment import MemoryFragmentStorage  # noqa: E402
+from streamlit.runtime.scriptrunner import script_runner  # noqa: E402
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache  # noqa: E402
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+from streamlit.testing.v1 import local_script_runner  # noqa: E402
+# pylint: enable=wrong-import-position
+
+APP_FILE = "streamlit_ui.py"
+
+# interaction -> (button label, fragment holding the button)
+INTERACTIONS = {"open settings": ("Settings", "settings_section"),
+                "hide settings": ("Hide settings", "settings_section"),
+                "open reset": ("Reset timers", "reset_section"),
+                "cancel reset": ("Cancel", "reset_section")}
+
+
+class _FragmentDriver:
+    """Patches AppTest's runner to keep fragments and compiled code between runs, as a server does,
+    and to run a single fragment"""
+    def __init__(self):
+        self.storage = MemoryFragmentStorage()
+        self.script_cache = ScriptCache()
+        self.fragment_id: Optional[str] = None
+        self.cpu_ns = []
+
+    def install(self) -> None:
+        driver = self
+        runner_init = local_script_runner.LocalScriptRunner.__init__
+        run_script = script_runner.ScriptRunner._run_script
+
+        def init(runner, *args, **kwargs):
+            runner_init(runner, *args, **kwargs)
+            runner._fragment_storage = driver.storage
+            runner._script_cache = driver.script_cache
+
+        def request_rerun(runner, rerun_data: RerunData) -> bool:
+            if driver.fragment_id is not None:
+                rerun_data = RerunData(widget_states=rerun_data.widget_states,
+                                       query_string=rerun_data.query_string,
+                                       fragment_id_queue=[driver.fragment_id],
+                                       is_fragment_scoped_rerun=True)
+            return script_runner.ScriptRunner.request_rerun(runner, rerun_data)
+
+        def timed_run_script(runner, rerun_data):
+            start = thread_time_ns()
+            try:
+                return run_script(runner, rerun_data)
+            finally:
+                driver.cpu_ns.append(thread_time_ns() - start)
+
+        local_script_runner.LocalScriptRunner.__init__ = init
+        local_script_runner.LocalScriptRunner.request_rerun = request_rerun
+        script_runner.ScriptRunner._run_script = timed_run_script
+
+    def fragment_of(self, function_name: str) -> Optional[str]:
+        for fragment_id, fragment in self.storage._fragments.items():
+            function = inspect.getclosurevars(fragment).nonlocals.get("non_optional_func")
+            if function is not None and function.__name__ == function_name:
+                return fragment_id
+        return None  # not a fragment (e.g. before fragments were introduced)
+
+
+def measure(repeat: int) -> dict:
+    driver = _FragmentDriver()
+    driver.install()
+    app = AppTest.from_file(APP_FILE, default_timeout=30)
+    app.run()
+    results = {"full run": []}
+    for _ in range(repeat):
+        driver.cpu_ns.clear()
+        app.run()
+        results["full run"].append(driver.cpu_ns[-1])
+        for name, (label, fragment) in INTERACTIONS.items():
+            button = next(button for button in app.button if button.label == label)
+            button.click()
+            driver.fragment_id = driver.fragment_of(fragment)
+            driver.cpu_ns.clear()
+            app._tree.run()
+            driver.fragment_id = None
+            results.setdefault(name, []).append(sum(driver.cpu_ns))
+            app.run()  # the fragment run only returns the fragment, get the whole page back
+    return {name: statistics.median(values) / 1e6 for name, values in results.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    for name, cpu_ms in measure(args.repeat).items():
+        print(f"{name:<16}{cpu_ms:8.2f} ms script CPU (median)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""
+Per rerun profiling of the web app, started by st_run_local.main(profile=...).
+A share of the script runs (full and fragment runs alike, the callbacks of their widgets included)
+is profiled, either by cProfile ("cprofile", deterministic) or by sampling the stack of the script
+thread every few ms ("stack", cheaper on long runs). A share of the ticks of the server side clock
+loop (display_timers) can be profiled as well, always with cProfile as a tick is far shorter than
+a sampling interval. A run is profiled until it returns or until it enters the clock loop, which
+runs until the next rerun.
+
+Profiles are written by a background thread to a rotating directory: .prof files (pstats) or
+.folded files (collapsed stacks, for flamegraph.pl or speedscope). index.json lists the slowest
+profiled runs and ticks with the widgets that triggered them and the functions of the app
+(st_front_objects, streamlit_ui) that took the longest. The directory keeps the profiles of the
+index and the most recent ones, the rest is deleted.
+
+Runs that are not sampled cost a random number, so a low rate can be left on in production.
+Standard library only, Streamlit is imported by install().
+
+    python -m frontend.profiling profiles
+"""
+# pylint: disable=protected-access  # wraps the script runs of Streamlit, samples the stacks of its threads
+import argparse
+import cProfile
+import json
+import pstats
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from os import listdir, makedirs, path, remove, replace
+from queue import Full, Queue
+from random import random
+from time import perf_counter_ns, sleep, thread_time_ns
+from typing import Dict, List, Optional
+
+MODES = ("cprofile", "stack")
+DEFAULT_DIRECTORY = "profiles"
+DEFAULT_RATE = 0.01
+DEFAULT_KEEP = 50
+DEFAULT_INDEX_SIZE = 20
+DEFAULT_INTERVAL = 0.005
+INDEX_FILE = "index.json"
+PROFILE_SUFFIXES = (".prof", ".folded")
+# the functions reported in the index are those of the app
+APP_FILES = ("st_front_objects.py", "streamlit_ui.py")
+TOP_FUNCTIONS = 5
+_PENDING_WRITES = 100  # profiles waiting for the writer, further ones are dropped
+
+# read by display_timers: on while a profiler is installed, tick_rate > 0 samples clock loop ticks
+# pylint: disable=invalid-name  # switched by RunProfiler.install() and uninstall()
+enabled = False
+tick_rate = 0.0
+_profiler: Optional["RunProfiler"] = None
+# pylint: enable=invalid-name
+_local = threading.local()  # sample of the run of this script thread
+
+
+def _function_name(key: tuple) -> str:
+    filename, line, name = key
+    return f"{path.basename(filename)}:{line}({name})"
+
+
+def _top_functions(inclusive_ns: Dict[tuple, float], number: int = TOP_FUNCTIONS) -> List[dict]:
+    """:param inclusive_ns: time spent in each (filename, line, function), callees included"""
+    app = [(ns, key) for key, ns in inclusive_ns.items() if path.basename(key[0]) in APP_FILES]
+    app.sort(key=lambda item: (-item[0], item[1]))
+    return [{"function": _function_name(key), "ms": round(ns / 1e6, 3)} for ns, key in app[:number]]
+
+
+def widget_label(widget_id: str, metadata=None) -> str:
+    """Callback and arguments of a widget, else its key, else its id
+    :param metadata: streamlit WidgetMetadata of the widget, if known
+    """
+    callback = getattr(metadata, "callback", None)
+    if callback is not None:
+        arguments = [repr(argument) for argument in metadata.callback_args or ()]
+        arguments += [f"{name}={value!r}" for name, value in (metadata.callback_kwargs or {}).items()]
+        return f"{getattr(callback, '__qualname__', repr(callback))}({', '.join(arguments)})"
+    key = widget_id.rsplit("-", 1)[-1]  # ids end with the key given to the widget
+    return key if widget_id.startswith("$$ID-") and key != "None" else widget_id
+
+
+class _StackSampler:
+    """Samples the stacks of the threads being profiled from one daemon thread,
+    which only runs while at least one thread is profiled"""
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self._stacks: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, thread_id: int) -> None:
+        with self._lock:
+            self._stacks[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack sampler", daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id: int) -> Counter:
+        """:return: number of samples of every stack, (filename, line, function) from the outermost call"""
+        with self._lock:
+            return self._stacks.pop(thread_id, Counter())
+
+    def _run(self) -> None:
+        while True:
+            sleep(self.interval)
+            with self._lock:
+                if not self._stacks:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, stacks in self._stacks.items():
+                    frame = frames.get(thread_id)
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                        frame = frame.f_back
+                    if stack:
+                        stacks[tuple(reversed(stack))] += 1
+                frames = frame = None  # no frame outlives its sample
+
+
+class _Sample:
+    """One profiled script run or clock loop tick, until finish()"""
+    def __init__(self, kind: str, mode: str, sampler: Optional[_StackSampler]):
+        self.kind = kind
+        self.mode = mode
+        self.widgets: List[str] = []
+        self.until_clock_loop = False
+        self.started = datetime.now()
+        self._sampler = sampler
+        self._thread_id = threading.get_ident()
+        self._profile: Optional[cProfile.Profile] = None
+        self.stacks: Optional[Counter] = None
+        if mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()  # ValueError while another profiler is active (Python 3.12+)
+        else:
+            sampler.start(self._thread_id)
+        self._start_ns = perf_counter_ns()
+        self._start_cpu_ns = thread_time_ns()
+        self.ns = self.cpu_ns = None
+
+    def finish(self) -> None:
+        self.ns = perf_counter_ns() - self._start_ns
+        self.cpu_ns = thread_time_ns() - self._start_cpu_ns
+        if self._profile is not None:
+            self._profile.disable()
+        else:
+            self.stacks = self._sampler.stop(self._thread_id)
+
+    def entry(self, filename: str) -> dict:
+        """Index entry, from the profile (the writer thread builds it)"""
+        if self._profile is not None:
+            stats = pstats.Stats(self._profile).stats
+            inclusive = {key: cumulative * 1e9 for key, (_, _, _, cumulative, _) in stats.items()}
+        else:
+            inclusive = Counter()
+            for stack, count in self.stacks.items():
+                for key in set(stack):
+                    inclusive[key] += count * self._sampler.interval * 1e9
+        return {"file": filename, "started": self.started.isoformat(timespec="milliseconds"),
+                "kind": self.kind, "mode": self.mode, "ms": round(self.ns / 1e6, 3),
+                "cpu_ms": round(self.cpu_ns / 1e6, 3), "until_clock_loop": self.until_clock_loop,
+                "widgets": self.widgets, "functions": _top_functions(inclusive)}
+
+    def write(self, filename: str) -> None:
+        if self._profile is not None:
+            self._profile.dump_stats(filename)
+            return
+        with open(filename, "w", encoding="utf-8") as file:
+            for stack, count in sorted(self.stacks.items()):
+                file.write(";".join(_function_name(key) for key in stack) + f" {count}\n")
+
+
+class RunProfiler:
+    """Profiles a share of the script runs and clock loop ticks into directory.
+    :param mode: "cprofile" or "stack"
+    :param rate: share of script runs profiled, 0 to 1
+    :param tick_rate: share of display_timers ticks profiled, 0 (default) profiles none
+    :param keep: most recent profiles kept, besides those of the index
+    :param index_size: slowest runs and ticks listed in index.json
+    :param interval: seconds between two stack samples of the "stack" mode
+    """
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, mode: str = "cprofile", rate: float = DEFAULT_RATE,
+                 tick_rate: float = 0.0,  # pylint: disable=redefined-outer-name  # becomes the module's on install()
+                 keep: int = DEFAULT_KEEP, index_size: int = DEFAULT_INDEX_SIZE, interval: float = DEFAULT_INTERVAL):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}, expected one of {MODES}")
+        if not 0 <= rate <= 1 or not 0 <= tick_rate <= 1:
+            raise ValueError("Profiling rates are shares of the runs, from 0 to 1")
+        self.directory = directory
+        self.mode = mode
+        self.rate = rate
+        self.tick_rate = tick_rate
+        self.keep = keep
+        self.index_size = index_size
+        self.sampler = _StackSampler(interval) if mode == "stack" else None
+        makedirs(directory, exist_ok=True)
+        self.index: List[dict] = read_index(directory)
+        self._recent: List[str] = []
+        self._sequence = 0
+        self._writes: Queue = Queue(_PENDING_WRITES)
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._originals: Optional[tuple] = None  # what install() wrapped, put back by uninstall()
+
+    def start(self, kind: str, mode: Optional[str] = None) -> Optional[_Sample]:
+        """Starts profiling this thread, None if it is profiled already or profiling is taken"""
+        if getattr(_local, "sample", None) is not None:
+            return None
+        try:
+            sample = _Sample(kind, mode or self.mode, self.sampler)
+        except ValueError:
+            return None
+        _local.sample = sample
+        return sample
+
+    def finish(self, sample: _Sample) -> None:
+        """Stops the sample and hands it to the writer thread"""
+        if getattr(_local, "sample", None) is not sample:
+            return  # finished when the run entered the clock loop
+        _local.sample = None
+        sample.finish()
+        try:
+            self._writes.put_nowait(sample)
+        except Full:
+            return  # the disk is slower than the profiled runs, skip rather than slow the app
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="profile writer", daemon=True)
+                self._writer.start()
+
+    def flush(self) -> None:
+        """Waits for the profiles handed to the writer"""
+        self._writes.join()
+
+    def _write_loop(self) -> None:
+        while True:
+            sample = self._writes.get()
+            try:
+                self._save(sample)
+            except Exception as error:  # pylint: disable=broad-exception-caught  # never take the app down
+                print(f"Profile of a {sample.kind} not saved: {error!r}", file=sys.stderr)
+            finally:
+                self._writes.task_done()
+
+    def _save(self, sample: _Sample) -> None:
+        self._sequence += 1
+        suffix = ".prof" if sample.mode == "cprofile" else ".folded"
+        name = f"{sample.started:%Y%m%d-%H%M%S-%f}-{self._sequence}-{sample.kind}{suffix}"
+        sample.write(path.join(self.directory, name))
+        entry = sample.entry(name)
+        self.index = sorted(self.index + [entry], key=lambda item: -item["ms"])[:self.index_size]
+        self._recent = (self._recent + [name])[-self.keep:]
+        _write_json(path.join(self.directory, INDEX_FILE), {"slowest": self.index})
+        kept = set(self._recent) | {item["file"] for item in self.index}
+        for filename in listdir(self.directory):
+            if filename.endswith(PROFILE_SUFFIXES) and filename not in kept:
+                remove(path.join(self.directory, filename))
+
+    def install(self) -> "RunProfiler":
+        """Wraps the script runs of Streamlit in this process, before the server starts"""
+        global enabled, tick_rate, _profiler  # pylint: disable=global-statement
+        from streamlit.runtime.scriptrunner import script_runner
+        from streamlit.runtime.state.session_state import SessionState
+
+        if _profiler is not None:
+            _profiler.uninstall()
+        # one call per run, full or fragment: script_runner.ScriptRunner._run_script loops over the
+        # runs interrupted by a rerun, and the server side clock loop only ends that way
+        execute = script_runner.exec_func_with_error_handling
+        call_callbacks = SessionState._call_callbacks
+
+        def profiled_execute(func, ctx):
+            sample = None
+            if random() < self.rate:
+                sample = self.start("fragment" if ctx.fragment_ids_this_run else "run")
+            try:
+                return execute(func, ctx)
+            finally:
+                if sample is not None:
+                    self.finish(sample)
+                interrupted = getattr(_local, "sample", None)
+                if interrupted is not None:  # a tick stopped by a rerun request, left out of the index
+                    _local.sample = None
+                    interrupted.finish()
+
+        def profiled_callbacks(session_state):
+            # the widgets changed since the previous run, whose callbacks are called next
+            sample = getattr(_local, "sample", None)
+            if sample is not None and sample.kind != "tick":
+                widgets = session_state._new_widget_state
+                sample.widgets = [widget_label(widget_id, widgets.widget_metadata.get(widget_id))
+                                  for widget_id in widgets if session_state._widget_changed(widget_id)]
+            call_callbacks(session_state)
+
+        self._originals = (execute, call_callbacks)
+        script_runner.exec_func_with_error_handling = profiled_execute
+        SessionState._call_callbacks = profiled_callbacks
+        _profiler, enabled, tick_rate = self, True, self.tick_rate
+        return self
+
+    def uninstall(self) -> None:
+        global enabled, tick_rate, _profiler  # pylint: disable=global-statement
+        from streamlit.runtime.scriptrunner import script_runner
+        from streamlit.runtime.state.session_state import SessionState
+
+        if _profiler is not self:
+            return
+        script_runner.exec_func_with_error_handling, SessionState._call_callbacks = self._originals
+        self._originals = None
+        _profiler, enabled, tick_rate = None, False, 0.0
+
+
+def run_ends_here() -> None:
+    """Ends the profile of the current run, called where the server side clock loop starts"""
+    sample = getattr(_local, "sample", None)
+    if _profiler is not None and sample is not None and sample.kind != "tick":
+        sample.until_clock_loop = True
+        _profiler.finish(sample)
+
+
+def start_tick() -> Optional[_Sample]:
+    """Profiles a tick of the clock loop (cProfile) for a tick_rate share of the ticks"""
+    if _profiler is None or random() >= tick_rate:
+        return None
+    return _profiler.start("tick", "cprofile")
+
+
+def finish_tick(sample: _Sample) -> None:
+    _profiler.finish(sample)
+
+
+def _write_json(filename: str, content) -> None:
+    with open(filename + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(content, file, indent=1)
+    # replaced at once, a reader never sees half an index
+    replace(filename + ".tmp", filename)
+
+
+def read_index(directory: str) -> List[dict]:
+    """:return: the slowest profiled runs and ticks in directory, slowest first"""
+    try:
+        with open(path.join(directory, INDEX_FILE), encoding="utf-8") as file:
+            return json.load(file)["slowest"]
+    except (OSError, ValueError, KeyError):
+        return []
+
+
+def format_index(entries: List[dict]) -> str:
+    lines = []
+    for entry in entries:
+        widgets = ", ".join(entry["widgets"]) or "-"
+        loop = " until clock loop" if entry["until_clock_loop"] else ""
+        lines.append(f"{entry['ms']:>10.1f} ms {entry['cpu_ms']:>8.1f} ms cpu  {entry['kind']:<8} "
+                     f"{entry['started']}{loop}  widgets: {widgets}  {entry['file']}")
+        lines += [f"{'':>14}{function['ms']:>10.1f} ms  {function['function']}" for function in entry["functions"]]
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?", default=DEFAULT_DIRECTORY, help="profiles written by the app")
+    args = parser.parse_args()
+    print(format_index(read_index(args.directory)) or f"No profiles in {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
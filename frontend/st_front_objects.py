@@ -4,70 +4,339 @@ This module is for storing classes and functions used by streamlit front end.
 """
 
 from time import sleep
-from os import path
-from typing import Optional
-from base64 import b64encode
+from os import environ, listdir, makedirs, path, replace
+from shutil import copyfile
+from typing import Callable, Optional, Tuple
 
 import streamlit as st
+import streamlit.components.v1 as st_components
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
-from rationalbreaks.timers import RatioNalTimer
+from frontend import profiling
+from rationalbreaks import metrics
+from rationalbreaks.clocks import DEFAULT_CLOCK, NS_PER_SECOND, Clock
+from rationalbreaks.eventlog import EventLog
+from rationalbreaks.formatting import Precision
+from rationalbreaks.registry import TimerRegistry
+from rationalbreaks.scheduler import DeadlineScheduler
+from rationalbreaks.sounds import SoundBank
+from rationalbreaks.timers import RatioNalTimer, TimerSnapshot, ns_until_display_change, transition_allowed
+
+
+COMPONENTS_DIR = path.join(path.dirname(path.abspath(__file__)), "components")
+DEFAULT_CACHE_DIR = path.join(path.expanduser("~"), ".rationalbreaks", "cache")
+
+
+def cache_dir() -> str:
+    """Directory of the files written at runtime (the exported alarm sound), never the source tree,
+    which may be read-only: RATIONALBREAKS_CACHE, else DEFAULT_CACHE_DIR
+    """
+    return environ.get("RATIONALBREAKS_CACHE", DEFAULT_CACHE_DIR)
+
+
+def served_component(name: str, directory: str) -> str:
+    """Copies the files of the component name into directory, when newer than their copy,
+    so files can be added next to them at runtime.
+    :return: directory to declare the component with
+    """
+    source = path.join(COMPONENTS_DIR, name)
+    served = path.join(directory, name)
+    makedirs(served, mode=0o700, exist_ok=True)
+    for file_name in listdir(source):
+        source_file, copy = path.join(source, file_name), path.join(served, file_name)
+        if not path.isfile(source_file) or (path.exists(copy) and path.getmtime(copy) >= path.getmtime(source_file)):
+            continue
+        copyfile(source_file, copy + ".partial")
+        replace(copy + ".partial", copy)  # the server never serves a half written page
+    return served
+
+
+# browser side ticking clock, see components/timer_clock/index.html
+_timer_clock = st_components.declare_component("timer_clock",
+                                               path=path.join(COMPONENTS_DIR, "timer_clock"))
+
+
+@st.cache_resource
+def alarm_player(directory: str) -> Tuple[str, Callable]:
+    """Alarm sound player, declared on first use from its copy in directory, so importing this module
+    writes nothing. The sound is exported next to the copy and served as a file of the component
+    (cacheable, with ETag).
+    :return: directory the player is served from, and the component
+    """
+    served = served_component("alarm_player", directory)
+    return served, st_components.declare_component("alarm_player", path=served)
+
+
+def _alarm_player(**kwargs):
+    return alarm_player(cache_dir())[1](**kwargs)
+
+
+# visibility and idleness of the page, see components/page_activity/index.html
+_page_activity = st_components.declare_component("page_activity",
+                                                 path=path.join(COMPONENTS_DIR, "page_activity"))
+PAGE_IDLE_SECONDS = 300
+# what the server assumes until the browser reports otherwise
+ACTIVE_PAGE = {"visible": True, "idle": False}
+
+# how often timers of sessions whose websocket went away are evicted
+SESSION_REAP_INTERVAL_NS = 60 * NS_PER_SECOND
+
+# longest sleep of the display_timers loop, a rerun requested meanwhile waits at most this long
+DISPLAY_MAX_SLEEP_NS = NS_PER_SECOND // 4
 
 
 @st.cache_resource
 class RatioNalTimerStreamlit(RatioNalTimer):
     """Caching timer instance for streamlit"""
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
 
+@st.cache_resource
+def rest_scheduler() -> DeadlineScheduler:
+    """Cached scheduler shared by every session timer to signal when rest runs out."""
+    return DeadlineScheduler()
+
+
+@st.cache_resource
+def event_log() -> EventLog:
+    """Cached, process wide log of timer transitions (see rationalbreaks.eventlog)"""
+    return EventLog()
+
+
+@st.cache_resource
+def timer_registry(capacity: int = 4096,
+                   ttl: float = 12 * 3600,
+                   spill_dir: Optional[str] = None) -> TimerRegistry:
+    """Cached registry holding one timer per browser session.
+    Timers not in memory (evicted when idle, or after a server restart) are rebuilt from the event log,
+    which every transition of the web app is written to. Nothing is spilled unless spill_dir is given.
+    """
+    scheduler = rest_scheduler()
+    log = event_log()
+    return TimerRegistry(capacity=capacity, ttl=ttl, spill_dir=spill_dir,
+                         factory=lambda: RatioNalTimer(scheduler=scheduler),
+                         loader=lambda timer_id: log.replay(timer_id, scheduler=scheduler),
+                         unloader=log.forget)
+
+
+def session_timer_id() -> str:
+    """Id of the timer shown in this session, kept in the "timer" query parameter
+    so that reloading the page or restarting the server leads back to the same timer.
+    Defaults to the session id.
+    """
+    if "timer" not in st.query_params:
+        st.query_params["timer"] = get_script_run_ctx().session_id
+    return st.query_params["timer"]
+
+
+@st.cache_resource
+def session_timers() -> dict:
+    """Sessions of this process and the timer they show, session id -> timer id"""
+    return {}
+
+
+def session_timer() -> RatioNalTimer:
+    """Returns the timer that belongs to the current browser session."""
+    timer_id = session_timer_id()
+    session_timers()[get_script_run_ctx().session_id] = timer_id
+    return timer_registry().get(timer_id)
+
+
+def reap_sessions(is_active_session: Callable[[str], bool]) -> int:
+    """Forgets the sessions that are not active anymore and evicts their timers from memory,
+    unless an active session shows the same timer. The next access rebuilds them from the event log.
+    :return: number of sessions reaped
+    """
+    sessions = session_timers()
+    reaped = {session_id: sessions.pop(session_id, None)
+              for session_id in list(sessions) if not is_active_session(session_id)}
+    registry = timer_registry()
+    for timer_id in set(reaped.values()) - set(sessions.values()):
+        registry.evict(timer_id)
+    return len(reaped)
+
+
+@st.cache_resource
+def session_reaper(interval_ns: int = SESSION_REAP_INTERVAL_NS) -> bool:
+    """Reaps sessions every interval_ns from the rest scheduler, started once per process.
+    :return: False without a streamlit server (e.g. in AppTest), nothing to reap then
+    """
+    if not Runtime.exists():
+        return False
+    scheduler = rest_scheduler()
+
+    def reap():
+        try:
+            reap_sessions(Runtime.instance().is_active_session)
+        finally:
+            scheduler.schedule_in(interval_ns, reap)
+
+    scheduler.schedule_in(interval_ns, reap)
+    return True
+
+
+@st.cache_resource
+def metrics_endpoint(port: Optional[int] = None) -> Optional[int]:
+    """Serves the metrics of this process on localhost:port/metrics (Prometheus), started once per process.
+    Instrumentation stays off unless a port is given or set in RATIONALBREAKS_METRICS_PORT.
+    :return: port served (0 picks a free one), None if disabled
+    """
+    port = port if port is not None else metrics.configured_port()
+    if port is None:
+        return None
+    sessions = session_timers()
+    registry = timer_registry()
+
+    def sessions_by_status() -> dict:
+        counts = {}
+        for timer_id in list(sessions.values()):
+            timer = registry.peek(timer_id)  # an evicted timer is not rebuilt to be counted
+            status = timer.status() if timer is not None else "Evicted"
+            counts[(status,)] = counts.get((status,), 0) + 1
+        return counts
+
+    metrics.SESSIONS.collect = sessions_by_status
+    return metrics.serve(port).server_address[1]
+
+
+def page_activity(idle_after: int = PAGE_IDLE_SECONDS, key: str = "page_activity") -> dict:
+    """Visibility of the page and idleness of the user, as reported by the browser.
+    A change is reported once and reruns the script.
+    :param idle_after: Seconds without input after which the user is idle
+    :return: {"visible": bool, "idle": bool}
+    """
+    activity = _page_activity(idle_after=idle_after, key=key, default=None)
+    return activity if activity is not None else ACTIVE_PAGE
+
+
+@st.cache_resource
+def sound_bank(directory: str = "resources") -> SoundBank:
+    """Cached, memory-mapped sound files of directory"""
+    return SoundBank(directory)
+
+
 @st.cache_resource
 class Alarm:
     """Cached alarm that provides notification based on timer preferences."""
-    def __init__(self, soundfile: Optional[path] = None):
+    def __init__(self, soundfile: Optional[path] = None, transcode: Optional[dict] = None):
+        """
+        :param soundfile: Path of the alarm sound
+        :param transcode: Options of SoundBank.export, e.g. {"mono": True, "sample_rate": 22050}
+        """
         default_sound = path.join("resources", "ring_1.wav")
         self.soundfile = soundfile if soundfile else default_sound
-        self.audio_base64 = self.encode_audio()
+        self.sound_url = self.publish_audio(transcode)
 
-    def encode_audio(self):
-        with open(self.soundfile, "rb") as audio_file:
-            audio_bytes = audio_file.read()
-            audio_base64 = b64encode(audio_bytes).decode()
-            return audio_base64
-
-    def trigger_audio(self):
+    def publish_audio(self, transcode: Optional[dict] = None) -> str:
+        """Exports the sound into the served alarm player (in cache_dir()), from where the browser fetches it once.
+        :return: url of the sound, relative to the player
+        """
+        bank = sound_bank(path.dirname(self.soundfile))
+        player_dir, _ = alarm_player(cache_dir())
+        exported = bank.export(path.basename(self.soundfile),
+                               path.join(player_dir, "sounds"),
+                               **(transcode if transcode else {}))
+        return "sounds/" + path.basename(exported)
+
+    def trigger_audio(self, snapshot: Optional[TimerSnapshot] = None):
         """
         Evaluate session_states and return value inserted into JS code.
+        :param snapshot: If passed, rest consumption is taken from it instead of session_state
         :return: lower case string imitating js boolean
         """
+        if snapshot is not None:
+            rest_consumed = snapshot.rest_consumed and snapshot.status == "Resting"
+        else:
+            rest_consumed = st.session_state.rest_consumed is True
         play_alarm = st.session_state.alert["play_sound"] is True \
             and st.session_state.alert["muted"] is False \
-            and st.session_state.rest_consumed is True
+            and rest_consumed
         formatted_to_js = str(play_alarm).lower()
         return formatted_to_js
 
-    def load_player_html(self, refresh_frequency: int = 1000):
-        st.components.v1.html(
-            f"""
-            <script src="https://cdnjs.cloudflare.com/ajax/libs/howler/2.2.3/howler.min.js">
-            </script>
-            <script>
-            const sound = new Howl({{
-                src: ['data:audio/wav;base64,{self.audio_base64}']
-            }});
-    
-            // Monitor Streamlit for playback trigger
-            const checkPlayback = () => {{
-                const playAudio = {self.trigger_audio()};
-                if (playAudio) {{
-                    sound.play();
-                }}
-            }};
-    
-            // Poll the server for updates every "refresh_frequency" ms
-            setInterval(checkPlayback, {refresh_frequency});
-            </script>
-            """,
-            height=1)
+    def load_player_html(self, snapshot: Optional[TimerSnapshot] = None, on_mute: Optional[Callable] = None):
+        """Renders the player. It rings when triggered by this run, or, while resting,
+        arms itself with the time left until the rest runs out, so ringing on time needs no rerun.
+        Ringing and its mute button live in the browser, on_mute is called once the alarm was muted there.
+        """
+        play = self.trigger_audio(snapshot) == "true"
+        arm_in = None
+        resting = snapshot is not None and snapshot.status == "Resting" and snapshot.rest_ns > 0
+        if resting and not play \
+                and st.session_state.alert["play_sound"] is True and st.session_state.alert["muted"] is False:
+            arm_in = snapshot.rest_ns / NS_PER_SECOND
+        if metrics.enabled and (play or arm_in is not None):
+            metrics.ALARM_TRIGGERS.inc(("played" if play else "armed",))
+        _alarm_player(sound=self.sound_url,
+                      play=play,
+                      arm_in=arm_in,
+                      # one ring per rest period, in microseconds to stay exact as a javascript number
+                      ring=snapshot.cycle_start_ns // 1000 if snapshot is not None else 0,
+                      key="alarm_player",
+                      default=None,
+                      on_change=on_mute)
+
+
+def _rerun_metrics() -> dict:
+    return st.session_state.setdefault("rerun_metrics", {"runs": 0, "fragment_runs": 0, "interactions": 0,
+                                                         "runs_since_interaction": 0})
+
+
+def record_script_run() -> None:
+    """Counts a run of the script, call once at its top"""
+    counts = _rerun_metrics()
+    st.session_state.pop("app_rerun_requested", None)  # this run already shows every change
+    counts["runs"] += 1
+    counts["runs_since_interaction"] += 1
+
+
+def record_interaction() -> None:
+    """Counts a user interaction, called by the widget callbacks"""
+    counts = _rerun_metrics()
+    counts["interactions"] += 1
+    counts["runs_since_interaction"] = 0
+
+
+def reruns_per_interaction() -> int:
+    """Full script runs caused by the last interaction.
+    1 when every click is handled by a callback, 0 when only a fragment reran.
+    """
+    return _rerun_metrics()["runs_since_interaction"]
+
+
+def request_app_rerun(site: str = "callback") -> None:
+    """For callbacks of widgets inside a fragment whose change is shown outside of it
+    :param site: Name of the callback, the rerun is counted under it
+    """
+    st.session_state["app_rerun_requested"] = site
+
+
+def begin_fragment() -> bool:
+    """Call first in every fragment. Counts fragment runs and turns one into a full app run
+    if a callback requested it.
+    :return: True if only fragments are running, False as part of a full run
+    """
+    ctx = get_script_run_ctx()
+    if ctx is None or not ctx.fragment_ids_this_run:
+        return False
+    site = st.session_state.pop("app_rerun_requested", None)
+    if site:
+        if metrics.enabled:
+            metrics.RERUNS.inc((site,))
+        st.rerun(scope="app")
+    _rerun_metrics()["fragment_runs"] += 1
+    return True
+
+
+def set_session_state(**values) -> None:
+    """Widget callback setting session_state values, e.g. on_click=set_session_state, kwargs={...}"""
+    record_interaction()
+    for key, value in values.items():
+        st.session_state[key] = value
 
 
 class StatusControl:
@@ -76,17 +345,32 @@ class StatusControl:
     Technically it is compatible with RatioNalTimer, but in most
     streamlit application it should be a cached version, as
     defined above via class RatioNalTimerStreamlit
+    If an EventLog is passed, every transition is appended to it under timer_id.
+    Buttons call transition as their on_click callback, so one click is one script run.
+    Transitions are checked against the status of the timer (rationalbreaks.timers.TRANSITIONS),
+    which other tabs of the same timer may have changed since this one was drawn.
 
     """
-    def __init__(self, timer_instance: RatioNalTimer):
+    # status -> (label, action) of the status button
+    STATUS_BUTTONS = {"Not started": ("Start", "start"),
+                      "Working": ("Rest", "rest"),
+                      "Resting": ("Continue", "continue_work")}
+
+    def __init__(self, timer_instance: RatioNalTimer,
+                 log: Optional[EventLog] = None,
+                 timer_id: Optional[str] = None):
         self.timer = timer_instance
+        self.event_log = log
+        self.timer_id = timer_id
 
     def start(self):
         self.timer.start()
+        self._log("start")
         st.session_state["status"] = "Working"
 
     def rest(self):
         self.timer.rest()
+        self._log("rest")
         st.session_state["status"] = "Resting"
         st.session_state["rest_consumed"] = False
         if st.session_state["alert"]["play_sound"]:
@@ -94,6 +378,7 @@ class StatusControl:
 
     def continue_work(self):
         self.timer.continue_work()
+        self._log("continue_work")
         st.session_state["status"] = "Working"
         st.session_state["alert"]["muted"] = True
 
@@ -102,22 +387,74 @@ class StatusControl:
 
     def reset(self):
         self.timer.reset()
+        self._log("reset")
         st.session_state["status"] = "Not started"
         st.session_state["alert"]["muted"] = True
 
     def mute_alarm(self):
         st.session_state["alert"]["muted"] = True
-        st.rerun()
+
+    def transition(self, action: str) -> bool:
+        """Widget callback running action, if the transition table allows it in the current status.
+        :return: False if the action was ignored
+        """
+        record_interaction()
+        if metrics.enabled:
+            return self._counted_transition(action)
+        if not transition_allowed(action, self.timer.status()):
+            return False
+        getattr(self, action)()
+        return True
+
+    def _counted_transition(self, action: str) -> bool:
+        """transition, counted and timed in rationalbreaks.metrics"""
+        if not transition_allowed(action, self.timer.status()):
+            metrics.TRANSITIONS.inc((action, "ignored"))
+            return False
+        started_ns = DEFAULT_CLOCK.now_ns()
+        getattr(self, action)()
+        metrics.TRANSITIONS.inc((action, "applied"))
+        metrics.TRANSITION_LATENCY.observe((DEFAULT_CLOCK.now_ns() - started_ns) / NS_PER_SECOND, (action,))
+        return True
+
+    def confirm_reset(self):
+        self.transition("reset")
+        st.session_state["reset_clicked"] = False
+        request_app_rerun("confirm_reset")
+
+    def save_settings(self, ratio_key: str = "new_ratio", play_sound_key: str = "alarm_sound",
+                      precision_key: str = "new_precision"):
+        """Widget callback storing the values of the settings widgets with the given keys"""
+        record_interaction()
+        self.set_ratio(st.session_state[ratio_key])
+        st.session_state["alert"]["play_sound"] = st.session_state[play_sound_key]
+        st.session_state["display_precision"] = st.session_state[precision_key]
+        request_app_rerun("save_settings")
 
     def get_timer_ratio(self) -> float:
         return self.timer.get_ratio()
 
     def set_ratio(self, new_ratio: float):
         self.timer.set_ratio(new_ratio)
+        self._log("set_ratio", float(new_ratio))
+
+    def _log(self, action: str, value: Optional[float] = None):
+        if self.event_log is not None:
+            self.event_log.append(self.timer_id, action, value)
+
 
+def alarm_muted() -> None:
+    """Callback of the alarm player, the alarm was muted in the browser"""
+    record_interaction()
+    if metrics.enabled:
+        metrics.ALARM_MUTES.inc()
+    st.session_state["alert"]["muted"] = True
 
-def check_rest_consumed(timer_instance: RatioNalTimerStreamlit) -> bool:
-    if timer_instance.all_rest_consumed() and st.session_state["status"] == "Resting":
+
+def check_rest_consumed(timer_instance: RatioNalTimerStreamlit,
+                        snapshot: Optional[TimerSnapshot] = None) -> bool:
+    snapshot = snapshot if snapshot is not None else timer_instance.snapshot()
+    if snapshot.rest_consumed and st.session_state["status"] == "Resting":
         st.session_state["rest_consumed"] = True
         return True
     return False
@@ -126,24 +463,91 @@ def check_rest_consumed(timer_instance: RatioNalTimerStreamlit) -> bool:
 def display_timers(timer_instance: RatioNalTimerStreamlit,
                    work_time_display,
                    rest_time_display,
-                   update_per_sec: int = 10) -> None:
-    loop = True
-    while loop:
-        work, rest = timer_instance.work_and_rest_time()
-        work_time_display.metric("Worked time", str(work))
-        rest_time_display.metric("Available rest", str(rest))
-
-        # to trigger alarm
-        rest_consumed = check_rest_consumed(timer_instance)
-
-        alarm_active = not st.session_state.alert["muted"] and st.session_state.alert["play_sound"]
-
-        # interrupting loop if we are resting and alarm needs to be played (outside loop)
-        if rest_consumed and alarm_active:
-            loop = False
-            st.rerun()
-
-        sleep(1 / update_per_sec)
+                   update_per_sec: int = 10,
+                   precision: Precision = Precision.CENTISECONDS,
+                   clock: Clock = DEFAULT_CLOCK,
+                   page: Optional[dict] = None) -> None:
+    """Server side ticking clock, runs until the script is rerun.
+    A metric is only sent when its text changed, the loop sleeps until the next visible change
+    but never wakes up more than update_per_sec times per second.
+    For a hidden page the values are shown once and the loop parks (returns), showing the page
+    again reruns the script. For an idle user only minutes are shown.
+    :param precision: Smallest unit shown, unless the session chose one (display_precision)
+    :param clock: Clock of timer_instance, the sleeps are measured with it
+    :param page: Page activity as returned by page_activity
+    """
+    page = page if page is not None else ACTIVE_PAGE
+    min_interval = NS_PER_SECOND // update_per_sec
+    shown_work = shown_rest = None
+    # instrumentation reads the tick planned by the previous one, now_ns + sleep_ns
+    now_ns = sleep_ns = render_planned_ns = None
+    if profiling.enabled:  # the profile of this run ends here, the loop only ends with the next rerun
+        profiling.run_ends_here()
+    # the alarm player arms itself with the rest deadline, so the loop never has to be interrupted for it
+    while True:
+        # reading session_state is a yield point of the script runner: a pending rerun stops the
+        # loop here, even on ticks that send nothing
+        tick_precision = st.session_state.get("display_precision", precision)
+        tick_sample = profiling.start_tick() if profiling.tick_rate else None
+        if page["idle"]:
+            tick_precision = Precision.MINUTES
+        snapshot = timer_instance.snapshot()  # single clock read per tick
+        work, rest = snapshot.formatted(tick_precision)
+        if metrics.enabled:
+            metrics.DISPLAY_ITERATIONS.inc()
+            if sleep_ns is not None:
+                planned_ns = now_ns + sleep_ns
+                if sleep_ns > 0:
+                    metrics.SLEEP_OVERSHOOT.observe((snapshot.taken_at_ns - planned_ns) / NS_PER_SECOND)
+                if work != shown_work or rest != shown_rest:
+                    render_planned_ns = planned_ns
+        if work != shown_work:
+            work_time_display.metric("Worked time", work)
+            shown_work = work
+        if rest != shown_rest:
+            rest_time_display.metric("Available rest", rest)
+            shown_rest = rest
+        if render_planned_ns is not None:  # only set while instrumentation is enabled
+            metrics.TICK_LATENCY.observe((clock.now_ns() - render_planned_ns) / NS_PER_SECOND)
+            render_planned_ns = None
+
+        check_rest_consumed(timer_instance, snapshot)
+        if tick_sample is not None:
+            profiling.finish_tick(tick_sample)
+        if not page["visible"]:
+            return
+
+        wait = ns_until_display_change(snapshot, timer_instance.get_ratio(), tick_precision)
+        wait = DISPLAY_MAX_SLEEP_NS if wait is None else max(wait, min_interval)
+        # the next tick is due relative to the clock reading of this one, the time spent
+        # rendering is taken off the sleep instead of adding up
+        now_ns = clock.now_ns()
+        sleep_ns = min(snapshot.taken_at_ns + wait - now_ns, DISPLAY_MAX_SLEEP_NS)
+        if sleep_ns > 0:
+            sleep(sleep_ns / NS_PER_SECOND)
+
+
+def display_client_timers(timer_instance: RatioNalTimerStreamlit,
+                          key: str = "timer_clock",
+                          snapshot: Optional[TimerSnapshot] = None,
+                          precision: Precision = Precision.CENTISECONDS) -> None:
+    """Alternative to display_timers where the clock is ticking in the browser.
+    Timer values are sent once per script run (i.e. per state transition), the component
+    only reports back when the available rest runs out, which triggers a single rerun.
+    The alarm itself rings in the alarm player, without any further rerun.
+    """
+    precision = st.session_state.get("display_precision", precision)
+    snapshot = snapshot if snapshot is not None else timer_instance.snapshot()
+    work, rest = snapshot.work_and_rest_time(use_simpletime=False)
+    _timer_clock(status=snapshot.status,
+                 work=work.total_seconds(),
+                 rest=rest.total_seconds(),
+                 ratio=timer_instance.get_ratio(),
+                 precision=int(precision),
+                 key=key,
+                 default=None)
+
+    check_rest_consumed(timer_instance, snapshot)
 
 
 FORMAT_BUTTONS_HTML = """
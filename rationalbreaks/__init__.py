@@ -0,0 +1,49 @@
+"""
+RatioNalTimer and its building blocks.
+Importing the package only loads the core: the timer with its clocks, formatting, history
+and scheduler, standard library only. Everything else is loaded on first access, through the
+module level __getattr__ below (PEP 562), so e.g. a script timing work never pays for numpy
+(batch), asyncio (api, events) or sqlite3 (eventlog):
+
+    import rationalbreaks
+    rationalbreaks.RatioNalTimer()          # core, already imported
+    rationalbreaks.BatchRatioNalTimer(...)  # imports rationalbreaks.batch, and numpy, now
+
+The Streamlit front end lives outside the package (frontend/, streamlit_ui.py) and is never
+imported from here. tests/test_imports.py keeps the import time of the core within a budget
+(benchmarks/import_time.py TEST_BUDGET_MS, a margin over the CORE_BUDGET_MS the benchmark checks).
+"""
+from importlib import import_module
+
+from rationalbreaks.clocks import DEFAULT_CLOCK, NS_PER_SECOND, Clock, MonotonicClock, VirtualClock
+from rationalbreaks.formatting import Precision, format_duration_ns, format_many
+from rationalbreaks.history import CycleHistory
+from rationalbreaks.scheduler import DeadlineScheduler
+from rationalbreaks.timers import (RatioNalTimer, SimpleTime, TimerSnapshot, TimerStatus, describe_timer,
+                                   ns_until_display_change)
+
+# name -> module defining it, imported on first access
+_LAZY = {"BatchRatioNalTimer": "batch", "BatchSnapshot": "batch",
+         "EventLog": "eventlog", "TimerRegistry": "registry", "SoundBank": "sounds",
+         "TimerApi": "api", "ApiError": "api", "serve": "api", "TimerEvents": "events"}
+_SUBMODULES = ("api", "batch", "cli", "eventlog", "events", "metrics", "registry", "sounds")
+
+__all__ = ["DEFAULT_CLOCK", "NS_PER_SECOND", "Clock", "MonotonicClock", "VirtualClock",
+           "Precision", "format_duration_ns", "format_many", "CycleHistory", "DeadlineScheduler",
+           "RatioNalTimer", "SimpleTime", "TimerSnapshot", "TimerStatus", "describe_timer",
+           "ns_until_display_change", *_LAZY]
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        value = getattr(import_module(f"{__name__}.{_LAZY[name]}"), name)
+    elif name in _SUBMODULES:
+        value = import_module(f"{__name__}.{name}")
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value  # later accesses do not come back here
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(_LAZY) | set(_SUBMODULES))
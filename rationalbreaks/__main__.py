@@ -0,0 +1,7 @@
+"""python -m rationalbreaks, terminal front end (see rationalbreaks.cli)"""
+import sys
+
+from rationalbreaks.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
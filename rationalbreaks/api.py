@@ -0,0 +1,372 @@
+"""
+This module holds a headless HTTP/JSON API for timers, independent of Streamlit.
+TimerApi applies actions to the timers of a TimerRegistry, keyed by timer id, and can log
+them to an EventLog, so the web app and the API can share timers through the same database:
+a timer moved on by another writer of the database is replayed before the API reads or changes it.
+The server is a plain asyncio.Protocol speaking HTTP/1.1 with keep-alive and pipelining,
+standard library only:
+
+    GET  /timers/<id>              snapshot of the timer
+    POST /timers/<id>/<action>     start, rest, continue or reset, returns the new snapshot
+    POST /timers/<id>/ratio        body {"ratio": 4}
+    POST /batch                    body [{"timer": "a", "action": "start"}, ...], one result each
+    GET  /timers/<id>/events       Server-Sent Events of the timer, ?milestone=<minutes> adds
+                                   an event whenever the work time reaches a multiple of it
+    GET  /stats                    registry and event counters, server CPU time
+    GET  /metrics                  rationalbreaks.metrics in the Prometheus text format,
+                                   transitions are only counted when run with --metrics
+
+Run with python -m rationalbreaks.api --port 8750 (see benchmarks/api_load.py for a load test).
+"""
+import argparse
+import asyncio
+import json
+from time import process_time
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, unquote
+
+from rationalbreaks import metrics
+from rationalbreaks.clocks import DEFAULT_CLOCK, NS_PER_SECOND
+from rationalbreaks.eventlog import EventLog
+from rationalbreaks.events import TimerEvents
+from rationalbreaks.registry import TimerRegistry
+from rationalbreaks.timers import RatioNalTimer, check_ratio, describe_timer, transition_allowed
+
+DEFAULT_PORT = 8750
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+# url action -> timer method
+ACTIONS = {"start": "start", "rest": "rest", "continue": "continue_work", "reset": "reset"}
+
+_EVENT_STREAM_HEAD = (b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                      b"Connection: keep-alive\r\n\r\n")
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+            413: "Payload Too Large", 431: "Request Header Fields Too Large", 501: "Not Implemented",
+            503: "Service Unavailable"}
+
+
+class ApiError(Exception):
+    """Error answered with an HTTP status and a JSON {"error": message} body"""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class TimerApi:
+    """Timer actions and snapshots by timer id, without any transport.
+    Not thread safe: meant to be used from a single event loop.
+    """
+    def __init__(self, registry: Optional[TimerRegistry] = None,
+                 event_log: Optional[EventLog] = None,
+                 max_batch: int = 1000,
+                 events: Optional[TimerEvents] = None,
+                 flush_timeout: float = 0.5):
+        """
+        :param registry: Timers by id, defaults to an in-memory registry rebuilding timers from event_log
+        :param event_log: Log of every action, None to keep the timers in memory only
+        :param max_batch: Maximum number of operations in one batch request
+        :param events: Event fan-out of the subscribers, defaults to TimerEvents with its default limits
+        :param flush_timeout: Seconds the event loop may wait for event_log before a timer is replayed,
+            the request is answered with 503 past it
+        """
+        if registry is None:
+            registry = TimerRegistry(capacity=65536,
+                                     loader=event_log.replay if event_log is not None else None,
+                                     unloader=event_log.forget if event_log is not None else None)
+        self.registry = registry
+        self.event_log = event_log
+        self.max_batch = max_batch
+        self.flush_timeout = flush_timeout
+        self.events = events if events is not None else TimerEvents(self.snapshot)
+
+    def snapshot(self, timer_id: str) -> dict:
+        timer = self._timer(timer_id)
+        return describe_timer(timer_id, timer)
+
+    def act(self, timer_id: str, action: str, ratio: Optional[float] = None) -> dict:
+        """Runs an url action (start, rest, continue, reset) or sets the ratio.
+        The action is checked before the timer is looked up, an invalid request creates no timer.
+        :raises ApiError: unknown action (404), bad ratio (400), action not allowed in the current status (409)
+            or event log not keeping up (503)
+        """
+        if action == "ratio":
+            try:
+                ratio = check_ratio(ratio)
+            except ValueError as error:
+                raise ApiError(400, str(error)) from None
+            timer = self._timer(timer_id)
+            timer.set_ratio(ratio)
+            self._log(timer_id, "set_ratio", ratio)
+            self.events.transition(timer_id)
+            return describe_timer(timer_id, timer)
+        method = ACTIONS.get(action)
+        if method is None:
+            raise ApiError(404, f"Unknown action: {action}")
+        timer = self._timer(timer_id)
+        if not transition_allowed(method, timer.status()):
+            if metrics.enabled:
+                metrics.TRANSITIONS.inc((method, "ignored"))
+            raise ApiError(409, f"Cannot {action} while {timer.status()}")
+        started_ns = DEFAULT_CLOCK.now_ns() if metrics.enabled else 0
+        getattr(timer, method)()
+        self._log(timer_id, method)
+        self.events.transition(timer_id)
+        if metrics.enabled:
+            metrics.TRANSITIONS.inc((method, "applied"))
+            metrics.TRANSITION_LATENCY.observe((DEFAULT_CLOCK.now_ns() - started_ns) / NS_PER_SECOND, (method,))
+        return describe_timer(timer_id, timer)
+
+    def batch(self, operations: list) -> list:
+        """Runs [{"timer": id, "action": action or "snapshot", "ratio": value}, ...] in order.
+        A failing operation does not stop the others, its result is {"timer": id, "error": ..., "status": code}.
+        """
+        if not isinstance(operations, list):
+            raise ApiError(400, "batch body has to be a list of operations")
+        if len(operations) > self.max_batch:
+            raise ApiError(413, f"at most {self.max_batch} operations per batch")
+        results = []
+        for operation in operations:
+            timer_id = operation.get("timer") if isinstance(operation, dict) else None
+            try:
+                if not isinstance(timer_id, str) or not timer_id:
+                    raise ApiError(400, "every operation needs a timer id")
+                action = operation.get("action", "snapshot")
+                if not isinstance(action, str):
+                    raise ApiError(400, "action has to be a string")
+                if action == "snapshot":
+                    results.append(self.snapshot(timer_id))
+                else:
+                    results.append(self.act(timer_id, action, operation.get("ratio")))
+            except ApiError as error:
+                results.append({"timer": timer_id, "error": str(error), "status": error.status})
+        return results
+
+    def stats(self) -> dict:
+        return {"registry": self.registry.stats(), "events": self.events.stats(), "cpu_seconds": process_time()}
+
+    def event_stream(self, method: str, target: str) -> Optional[Tuple[str, Optional[int]]]:
+        """Recognizes a subscription, GET /timers/<id>/events[?milestone=<minutes>].
+        :return: timer id and milestone in nanoseconds, None for any other request
+        :raises ApiError: invalid milestone
+        """
+        route, _, query = target.partition("?")
+        parts = route.strip("/").split("/")
+        if method != "GET" or len(parts) != 3 or parts[0] != "timers" or parts[2] != "events" or not parts[1]:
+            return None
+        milestone = parse_qs(query).get("milestone")
+        if milestone is None:
+            return unquote(parts[1]), None
+        try:
+            minutes = float(milestone[0])
+        except ValueError:
+            minutes = 0
+        if not 0 < minutes <= 24 * 60:
+            raise ApiError(400, "milestone has to be a number of minutes in (0, 1440]")
+        return unquote(parts[1]), round(minutes * 60 * NS_PER_SECOND)
+
+    def handle(self, method: str, target: str, body: bytes) -> Tuple[int, object]:
+        """Routes one request. :return: HTTP status and the object to send as JSON (bytes as they are)"""
+        try:
+            return 200, self._route(method, target.split("?", 1)[0], body)
+        except ApiError as error:
+            return error.status, {"error": str(error)}
+
+    def _route(self, method: str, route: str, body: bytes) -> object:
+        parts = route.strip("/").split("/")
+        if parts[0] == "timers" and len(parts) in (2, 3) and parts[1]:
+            timer_id = unquote(parts[1])
+            if len(parts) == 2:
+                _expect(method, "GET")
+                return self.snapshot(timer_id)
+            _expect(method, "POST")
+            ratio = None
+            if parts[2] == "ratio":
+                payload = _json(body)
+                ratio = payload.get("ratio") if isinstance(payload, dict) else None
+            return self.act(timer_id, parts[2], ratio)
+        if route == "/batch":
+            _expect(method, "POST")
+            return self.batch(_json(body))
+        if route == "/stats":
+            _expect(method, "GET")
+            return self.stats()
+        if route == "/metrics":
+            _expect(method, "GET")
+            return metrics.render().encode()
+        raise ApiError(404, f"Not found: {route}")
+
+    def _timer(self, timer_id: str) -> RatioNalTimer:
+        """Timer of the registry, replayed again if another writer of the event log moved it on"""
+        if self.event_log is not None and self.event_log.changed_elsewhere(timer_id):
+            # the replay has to include the events of this api still queued, without blocking the loop for long
+            if not self.event_log.flush(self.flush_timeout):
+                raise ApiError(503, "event log is not keeping up, try again")
+            self.registry.discard(timer_id)
+        return self.registry.get(timer_id)
+
+    def _log(self, timer_id: str, action: str, value: Optional[float] = None) -> None:
+        if self.event_log is not None:
+            self.event_log.append(timer_id, action, value)
+
+
+def _expect(method: str, expected: str) -> None:
+    if method != expected:
+        raise ApiError(405, f"Use {expected}")
+
+
+def _json(body: bytes):
+    try:
+        return json.loads(body) if body else {}
+    except ValueError:
+        raise ApiError(400, "body is not valid JSON") from None
+
+
+def _response(status: int, payload: object, keep_alive: bool) -> bytes:
+    """payload is sent as JSON, bytes as they are (the metrics text)"""
+    if isinstance(payload, bytes):
+        body, content_type = payload, metrics.CONTENT_TYPE.encode()
+    else:
+        body, content_type = json.dumps(payload, separators=(",", ":")).encode(), b"application/json"
+    connection = b"keep-alive" if keep_alive else b"close"
+    return b"HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: %s\r\n\r\n%s" \
+        % (status, _REASONS[status].encode(), content_type, len(body), connection, body)
+
+
+class _HttpProtocol(asyncio.Protocol):
+    """HTTP/1.1 connection: requests are answered in order as soon as they are complete,
+    several requests in one read (pipelining) are all answered from it.
+    A subscription turns the connection into an event stream until it is closed."""
+    def __init__(self, api: TimerApi):
+        self._api = api
+        self._buffer = bytearray()
+        self._transport = None
+        self._subscriber = None
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        self._transport = transport
+
+    def data_received(self, data: bytes) -> None:
+        if self._subscriber is not None:
+            return  # nothing is expected from a subscriber
+        self._buffer += data
+        while self._transport is not None:
+            head_end = self._buffer.find(b"\r\n\r\n")
+            if head_end < 0:
+                if len(self._buffer) > MAX_HEADER_BYTES:
+                    self._fail(431, "headers too large")
+                return
+            try:
+                method, target, keep_alive, length = _parse_head(bytes(self._buffer[:head_end]))
+            except ApiError as error:
+                self._fail(error.status, str(error))
+                return
+            request_end = head_end + 4 + length
+            if len(self._buffer) < request_end:
+                return  # body not complete yet
+            body = bytes(self._buffer[head_end + 4:request_end])
+            del self._buffer[:request_end]
+            try:
+                stream = self._api.event_stream(method, target)
+            except ApiError as error:
+                self._fail(error.status, str(error))
+                return
+            if stream is not None:
+                self._transport.write(_EVENT_STREAM_HEAD)
+                self._subscriber = self._api.events.subscribe(stream[0], self._transport, milestone_ns=stream[1])
+                self._buffer.clear()
+                return
+            status, payload = self._api.handle(method, target, body)
+            self._transport.write(_response(status, payload, keep_alive))
+            if not keep_alive:
+                self._close()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._transport = None
+        if self._subscriber is not None:
+            self._api.events.unsubscribe(self._subscriber)
+
+    # a client sending faster than it reads stops being read until the answers went out
+    def pause_writing(self) -> None:
+        if self._transport is not None:
+            self._transport.pause_reading()
+
+    def resume_writing(self) -> None:
+        if self._transport is not None:
+            self._transport.resume_reading()
+
+    def _fail(self, status: int, message: str) -> None:
+        self._transport.write(_response(status, {"error": message}, keep_alive=False))
+        self._close()
+
+    def _close(self) -> None:
+        self._transport.close()
+        self._transport = None
+
+
+def _parse_head(head: bytes) -> Tuple[str, str, bool, int]:
+    """:return: method, target, keep alive and content length of a request head"""
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise ApiError(400, "malformed request line") from None
+    length = 0
+    connection = ""
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        name = name.lower()
+        if name == "content-length":
+            if not value.strip().isdigit():
+                raise ApiError(400, "malformed Content-Length")
+            length = int(value)
+        elif name == "connection":
+            connection = value.strip().lower()
+        elif name == "transfer-encoding":
+            raise ApiError(501, "send a Content-Length instead of Transfer-Encoding")
+    if length > MAX_BODY_BYTES:
+        raise ApiError(413, "body too large")
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+    return method, target, keep_alive, length
+
+
+async def serve(api: TimerApi, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+    """Starts serving api on host:port in the running event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.create_server(lambda: _HttpProtocol(api), host, port)
+
+
+async def _serve_forever(api: TimerApi, host: str, port: int) -> None:
+    server = await serve(api, host, port)
+    print(f"Serving timers on http://{host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Headless HTTP/JSON API for RatioNalTimers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", help="EventLog database to log to and rebuild timers from, "
+                                     "e.g. the one of the web app. Timers are kept in memory only without it")
+    parser.add_argument("--max-pending-bytes", type=int, default=64 * 1024,
+                        help="unsent event bytes after which a subscriber is disconnected")
+    parser.add_argument("--metrics", action="store_true", help="count transitions for GET /metrics")
+    args = parser.parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+    event_log = EventLog(args.db) if args.db else None
+    api = TimerApi(event_log=event_log)
+    api.events.max_pending_bytes = args.max_pending_bytes
+    try:
+        asyncio.run(_serve_forever(api, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if event_log is not None:
+            event_log.close()
+
+
+if __name__ == "__main__":
+    main()
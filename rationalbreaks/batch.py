@@ -0,0 +1,219 @@
+"""
+This module holds a vectorized engine running many timers at once.
+BatchRatioNalTimer keeps the state of N timers in parallel NumPy arrays and
+calculates every timer's work, rest and rest consumed flag from a single clock
+read with a handful of array operations. Transitions are applied in bulk to the
+timers selected by an index array. The arithmetic is the integer nanosecond
+arithmetic of RatioNalTimer, so both give the same values for the same clock.
+Earned rest (work * denominator // numerator) is calculated as
+work * multiplier // divisor with one divisor shared by all timers (the least common
+multiple of the ratio numerators in use): dividing by a scalar is several times
+faster than an element-wise division and gives the same result.
+"""
+from math import lcm
+from typing import Optional, Union
+
+import numpy as np
+
+from rationalbreaks.clocks import DEFAULT_CLOCK, Clock
+from rationalbreaks.timers import (NOT_STARTED, RESTING, STATUS_LABELS, WORKING, TimerSnapshot,
+                                   ratio_fraction)
+
+Indices = Union[int, slice, np.ndarray, list]
+
+# above this shared divisor the multipliers get too large, element-wise division is used instead
+MAX_SHARED_DIVISOR = 1 << 20
+_INT64_MAX = np.iinfo(np.int64).max
+BLOCK_SIZE = 32768
+
+
+class BatchSnapshot:
+    """Values of every timer of a BatchRatioNalTimer, calculated from the same clock reading.
+    Arrays are indexed like the timers, snapshot[i] gives the TimerSnapshot of timer i.
+    """
+    __slots__ = ("status", "work_ns", "rest_ns", "rest_consumed", "cycles", "taken_at_ns", "cycle_start_ns")
+
+    def __init__(self, status: np.ndarray, work_ns: np.ndarray, rest_ns: np.ndarray,
+                 rest_consumed: np.ndarray, cycles: np.ndarray, taken_at_ns: int, cycle_start_ns: np.ndarray):
+        self.status = status
+        self.work_ns = work_ns
+        self.rest_ns = rest_ns
+        self.rest_consumed = rest_consumed
+        self.cycles = cycles
+        self.taken_at_ns = taken_at_ns
+        self.cycle_start_ns = cycle_start_ns
+
+    def __len__(self) -> int:
+        return len(self.status)
+
+    def __getitem__(self, index: int) -> TimerSnapshot:
+        return TimerSnapshot(status=STATUS_LABELS[self.status[index]],
+                             work_ns=int(self.work_ns[index]),
+                             rest_ns=int(self.rest_ns[index]),
+                             rest_consumed=bool(self.rest_consumed[index]),
+                             cycles=int(self.cycles[index]),
+                             taken_at_ns=self.taken_at_ns,
+                             cycle_start_ns=int(self.cycle_start_ns[index]))
+
+
+class BatchRatioNalTimer:
+    """N RatioNalTimers stored as columns: status, cycle start, cycle count,
+    saved work, saved rest and ratio (with its integer fraction).
+    """
+    def __init__(self, size: int = 0, ratio: float = 3, clock: Optional[Clock] = None):
+        self._clock = clock if clock is not None else DEFAULT_CLOCK
+        self._size = 0
+        self._status = np.zeros(0, dtype=np.int8)
+        self._working = np.zeros(0, dtype=np.int64)  # all bits set where working, and-ed instead of np.where
+        self._resting = np.zeros(0, dtype=np.int64)
+        self._started = np.zeros(0, dtype=np.bool_)
+        self._cycle_start = np.zeros(0, dtype=np.int64)
+        self._cycles = np.zeros(0, dtype=np.int64)
+        self._saved_work = np.zeros(0, dtype=np.int64)
+        self._saved_rest = np.zeros(0, dtype=np.int64)
+        self._ratio = np.zeros(0, dtype=np.float64)
+        self._ratio_numerator = np.ones(0, dtype=np.int64)
+        self._ratio_denominator = np.ones(0, dtype=np.int64)
+        self._rest_multiplier = np.ones(0, dtype=np.int64)
+        self._rest_divisor = 1
+        self._max_shared_work = _INT64_MAX  # longest work for which the shared divisor does not overflow
+        if size:
+            self.add(size, ratio)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, count: int = 1, ratio: float = 3) -> np.ndarray:
+        """Appends count new, not started timers. Returns their indices."""
+        first = self._size
+        self._size += count
+        for name in ("_status", "_working", "_resting", "_started", "_cycle_start", "_cycles", "_saved_work", "_saved_rest",
+                     "_ratio", "_ratio_numerator", "_ratio_denominator", "_rest_multiplier"):
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate((column, np.zeros(count, dtype=column.dtype))))
+        indices = np.arange(first, self._size)
+        self.set_ratio(indices, ratio)
+        return indices
+
+    def start(self, indices: Indices) -> None:
+        self._begin_cycle(indices, self._clock.now_ns(), WORKING)
+
+    def rest(self, indices: Indices) -> None:
+        now = self._clock.now_ns()
+        cycle = now - self._cycle_start[indices]
+        rest = self._rest_at(indices, now)
+        self._saved_work[indices] += cycle
+        self._saved_rest[indices] = rest
+        self._begin_cycle(indices, now, RESTING)
+
+    def continue_work(self, indices: Indices) -> None:
+        now = self._clock.now_ns()
+        self._saved_rest[indices] = self._rest_at(indices, now)
+        self._begin_cycle(indices, now, WORKING)
+
+    def reset(self, indices: Indices) -> None:
+        self._status[indices] = NOT_STARTED
+        self._working[indices] = 0
+        self._resting[indices] = 0
+        self._started[indices] = False
+        self._cycle_start[indices] = 0
+        self._cycles[indices] = 0
+        self._saved_work[indices] = 0
+        self._saved_rest[indices] = 0
+
+    def set_ratio(self, indices: Indices, ratio: Union[float, np.ndarray] = 3) -> None:
+        """Sets one ratio for all selected timers, or one ratio per selected timer."""
+        ratios = np.asarray(ratio, dtype=np.float64)
+        unique, inverse = np.unique(ratios, return_inverse=True)
+        fractions = [ratio_fraction(value) for value in unique]  # raises before anything is changed
+        numerators = np.array([fraction.numerator for fraction in fractions], dtype=np.int64)
+        denominators = np.array([fraction.denominator for fraction in fractions], dtype=np.int64)
+        inverse = inverse.reshape(ratios.shape)
+        self._ratio[indices] = ratios
+        self._ratio_numerator[indices] = numerators[inverse]
+        self._ratio_denominator[indices] = denominators[inverse]
+        self._update_rest_multiplier()
+
+    def get_ratio(self, indices: Indices = slice(None)) -> np.ndarray:
+        return self._ratio[indices]
+
+    def status(self, indices: Indices = slice(None)) -> np.ndarray:
+        """TimerStatus values (0: not started, 1: working, 2: resting)"""
+        return self._status[indices]
+
+    def snapshot(self) -> BatchSnapshot:
+        """Reads the clock once and calculates every timer's values.
+        Columns are processed in blocks of BLOCK_SIZE timers, so intermediate results stay in the CPU cache.
+        """
+        now = self._clock.now_ns()
+        size = self._size
+        work = np.empty(size, dtype=np.int64)
+        rest = np.empty(size, dtype=np.int64)
+        consumed = np.empty(size, dtype=np.bool_)
+        cycle_buffer = np.empty(min(size, BLOCK_SIZE), dtype=np.int64)
+        working_buffer = np.empty_like(cycle_buffer)
+
+        for first in range(0, size, BLOCK_SIZE):
+            block = slice(first, first + BLOCK_SIZE)
+            cycle = cycle_buffer[:min(BLOCK_SIZE, size - first)]
+            working_cycle = working_buffer[:len(cycle)]
+            np.subtract(now, self._cycle_start[block], out=cycle)
+            np.bitwise_and(cycle, self._working[block], out=working_cycle)
+            np.add(working_cycle, self._saved_work[block], out=work[block])
+
+            block_rest = rest[block]
+            self._work_to_rest(working_cycle, block, out=block_rest)
+            block_rest += self._saved_rest[block]
+            block_rest -= np.bitwise_and(cycle, self._resting[block], out=cycle)
+            np.maximum(block_rest, 0, out=block_rest)  # only resting timers can go below 0
+
+            np.equal(block_rest, 0, out=consumed[block])
+            consumed[block] &= self._started[block]
+        return BatchSnapshot(self._status.copy(), work, rest, consumed, self._cycles.copy(), now,
+                             self._cycle_start.copy())
+
+    def _work_to_rest(self, work_ns: np.ndarray, block: slice, out: np.ndarray) -> None:
+        if work_ns.max(initial=0) <= self._max_shared_work:
+            np.multiply(work_ns, self._rest_multiplier[block], out=out)
+            np.floor_divide(out, self._rest_divisor, out=out)
+        else:
+            out[...] = _scale(work_ns, self._ratio_denominator[block], self._ratio_numerator[block])
+
+    def _update_rest_multiplier(self) -> None:
+        divisor = 1
+        for numerator in np.unique(self._ratio_numerator).tolist():
+            divisor = lcm(divisor, numerator)  # Python integers, the lcm of many numerators overflows int64
+            if divisor > MAX_SHARED_DIVISOR:
+                break
+        if divisor > MAX_SHARED_DIVISOR:
+            self._rest_multiplier = self._ratio_denominator.copy()
+            self._rest_divisor = 1
+            self._max_shared_work = -1  # always element-wise
+            return
+        self._rest_multiplier = self._ratio_denominator * (divisor // self._ratio_numerator)
+        self._rest_divisor = divisor
+        self._max_shared_work = _INT64_MAX // max(int(self._rest_multiplier.max(initial=1)), 1)
+
+    def _rest_at(self, indices: Indices, now: int) -> np.ndarray:
+        """Same as RatioNalTimer.rest_time_ns for the selected timers"""
+        status = self._status[indices]
+        saved_rest = self._saved_rest[indices]
+        cycle = now - self._cycle_start[indices]
+        cycle = np.where(status == NOT_STARTED, 0, cycle)
+        working_rest = saved_rest + _scale(cycle, self._ratio_denominator[indices], self._ratio_numerator[indices])
+        remaining = np.maximum(saved_rest - cycle, 0)
+        return np.where(status == WORKING, working_rest, np.where(status == RESTING, remaining, saved_rest))
+
+    def _begin_cycle(self, indices: Indices, now: int, status: int) -> None:
+        self._cycle_start[indices] = now
+        self._cycles[indices] += 1
+        self._status[indices] = status
+        self._working[indices] = -(status == WORKING)
+        self._resting[indices] = -(status == RESTING)
+        self._started[indices] = True
+
+
+def _scale(work_ns: np.ndarray, denominator: np.ndarray, numerator: np.ndarray) -> np.ndarray:
+    """work_ns * denominator // numerator, without the int64 overflow of the product for large denominators"""
+    quotient, remainder = np.divmod(work_ns, numerator)
+    return quotient * denominator + remainder * denominator // numerator
@@ -0,0 +1,160 @@
+"""
+This module is the terminal front end, run with python -m rationalbreaks.
+Without a command it starts a TUI: one status line updated in place, single key actions.
+Commands run one action and exit, for scripts and status bars:
+
+    python -m rationalbreaks start|rest|continue|reset
+    python -m rationalbreaks ratio 4
+    python -m rationalbreaks status [--json]
+
+Timers are rebuilt from and logged to the EventLog, by default the database of the web app,
+so the web app opened with ?timer=<id> continues the same timer (--timer, "default" by default)
+once it rebuilds it from the log (e.g. in a new server process).
+Nothing from Streamlit, asyncio or numpy is imported: a start costs the interpreter,
+sqlite3 and the timer modules only (see benchmarks/cli_startup.py).
+The TUI needs a POSIX terminal (termios), the other commands run anywhere.
+"""
+import argparse
+import json
+import os
+import sys
+from contextlib import contextmanager
+from select import select
+from typing import Optional, TextIO
+
+from rationalbreaks.clocks import NS_PER_SECOND
+from rationalbreaks.eventlog import DEFAULT_DB_PATH, EventLog
+from rationalbreaks.formatting import Precision
+from rationalbreaks.timers import (RatioNalTimer, TimerSnapshot, check_ratio, describe_timer, ns_until_display_change,
+                                   transition_allowed)
+
+DEFAULT_TIMER_ID = "default"
+
+# command -> timer method
+COMMANDS = {"start": "start", "rest": "rest", "continue": "continue_work", "reset": "reset"}
+# TUI key -> timer method, space is the status button of the web app
+KEYS = {"s": "start", "r": "rest", "c": "continue_work", "x": "reset"}
+STATUS_BUTTON = {"Not started": "start", "Working": "rest", "Resting": "continue_work"}
+TUI_HELP = "[space] start/rest/continue  [x] reset  [q] quit"
+
+
+def load_timer(event_log: EventLog, timer_id: str) -> RatioNalTimer:
+    """Rebuilds timer_id from the log, a new timer if nothing was logged for it"""
+    timer = event_log.replay(timer_id)
+    return timer if timer is not None else RatioNalTimer()
+
+
+def act(event_log: EventLog, timer_id: str, timer: RatioNalTimer, method: str,
+        ratio: Optional[float] = None) -> None:
+    """Runs a timer method, or set_ratio, and logs it.
+    :raises ValueError: method not allowed in the current status, or ratio out of RATIO_MIN to RATIO_MAX
+    """
+    if method == "set_ratio":
+        ratio = check_ratio(ratio)
+        timer.set_ratio(ratio)
+        event_log.append(timer_id, method, ratio)
+        return
+    if not transition_allowed(method, timer.status()):
+        raise ValueError(f"Cannot {method.replace('_work', '')} while {timer.status()}")
+    getattr(timer, method)()
+    event_log.append(timer_id, method)
+
+
+def status_line(snapshot: TimerSnapshot, precision: Precision = Precision.SECONDS) -> str:
+    work, rest = snapshot.formatted(precision)
+    line = f"{snapshot.status:<11} work {work}  rest {rest}"
+    if snapshot.rest_consumed and snapshot.status == "Resting":
+        line += "  rest is over"
+    return line
+
+
+def tui(event_log: EventLog, timer_id: str, timer: RatioNalTimer,
+        stdin: Optional[TextIO] = None, stdout: Optional[TextIO] = None,
+        precision: Precision = Precision.SECONDS) -> None:
+    """Shows the timer on one line until q (or end of input), redrawn only when the shown text changes.
+    The terminal bell rings once when a rest runs out.
+    """
+    stdin = stdin if stdin is not None else sys.stdin
+    stdout = stdout if stdout is not None else sys.stdout
+    fd = stdin.fileno()
+    shown = None
+    rung_in_cycle = None
+    stdout.write(TUI_HELP + "\n")
+    with _cbreak(fd):
+        while True:
+            snapshot = timer.snapshot()
+            line = status_line(snapshot, precision)
+            if line != shown:
+                stdout.write("\r" + line + "\x1b[K")
+                shown = line
+            if snapshot.rest_consumed and snapshot.status == "Resting" and rung_in_cycle != snapshot.cycles:
+                stdout.write("\a")
+                rung_in_cycle = snapshot.cycles
+            stdout.flush()
+
+            # sleeps until the line changes or a key is pressed, no polling
+            wait_ns = ns_until_display_change(snapshot, timer.get_ratio(), precision)
+            readable, _, _ = select([fd], [], [], None if wait_ns is None else wait_ns / NS_PER_SECOND)
+            if not readable:
+                continue
+            key = os.read(fd, 1).decode(errors="ignore").lower()
+            if key in ("q", ""):
+                break
+            method = STATUS_BUTTON[snapshot.status] if key == " " else KEYS.get(key)
+            if method is not None and transition_allowed(method, timer.status()):
+                act(event_log, timer_id, timer, method)
+    stdout.write("\n")
+
+
+@contextmanager
+def _cbreak(fd: int):
+    """Keys are read as they are pressed, without echo. Does nothing if fd is not a terminal."""
+    if not os.isatty(fd):
+        yield
+        return
+    import termios  # POSIX only, and only needed by the TUI
+    import tty
+    attributes = termios.tcgetattr(fd)
+    try:
+        tty.setcbreak(fd)
+        yield
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, attributes)
+
+
+def main(argv: Optional[list] = None) -> int:
+    # one parser with a command argument, subparsers would cost a parser (and its translations) each at startup
+    parser = argparse.ArgumentParser(prog="python -m rationalbreaks",
+                                     description="Terminal front end of RatioNalTimer. Without a command, "
+                                                 "a live status line with single key actions (tui).")
+    parser.add_argument("command", nargs="?", default="tui", choices=(*COMMANDS, "ratio", "status", "tui"),
+                        help="start, rest, continue and reset print the new status, ratio needs a value")
+    parser.add_argument("value", nargs="?", type=float, help="work:rest ratio of the ratio command")
+    parser.add_argument("--json", action="store_true", help="status with all values as JSON, as answered by the API")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="EventLog database, the one of the web app by default")
+    parser.add_argument("--timer", default=DEFAULT_TIMER_ID, help="timer id, the web app shows it with ?timer=<id>")
+    args = parser.parse_args(argv)
+    if (args.command == "ratio") != (args.value is not None):
+        parser.error("a value is needed by the ratio command, and only by it")
+
+    with EventLog(args.db) as event_log:
+        timer = load_timer(event_log, args.timer)
+        if args.command == "tui":
+            try:
+                tui(event_log, args.timer, timer)
+            except KeyboardInterrupt:
+                print()
+            return 0
+        try:
+            if args.command == "ratio":
+                act(event_log, args.timer, timer, "set_ratio", args.value)
+            elif args.command != "status":
+                act(event_log, args.timer, timer, COMMANDS[args.command])
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            return 1
+        if args.json:
+            print(json.dumps(describe_timer(args.timer, timer)))
+        else:
+            print(status_line(timer.snapshot()))
+    return 0
@@ -0,0 +1,61 @@
+"""
+This module holds the clocks used by the timers.
+A clock is anything with a now_ns() method returning integer nanoseconds
+from an arbitrary, never decreasing origin.
+MonotonicClock is the default and is not affected by wall clock (NTP/DST) jumps,
+VirtualClock is advanced manually, for tests and simulations.
+"""
+from datetime import timedelta
+from time import monotonic_ns
+from typing import Protocol, Union
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_MICROSECOND = 1_000
+
+
+class Clock(Protocol):
+    """Interface of the clocks accepted by RatioNalTimer"""
+    def now_ns(self) -> int:
+        ...
+
+
+class MonotonicClock:
+    """Default clock, reads time.monotonic_ns"""
+    now_ns = staticmethod(monotonic_ns)
+
+
+class VirtualClock:
+    """Clock that only moves when advanced, lets simulations and tests skip time instantly."""
+    def __init__(self, start_ns: int = 0):
+        self._now = int(start_ns)
+
+    def now_ns(self) -> int:
+        return self._now
+
+    def advance(self, delta: Union[timedelta, float, int]) -> int:
+        """
+        :param delta: timedelta, or seconds as int/float
+        :return: new time in nanoseconds
+        """
+        delta_ns = timedelta_to_ns(delta) if isinstance(delta, timedelta) else round(delta * NS_PER_SECOND)
+        if delta_ns < 0:
+            raise ValueError("VirtualClock can not go backwards")
+        self._now += delta_ns
+        return self._now
+
+    def advance_ns(self, delta_ns: int) -> int:
+        if delta_ns < 0:
+            raise ValueError("VirtualClock can not go backwards")
+        self._now += delta_ns
+        return self._now
+
+
+DEFAULT_CLOCK = MonotonicClock()
+
+
+def ns_to_timedelta(nanoseconds: int) -> timedelta:
+    return timedelta(microseconds=nanoseconds // NS_PER_MICROSECOND)
+
+
+def timedelta_to_ns(time: timedelta) -> int:
+    return (time.days * 86400 + time.seconds) * NS_PER_SECOND + time.microseconds * NS_PER_MICROSECOND
@@ -0,0 +1,311 @@
+"""
+This module holds the durable log of timer transitions.
+EventLog appends every transition (start, rest, continue_work, reset, set_ratio)
+to a local SQLite database in WAL mode. Writes are queued and committed in batches
+by a background thread, so appending only costs a queue put for the caller.
+Timers are rebuilt by replaying their events on top of their latest snapshot.
+A snapshot is written every snapshot_every events per timer, which bounds a replay
+to one snapshot read plus at most snapshot_every events, however long the history.
+Event timestamps are wall clock nanoseconds, as they have to survive restarts.
+Several processes may write to the same database: changed_elsewhere tells whether a timer
+replayed by this log was moved on by another writer since, and has to be replayed again.
+"""
+import json
+import logging
+import sqlite3
+from os import environ, makedirs, path
+from queue import Empty, SimpleQueue
+from threading import Event, Lock, Thread
+from time import time_ns
+from typing import Callable, List, Optional
+
+from rationalbreaks.clocks import VirtualClock
+from rationalbreaks.timers import RatioNalTimer, ratio_fraction
+
+DEFAULT_DB_PATH = environ.get("RATIONALBREAKS_DB",
+                              path.join(path.expanduser("~"), ".rationalbreaks", "events.sqlite3"))
+
+ACTIONS = ("start", "rest", "continue_work", "reset", "set_ratio")
+
+_logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timer_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS events_by_timer ON events (timer_id, id);
+CREATE TABLE IF NOT EXISTS snapshots (
+    timer_id TEXT PRIMARY KEY,
+    event_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    state TEXT NOT NULL
+);
+"""
+
+
+def apply_event(timer: RatioNalTimer, action: str, value: Optional[float] = None) -> None:
+    """Calls the timer method matching a logged action."""
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown action: {action}")
+    if action == "set_ratio":
+        timer.set_ratio(value)
+    else:
+        getattr(timer, action)()
+
+
+class EventLog:
+    """Write-behind, append only log of timer transitions in SQLite (WAL mode)."""
+    def __init__(self,
+                 db_path: str = DEFAULT_DB_PATH,
+                 batch_size: int = 512,
+                 snapshot_every: int = 500,
+                 wall_clock: Callable[[], int] = time_ns):
+        """
+        :param db_path: SQLite database file, created if missing
+        :param batch_size: Maximum number of events committed in one transaction
+        :param snapshot_every: Number of events of a timer after which a new snapshot is written
+        :param wall_clock: Source of event timestamps in nanoseconds
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.snapshot_every = snapshot_every
+        self._wall_clock = wall_clock
+        self._queue = SimpleQueue()
+        self._idle = Event()
+        self._idle.set()
+        self._pending_lock = Lock()
+        self._pending = 0
+        self._since_snapshot = {}
+        self._commit_lock = Lock()  # commits of the writer against the reads counting them
+        self._committed = {}  # timer id -> events of it committed by this log
+        self._replayed = {}  # timer id -> (last event id replayed, events of it committed by this log by then)
+        self._reader = None  # connection of changed_elsewhere, kept open as it runs before every api request
+        self._closed = False
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0  # events of batches that failed to commit
+        self.last_replayed_events = 0
+        directory = path.dirname(path.abspath(db_path))
+        makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+        self._writer = Thread(target=self._write_loop, name="EventLogWriter", daemon=True)
+        self._writer.start()
+
+    def append(self, timer_id: str, action: str, value: Optional[float] = None,
+               timestamp_ns: Optional[int] = None) -> None:
+        """Queues a transition, returns without waiting for the database.
+        :raises ValueError: unknown action, or a set_ratio value the timers refuse (it could not be replayed)
+        """
+        if self._closed:
+            raise RuntimeError("EventLog is closed")
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action: {action}")
+        if action == "set_ratio":
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"set_ratio needs a number, got {value!r}")
+            ratio_fraction(value)
+        timestamp_ns = self._wall_clock() if timestamp_ns is None else timestamp_ns
+        with self._pending_lock:
+            self._pending += 1
+            self._idle.clear()
+        self._queue.put((timer_id, timestamp_ns, action, value))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every queued event is committed. Returns False on timeout."""
+        return self._idle.wait(timeout)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        if self._reader is not None:
+            self._reader.close()
+
+    def timer_ids(self) -> List[str]:
+        with self._connect() as connection:
+            rows = connection.execute("SELECT DISTINCT timer_id FROM events").fetchall()
+        return [row[0] for row in rows]
+
+    def replay(self, timer_id: str, **timer_kwargs) -> Optional[RatioNalTimer]:
+        """Rebuilds a timer from its latest snapshot and the events logged after it.
+        :param timer_kwargs: Passed to RatioNalTimer (e.g. clock, scheduler)
+        :return: None if nothing was logged for timer_id
+        """
+        with self._connect() as connection:
+            with self._commit_lock:
+                replayed = self._replay_state(connection, timer_id)
+                committed = self._committed.get(timer_id, 0)
+        if replayed is None:
+            self._replayed[timer_id] = (0, committed)
+            self.last_replayed_events = 0
+            return None
+        state, last_event_id, last_ts, self.last_replayed_events = replayed
+        self._replayed[timer_id] = (last_event_id, committed)
+        # the running cycle kept going since the last event
+        state["cycle_elapsed_ns"] += max(self._wall_clock() - last_ts, 0)
+        timer = RatioNalTimer(**timer_kwargs)
+        timer.load_state(state)
+        return timer
+
+    def changed_elsewhere(self, timer_id: str) -> bool:
+        """Whether events of timer_id were logged by another writer (e.g. another process) since replay(timer_id).
+        False for a timer this log never replayed.
+        """
+        replayed = self._replayed.get(timer_id)
+        if replayed is None:
+            return False
+        last_event_id, committed = replayed
+        with self._commit_lock:
+            if self._reader is None:
+                self._reader = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            logged, last_logged_id = self._reader.execute(
+                "SELECT COUNT(*), MAX(id) FROM events WHERE timer_id = ? AND id > ?",
+                (timer_id, last_event_id)).fetchone()
+            committed_now = self._committed.get(timer_id, 0)
+        if logged > committed_now - committed:
+            return True
+        if logged:
+            # only own events since: the next check counts from here
+            self._replayed[timer_id] = (last_logged_id, committed_now)
+        return False
+
+    def forget(self, timer_id: str) -> None:
+        """Drops what this log keeps in memory about timer_id, e.g. once its timer left the registry.
+        Until the next replay(timer_id), changed_elsewhere(timer_id) is False.
+        """
+        with self._commit_lock:
+            self._replayed.pop(timer_id, None)
+            self._committed.pop(timer_id, None)
+        self._since_snapshot.pop(timer_id, None)  # counted again from the database
+
+    def __enter__(self) -> "EventLog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _connect(self) -> "_ClosingConnection":
+        connection = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return _ClosingConnection(connection)
+
+    def _replay_state(self, connection: sqlite3.Connection, timer_id: str) -> Optional[tuple]:
+        """Returns (state, last event id, last event timestamp, events replayed) as of the last logged event"""
+        snapshot = connection.execute("SELECT event_id, ts, state FROM snapshots WHERE timer_id = ?",
+                                      (timer_id,)).fetchone()
+        last_event_id, last_ts = (snapshot[0], snapshot[1]) if snapshot else (0, None)
+        events = connection.execute("SELECT id, ts, action, value FROM events "
+                                    "WHERE timer_id = ? AND id > ? ORDER BY id",
+                                    (timer_id, last_event_id)).fetchall()
+        if snapshot is None and not events:
+            return None
+
+        clock = VirtualClock(last_ts if last_ts is not None else events[0][1])
+        timer = RatioNalTimer(clock=clock)
+        if snapshot is not None:
+            timer.load_state(json.loads(snapshot[2]))
+        for last_event_id, timestamp_ns, action, value in events:
+            clock.advance_ns(max(timestamp_ns - clock.now_ns(), 0))  # tolerate wall clock going back
+            apply_event(timer, action, value)
+        return timer.export_state(), last_event_id, clock.now_ns(), len(events)
+
+    def _write_loop(self) -> None:
+        with self._connect() as connection:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                if batch:
+                    self._write_batch(connection, batch)
+
+    def _next_batch(self) -> Optional[list]:
+        try:
+            first = self._queue.get(timeout=0.5)
+        except Empty:
+            return []
+        if first is None:
+            return None
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # handled after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _write_batch(self, connection: sqlite3.Connection, batch: list) -> None:
+        """Commits batch. A batch that fails (e.g. the database stayed locked, the disk is full) is logged
+        and counted in dropped, the writer carries on with the next one.
+        """
+        new_events = {}
+        for event in batch:
+            new_events[event[0]] = new_events.get(event[0], 0) + 1
+        try:
+            connection.execute("BEGIN")
+            connection.executemany("INSERT INTO events (timer_id, ts, action, value) VALUES (?, ?, ?, ?)", batch)
+            with self._commit_lock:
+                connection.execute("COMMIT")
+                for timer_id, count in new_events.items():
+                    self._committed[timer_id] = self._committed.get(timer_id, 0) + count
+        except sqlite3.Error:
+            if connection.in_transaction:
+                connection.rollback()
+            self.dropped += len(batch)
+            _logger.exception("Dropped a batch of %d events", len(batch))
+        else:
+            self.written += len(batch)
+            self.batches += 1
+            for timer_id, count in new_events.items():
+                try:
+                    self._maybe_snapshot(connection, timer_id, count)
+                # e.g. an event the timers refuse, the events themselves are committed
+                except Exception:  # pylint: disable=broad-exception-caught
+                    _logger.exception("Snapshot of timer %r failed", timer_id)
+        finally:
+            with self._pending_lock:
+                self._pending -= len(batch)
+                if not self._pending:
+                    self._idle.set()
+
+    def _maybe_snapshot(self, connection: sqlite3.Connection, timer_id: str, new_events: int) -> None:
+        since_snapshot = self._since_snapshot.get(timer_id)  # forget may drop it meanwhile
+        if since_snapshot is None:
+            # first time seen by this process (or forgotten): count what was logged since the stored snapshot
+            since_snapshot = connection.execute(
+                "SELECT COUNT(*) FROM events WHERE timer_id = ? AND id > "
+                "COALESCE((SELECT event_id FROM snapshots WHERE timer_id = ?), 0)",
+                (timer_id, timer_id)).fetchone()[0]
+        else:
+            since_snapshot += new_events
+        self._since_snapshot[timer_id] = since_snapshot
+        if since_snapshot < self.snapshot_every:
+            return
+        state, event_id, last_ts, _ = self._replay_state(connection, timer_id)
+        connection.execute("INSERT OR REPLACE INTO snapshots (timer_id, event_id, ts, state) VALUES (?, ?, ?, ?)",
+                           (timer_id, event_id, last_ts, json.dumps(state)))
+        self._since_snapshot[timer_id] = 0
+
+
+class _ClosingConnection:
+    """Context manager closing the sqlite connection (sqlite3's own only ends transactions)"""
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self._connection
+
+    def __exit__(self, *exc_info) -> None:
+        self._connection.close()
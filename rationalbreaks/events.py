@@ -0,0 +1,184 @@
+"""
+This module pushes timer events to subscribers, sent as Server-Sent Events by rationalbreaks.api.
+An event is only sent on a transition of a timer and at scheduled moments: when the available
+rest runs out and whenever the work time reaches a multiple of a subscriber's milestone.
+Every event carries the values of the timer at that moment, clients tick locally from them.
+Each subscriber writes into its own transport. The bytes a transport could not send yet are the
+subscriber's queue: one that grows over max_pending_bytes is evicted (disconnected), so a slow
+client never holds back the others, nor piles up memory in the server.
+Deadlines are scheduled once per timer and milestone on the event loop, not per subscriber.
+"""
+import asyncio
+import json
+from itertools import count
+from typing import Callable, Optional
+
+from rationalbreaks.clocks import NS_PER_SECOND
+
+_HEARTBEAT = b": ping\n\n"
+
+
+class Subscriber:
+    """Handle returned by TimerEvents.subscribe, pass it to unsubscribe"""
+    __slots__ = ("timer_id", "transport", "milestone_ns")
+
+    def __init__(self, timer_id: str, transport: asyncio.WriteTransport, milestone_ns: Optional[int]):
+        self.timer_id = timer_id
+        self.transport = transport
+        self.milestone_ns = milestone_ns
+
+
+class _Channel:
+    """Subscribers and scheduled deadlines of one timer"""
+    __slots__ = ("subscribers", "milestones", "announced", "handles")
+
+    def __init__(self):
+        self.subscribers = set()
+        self.milestones = {}  # milestone in ns -> subscribers asking for it
+        self.announced = {}  # milestone in ns -> last work time announced
+        self.handles = []  # scheduled TimerHandles, cancelled on every transition
+
+    def cancel(self) -> None:
+        for handle in self.handles:
+            handle.cancel()
+        self.handles.clear()
+
+
+class TimerEvents:
+    """Fan-out of timer events, to be used from a single event loop.
+    Events are "snapshot" (on subscription), "transition", "rest_consumed" and "milestone",
+    with the timer values as JSON data.
+    """
+    def __init__(self, describe: Callable[[str], dict],
+                 max_pending_bytes: int = 64 * 1024,
+                 heartbeat_seconds: float = 15.0):
+        """
+        :param describe: Returns the current values of a timer id, with at least status, work_ns and rest_ns
+        :param max_pending_bytes: Unsent bytes after which a subscriber is evicted
+        :param heartbeat_seconds: Interval of the comment lines keeping idle connections open
+        """
+        self._describe = describe
+        self.max_pending_bytes = max_pending_bytes
+        self.heartbeat_seconds = heartbeat_seconds
+        self._channels = {}  # timer id -> _Channel
+        self._event_ids = count(1)
+        self._heartbeat = None
+        self.sent = 0
+        self.evictions = 0
+
+    def subscribe(self, timer_id: str, transport: asyncio.WriteTransport,
+                  milestone_ns: Optional[int] = None) -> Subscriber:
+        """Sends the current values of the timer to transport, then every event of it."""
+        channel = self._channels.get(timer_id)
+        if channel is None:
+            channel = self._channels[timer_id] = _Channel()
+        subscriber = Subscriber(timer_id, transport, milestone_ns)
+        channel.subscribers.add(subscriber)
+        if milestone_ns is not None:
+            channel.milestones.setdefault(milestone_ns, set()).add(subscriber)
+        state = self._describe(timer_id)
+        self._send(subscriber, self._encode("snapshot", state))
+        self._schedule(timer_id, channel, state)
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.get_running_loop().call_later(self.heartbeat_seconds, self._beat)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        channel = self._channels.get(subscriber.timer_id)
+        if channel is None or subscriber not in channel.subscribers:
+            return
+        channel.subscribers.discard(subscriber)
+        milestone_subscribers = channel.milestones.get(subscriber.milestone_ns)
+        if milestone_subscribers is not None:
+            milestone_subscribers.discard(subscriber)
+            if not milestone_subscribers:
+                del channel.milestones[subscriber.milestone_ns]
+                channel.announced.pop(subscriber.milestone_ns, None)
+        if not channel.subscribers:
+            channel.cancel()
+            del self._channels[subscriber.timer_id]
+        if not self._channels and self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+
+    def transition(self, timer_id: str) -> None:
+        """Call after every action on a timer, sends its new values to its subscribers."""
+        channel = self._channels.get(timer_id)
+        if channel is None:
+            return
+        state = self._describe(timer_id)
+        self._publish(channel.subscribers, self._encode("transition", state))
+        self._schedule(timer_id, channel, state)
+
+    def stats(self) -> dict:
+        return {"subscribers": sum(len(channel.subscribers) for channel in self._channels.values()),
+                "timers": len(self._channels),
+                "sent": self.sent,
+                "evictions": self.evictions}
+
+    def _schedule(self, timer_id: str, channel: _Channel, state: dict) -> None:
+        channel.cancel()
+        loop = asyncio.get_running_loop()
+        if state["status"] == "Resting" and state["rest_ns"] > 0:
+            channel.handles.append(loop.call_later(state["rest_ns"] / NS_PER_SECOND, self._rest_deadline, timer_id))
+        for milestone_ns in channel.milestones:
+            # milestones passed before (or reset to zero) are not announced
+            channel.announced[milestone_ns] = state["work_ns"] // milestone_ns * milestone_ns
+            if state["status"] == "Working":
+                self._schedule_milestone(timer_id, channel, milestone_ns, state["work_ns"])
+
+    def _schedule_milestone(self, timer_id: str, channel: _Channel, milestone_ns: int, work_ns: int) -> None:
+        wait_ns = milestone_ns - work_ns % milestone_ns
+        channel.handles.append(asyncio.get_running_loop().call_later(
+            wait_ns / NS_PER_SECOND, self._milestone_deadline, timer_id, milestone_ns))
+
+    def _rest_deadline(self, timer_id: str) -> None:
+        channel = self._channels.get(timer_id)
+        if channel is None:
+            return
+        state = self._describe(timer_id)
+        if state["status"] != "Resting":
+            return
+        if state["rest_ns"] > 0:  # woke up a little early
+            self._schedule(timer_id, channel, state)
+            return
+        self._publish(channel.subscribers, self._encode("rest_consumed", state))
+
+    def _milestone_deadline(self, timer_id: str, milestone_ns: int) -> None:
+        channel = self._channels.get(timer_id)
+        if channel is None or milestone_ns not in channel.milestones:
+            return
+        state = self._describe(timer_id)
+        if state["status"] != "Working":
+            return
+        reached = state["work_ns"] // milestone_ns * milestone_ns
+        if reached > channel.announced[milestone_ns]:
+            channel.announced[milestone_ns] = reached
+            self._publish(channel.milestones[milestone_ns], self._encode("milestone", dict(state, milestone_ns=reached)))
+        self._schedule_milestone(timer_id, channel, milestone_ns, state["work_ns"])
+
+    def _beat(self) -> None:
+        for channel in list(self._channels.values()):
+            self._publish(channel.subscribers, _HEARTBEAT)
+        self._heartbeat = asyncio.get_running_loop().call_later(self.heartbeat_seconds, self._beat)
+
+    def _encode(self, event: str, state: dict) -> bytes:
+        # encoded once, the same bytes are written to every subscriber
+        data = json.dumps(state, separators=(",", ":"))
+        return f"event: {event}\nid: {next(self._event_ids)}\ndata: {data}\n\n".encode()
+
+    def _publish(self, subscribers, data: bytes) -> None:
+        for subscriber in tuple(subscribers):
+            self._send(subscriber, data)
+
+    def _send(self, subscriber: Subscriber, data: bytes) -> None:
+        transport = subscriber.transport
+        if transport.is_closing():
+            return  # unsubscribed by its connection_lost
+        if transport.get_write_buffer_size() + len(data) > self.max_pending_bytes:
+            self.evictions += 1
+            self.unsubscribe(subscriber)
+            transport.abort()  # drops what is queued, close() would try to send it first
+            return
+        transport.write(data)
+        self.sent += 1
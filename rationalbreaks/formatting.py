@@ -0,0 +1,86 @@
+"""
+This module formats durations for display, using integer arithmetic only.
+Durations are integer nanoseconds (as kept by RatioNalTimer), the output
+matches SimpleTime: "MM:SS:CC" under an hour, "HH:MM:SS:CC" under a day and
+"D day(s) H:M:S:C" above. Precision drops the trailing units that are not needed,
+so coarse displays skip their formatting (and change less often).
+Fragments under an hour come from precomputed lookup tables.
+"""
+from enum import IntEnum
+from typing import Iterable, List
+
+NS_PER_CENTISECOND = 10_000_000
+
+
+class Precision(IntEnum):
+    """Smallest unit shown by the formatters"""
+    CENTISECONDS = 0
+    SECONDS = 1
+    MINUTES = 2
+
+
+# module level aliases, looking up enum members on the class is slow in the hot path
+CENTISECONDS, SECONDS, MINUTES = Precision.CENTISECONDS, Precision.SECONDS, Precision.MINUTES
+
+# "00".."99" and "00:00".."59:59", index is the number / the seconds within an hour
+_TWO_DIGITS = tuple(f"{number:02}" for number in range(100))
+_MINUTES_SECONDS = tuple(minutes + ":" + seconds for minutes in _TWO_DIGITS[:60] for seconds in _TWO_DIGITS[:60])
+
+# smallest visible step of each precision, in nanoseconds
+PRECISION_STEP_NS = {CENTISECONDS: NS_PER_CENTISECOND,
+                     SECONDS: 100 * NS_PER_CENTISECOND,
+                     MINUTES: 6000 * NS_PER_CENTISECOND}
+_NS_PER_HOUR = 3600 * 1_000_000_000
+
+
+def format_duration_ns(nanoseconds: int, precision: Precision = CENTISECONDS) -> str:
+    """Formats a positive duration, negative values are shown as zero."""
+    centis = nanoseconds // NS_PER_CENTISECOND if nanoseconds > 0 else 0
+    seconds, centi = divmod(centis, 100)
+    if seconds < 3600:
+        if precision == CENTISECONDS:
+            return _MINUTES_SECONDS[seconds] + ":" + _TWO_DIGITS[centi]
+        if precision == SECONDS:
+            return _MINUTES_SECONDS[seconds]
+        return "00:" + _TWO_DIGITS[seconds // 60]
+    hours, seconds_in_hour = divmod(seconds, 3600)
+    if hours < 24:
+        if precision == CENTISECONDS:
+            return _TWO_DIGITS[hours] + ":" + _MINUTES_SECONDS[seconds_in_hour] + ":" + _TWO_DIGITS[centi]
+        if precision == SECONDS:
+            return _TWO_DIGITS[hours] + ":" + _MINUTES_SECONDS[seconds_in_hour]
+        return _TWO_DIGITS[hours] + ":" + _TWO_DIGITS[seconds_in_hour // 60]
+    return _format_days(hours, seconds_in_hour, centi, precision)
+
+
+def format_many(durations_ns: Iterable[int], precision: Precision = CENTISECONDS) -> List[str]:
+    """Formats many durations in one call, with the under an hour case inlined."""
+    step = PRECISION_STEP_NS[precision]
+    minutes_seconds, two_digits = _MINUTES_SECONDS, _TWO_DIGITS
+    centiseconds, seconds_only = precision == CENTISECONDS, precision == SECONDS
+    formatted = []
+    append = formatted.append
+    for nanoseconds in durations_ns:
+        if nanoseconds < 0:  # pylint: disable=consider-using-max-builtin  # cheaper than calling max()
+            nanoseconds = 0
+        if nanoseconds >= _NS_PER_HOUR:
+            append(format_duration_ns(nanoseconds, precision))
+        elif centiseconds:
+            centis = nanoseconds // step
+            append(minutes_seconds[centis // 100] + ":" + two_digits[centis % 100])
+        elif seconds_only:
+            append(minutes_seconds[nanoseconds // step])
+        else:
+            append("00:" + two_digits[nanoseconds // step])
+    return formatted
+
+
+def _format_days(hours: int, seconds_in_hour: int, centi: int, precision: Precision) -> str:
+    days, hours = divmod(hours, 24)
+    unit = "day" if days == 1 else "days"
+    minutes, seconds = divmod(seconds_in_hour, 60)
+    if precision == CENTISECONDS:
+        return f"{days} {unit} {hours}:{minutes}:{seconds}:{centi}"
+    if precision == SECONDS:
+        return f"{days} {unit} {hours}:{minutes}:{seconds}"
+    return f"{days} {unit} {hours}:{minutes}"
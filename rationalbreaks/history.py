@@ -0,0 +1,97 @@
+"""
+This module holds the optional transition history of RatioNalTimer.
+The timer itself only keeps the start of the running cycle, every transition
+(timestamp in nanoseconds and the status entered) can additionally be recorded
+in a CycleHistory: a fixed capacity ring buffer backed by two arrays.
+When full, the oldest entries are either dropped or the whole buffer is handed
+to an external sink (e.g. a file or a database writer) and emptied.
+"""
+from array import array
+from typing import Callable, Iterator, Optional, Tuple
+
+DROP = "drop"
+SPILL = "spill"
+OVERFLOW_POLICIES = (DROP, SPILL)
+
+
+class CycleHistory:
+    """Ring buffer of (timestamp_ns, transition code) pairs.
+    Transition codes are the TimerStatus values entered (0: reset, 1: working, 2: resting).
+    """
+    __slots__ = ("capacity", "overflow", "_sink", "_timestamps", "_codes", "_start", "_size",
+                 "dropped", "spilled")
+
+    def __init__(self,
+                 capacity: int = 1024,
+                 overflow: str = DROP,
+                 sink: Optional[Callable[[array, array], None]] = None):
+        """
+        :param capacity: Number of transitions kept
+        :param overflow: DROP overwrites the oldest entries, SPILL passes a full buffer to sink
+        :param sink: Called with the timestamps and codes arrays (oldest first), required for SPILL
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        if overflow == SPILL and sink is None:
+            raise ValueError("SPILL overflow policy needs a sink")
+        self.capacity = capacity
+        self.overflow = overflow
+        self._sink = sink
+        self._timestamps = array("q", bytes(8 * capacity))
+        self._codes = array("b", bytes(capacity))
+        self._start = 0
+        self._size = 0
+        self.dropped = 0
+        self.spilled = 0
+
+    def append(self, timestamp_ns: int, code: int) -> None:
+        if self._size == self.capacity:
+            if self.overflow == SPILL:
+                self.flush()
+            else:
+                self._start = (self._start + 1) % self.capacity
+                self._size -= 1
+                self.dropped += 1
+        position = (self._start + self._size) % self.capacity
+        self._timestamps[position] = timestamp_ns
+        self._codes[position] = code
+        self._size += 1
+
+    def flush(self) -> None:
+        """Hands the buffered entries to the sink (if any) and empties the buffer."""
+        if self._size and self._sink is not None:
+            self._sink(self.timestamps(), self.codes())
+            self.spilled += self._size
+        self.clear()
+
+    def clear(self) -> None:
+        self._start = 0
+        self._size = 0
+
+    def last(self) -> Optional[Tuple[int, int]]:
+        if not self._size:
+            return None
+        position = (self._start + self._size - 1) % self.capacity
+        return self._timestamps[position], self._codes[position]
+
+    def timestamps(self) -> array:
+        """Timestamps in nanoseconds, oldest first"""
+        return self._ordered(self._timestamps)
+
+    def codes(self) -> array:
+        """Transition codes, oldest first"""
+        return self._ordered(self._codes)
+
+    def _ordered(self, values: array) -> array:
+        end = self._start + self._size
+        if end <= self.capacity:
+            return values[self._start:end]
+        return values[self._start:] + values[:end - self.capacity]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return zip(self.timestamps(), self.codes())
@@ -0,0 +1,229 @@
+"""
+This module holds the counters, gauges and histograms of the hot paths, exported in the
+Prometheus text format (version 0.0.4). Instrumentation is off by default: every instrumented
+spot is guarded by `if metrics.enabled:`, so disabled it costs an attribute read and a branch
+(benchmarks/metrics_overhead.py measures it). enable() or serve() turn it on.
+
+The web app serves /metrics on localhost:RATIONALBREAKS_METRICS_PORT when the variable is set
+(see frontend.st_front_objects.metrics_endpoint), the API has a /metrics route and turns
+instrumentation on with --metrics. Standard library only, the HTTP server is imported by serve().
+"""
+from bisect import bisect_left
+from os import environ
+from threading import Lock, Thread
+from typing import Callable, Dict, Optional, Tuple
+
+PORT_VARIABLE = "RATIONALBREAKS_METRICS_PORT"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# seconds, from a fraction of a frame to a clock visibly stuck
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+enabled = False  # pylint: disable=invalid-name  # switched by enable() and disable()
+
+
+def enable() -> None:
+    global enabled  # pylint: disable=global-statement
+    enabled = True
+
+
+def disable() -> None:
+    global enabled  # pylint: disable=global-statement
+    enabled = False
+
+
+def configured_port() -> Optional[int]:
+    """Port of RATIONALBREAKS_METRICS_PORT, None if not set"""
+    port = environ.get(PORT_VARIABLE)
+    return int(port) if port else None
+
+
+def _labels(names: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._lock = Lock()
+
+    def samples(self) -> list:
+        """:return: (suffix, label text, value) of every sample"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{suffix}{labels} {_number(value)}" for suffix, labels, value in self.samples()]
+        return "\n".join(lines) + "\n"
+
+
+class Counter(_Metric):
+    """Monotonic count per label values, e.g. TRANSITIONS.inc(("start", "applied"))"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: tuple = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [("", _labels(self.label_names, labels), value) for labels, value in values]
+
+
+class Gauge(_Metric):
+    """Value per label values, either set or computed at every export by collect"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                 collect: Optional[Callable[[], Dict[tuple, float]]] = None):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[tuple, float] = {}
+        self.collect = collect
+
+    def set(self, value: float, labels: tuple = ()) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self) -> list:
+        if self.collect is not None:
+            values = sorted(self.collect().items())
+        else:
+            with self._lock:
+                values = sorted(self._values.items())
+        return [("", _labels(self.label_names, labels), value) for labels, value in values]
+
+
+class Histogram(_Metric):
+    """Observations counted in cumulative buckets (upper bounds, in seconds by default)"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}  # labels -> [count per bucket, +Inf last], sum, count
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, labels: tuple = ()) -> int:
+        series = self._series.get(labels)
+        return series[2] if series is not None else 0
+
+    def samples(self) -> list:
+        with self._lock:
+            series = sorted((labels, (list(counts), total, number))
+                            for labels, (counts, total, number) in self._series.items())
+        samples = []
+        for labels, (counts, total, number) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", _labels(self.label_names, labels, f'le="{_number(bound)}"'), cumulative))
+            samples.append(("_sum", _labels(self.label_names, labels), total))
+            samples.append(("_count", _labels(self.label_names, labels), number))
+        return samples
+
+
+class Registry:
+    """Metrics exported together, in the order they were created"""
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def add(self, metric: _Metric) -> _Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self.metrics.values())
+
+
+REGISTRY = Registry()
+
+# display_timers, the server side clock loop
+DISPLAY_ITERATIONS = REGISTRY.add(Counter(
+    "rationalbreaks_display_iterations_total", "Iterations of the server side clock loop"))
+TICK_LATENCY = REGISTRY.add(Histogram(
+    "rationalbreaks_display_tick_latency_seconds", "From the planned tick to the changed clock being sent"))
+SLEEP_OVERSHOOT = REGISTRY.add(Histogram(
+    "rationalbreaks_display_sleep_overshoot_seconds", "How much later than planned the clock loop woke up"))
+# script runs
+RERUNS = REGISTRY.add(Counter(
+    "rationalbreaks_reruns_total", "st.rerun() calls, by the callback that requested them", ("site",)))
+# timer transitions, of StatusControl in the web app and of the API
+TRANSITIONS = REGISTRY.add(Counter(
+    "rationalbreaks_transitions_total", "Timer transitions, applied or ignored in the current status",
+    ("action", "result")))
+TRANSITION_LATENCY = REGISTRY.add(Histogram(
+    "rationalbreaks_transition_seconds", "Duration of applied transitions, logging included", ("action",)))
+# alarm
+ALARM_TRIGGERS = REGISTRY.add(Counter(
+    "rationalbreaks_alarm_triggers_total", "Alarms sent to the player, played at once or armed", ("how",)))
+ALARM_MUTES = REGISTRY.add(Counter("rationalbreaks_alarm_mutes_total", "Alarms muted in the browser"))
+SESSIONS = REGISTRY.add(Gauge(
+    "rationalbreaks_sessions", "Browser sessions by the status of their timer", ("status",)))
+
+
+def render(registry: Registry = REGISTRY) -> str:
+    return registry.render()
+
+
+def serve(port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY):
+    """Serves GET /metrics from a daemon thread and enables instrumentation.
+    :return: the http.server.ThreadingHTTPServer, shutdown() stops it
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        """GET /metrics, the exposition of registry"""
+        def do_GET(self):  # pylint: disable=invalid-name  # the name http.server calls
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scraped every few seconds, not worth a line each
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    enable()
+    return server
@@ -0,0 +1,214 @@
+"""
+This module holds the registry that keeps one timer per session key.
+TimerRegistry is bounded: least recently used timers are evicted when
+capacity is reached and idle timers are evicted once their TTL passes.
+Evicted timers that were started can be spilled to disk (RatioNalTimer.export_state as JSON)
+and are restored transparently on the next access with the same key.
+On a miss an optional loader (e.g. EventLog.replay) can rebuild the timer before a spilled
+one is restored or a new one is created: what the loader knows is never overridden by a spill.
+An optional unloader (e.g. EventLog.forget) is told when a timer leaves memory.
+"""
+import json
+import os
+from collections import OrderedDict
+from hashlib import sha1
+from os import makedirs, path, remove
+from threading import RLock
+from time import monotonic, time_ns
+from typing import Callable, Optional
+
+from rationalbreaks.timers import RatioNalTimer
+
+
+class TimerRegistry:
+    """Session keyed store of RatioNalTimer instances with LRU and idle TTL eviction.
+    Hit/miss/eviction counters are kept to allow sizing the registry for the expected
+    number of concurrent sessions.
+    """
+    def __init__(self,
+                 capacity: int = 4096,
+                 ttl: Optional[float] = None,
+                 spill_dir: Optional[str] = None,
+                 factory: Callable[[], RatioNalTimer] = RatioNalTimer,
+                 clock: Callable[[], float] = monotonic,
+                 loader: Optional[Callable[[str], Optional[RatioNalTimer]]] = None,
+                 unloader: Optional[Callable[[str], None]] = None):
+        """
+        :param capacity: Maximum number of timers kept in memory
+        :param ttl: Seconds of inactivity after which a timer is evicted, None disables expiry
+        :param spill_dir: Private directory (created with mode 0700) for evicted, already started timers.
+            None disables spilling
+        :param factory: Callable creating a new timer on a miss
+        :param clock: Time source for the idle TTL, in seconds
+        :param loader: Called with the key on a miss, may return a rebuilt timer or None
+        :param unloader: Called with the key when its timer leaves memory (evicted, expired or discarded)
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self._factory = factory
+        self._clock = clock
+        self._loader = loader
+        self._unloader = unloader
+        self._timers = OrderedDict()  # key -> [timer, last access], least recent first
+        self._lock = RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.spills = 0
+        self.restores = 0
+        self.loads = 0
+        if spill_dir:
+            _private_directory(spill_dir)
+
+    def get(self, key: str) -> RatioNalTimer:
+        """Returns the timer of key, restoring it from disk or creating it if needed."""
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            entry = self._timers.get(key)
+            if entry is not None:
+                self.hits += 1
+                entry[1] = now
+                self._timers.move_to_end(key)
+                return entry[0]
+
+            self.misses += 1
+            timer = self._loader(key) if self._loader is not None else None
+            if timer is not None:
+                self.loads += 1
+                self._discard_spill(key)  # older than what the loader rebuilt
+            else:
+                timer = self._restore(key)
+            if timer is None:
+                timer = self._factory()
+            self._insert(key, timer, now)
+            return timer
+
+    def peek(self, key: str) -> Optional[RatioNalTimer]:
+        """Returns the in-memory timer of key without touching counters or recency."""
+        with self._lock:
+            entry = self._timers.get(key)
+            return entry[0] if entry is not None else None
+
+    def discard(self, key: str) -> None:
+        """Drops key from memory and from the spill directory, without counting an eviction."""
+        with self._lock:
+            if self._timers.pop(key, None) is not None:
+                self._unload(key)
+            self._discard_spill(key)
+
+    def evict(self, key: str) -> bool:
+        """Evicts key as if it was least recently used (spilled if started). Returns False if not in memory."""
+        with self._lock:
+            entry = self._timers.pop(key, None)
+            if entry is None:
+                return False
+            self.evictions += 1
+            self._spill(key, entry[0])
+            self._unload(key)
+            return True
+
+    def evict_expired(self) -> int:
+        """Evicts every timer idle for longer than ttl. Returns the number evicted."""
+        with self._lock:
+            return self._expire(self._clock())
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._timers.keys())
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._timers),
+                    "capacity": self.capacity,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "hit_ratio": self.hits / lookups if lookups else 0.0,
+                    "evictions": self.evictions,
+                    "expirations": self.expirations,
+                    "spills": self.spills,
+                    "restores": self.restores,
+                    "loads": self.loads}
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._timers
+
+    def _insert(self, key: str, timer: RatioNalTimer, now: float) -> None:
+        self._timers[key] = [timer, now]
+        while len(self._timers) > self.capacity:
+            old_key, (old_timer, _) = self._timers.popitem(last=False)
+            self.evictions += 1
+            self._spill(old_key, old_timer)
+            self._unload(old_key)
+
+    def _expire(self, now: float) -> int:
+        if self.ttl is None:
+            return 0
+        expired = 0
+        # entries are ordered by last access, so expired ones are all at the front
+        while self._timers:
+            key, (timer, last_access) = next(iter(self._timers.items()))
+            if now - last_access <= self.ttl:
+                break
+            del self._timers[key]
+            expired += 1
+            self._spill(key, timer)
+            self._unload(key)
+        self.expirations += expired
+        return expired
+
+    def _unload(self, key: str) -> None:
+        if self._unloader is not None:
+            self._unloader(key)
+
+    def _spill_path(self, key: str) -> str:
+        file_name = sha1(key.encode()).hexdigest() + ".json"
+        return path.join(self.spill_dir, file_name)
+
+    def _spill(self, key: str, timer: RatioNalTimer) -> None:
+        if not self.spill_dir or timer.status() == "Not started":
+            return  # nothing worth resuming
+        # the running cycle goes on while spilled, the wall clock measures it across restarts
+        state = dict(timer.export_state(), spilled_at_ns=time_ns())
+        with open(self._spill_path(key), "w", encoding="utf-8") as spill_file:
+            json.dump(state, spill_file)
+        self.spills += 1
+
+    def _restore(self, key: str) -> Optional[RatioNalTimer]:
+        if not self.spill_dir:
+            return None
+        spill_file = self._spill_path(key)
+        if not path.exists(spill_file):
+            return None
+        with open(spill_file, encoding="utf-8") as spilled:
+            state = json.load(spilled)
+        remove(spill_file)
+        if state["cycles"]:
+            state["cycle_elapsed_ns"] += max(time_ns() - state.pop("spilled_at_ns"), 0)
+        timer = self._factory()
+        timer.load_state(state)
+        self.restores += 1
+        return timer
+
+    def _discard_spill(self, key: str) -> None:
+        if self.spill_dir:
+            spill_file = self._spill_path(key)
+            if path.exists(spill_file):
+                remove(spill_file)
+
+
+def _private_directory(directory: str) -> None:
+    """Creates directory readable by this user only, refuses one that others could write to"""
+    makedirs(directory, mode=0o700, exist_ok=True)
+    if hasattr(os, "getuid"):
+        info = os.stat(directory)
+        if info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise PermissionError(f"Spill directory {directory} must be owned by this user with mode 0700")
@@ -0,0 +1,144 @@
+"""
+This module holds a deadline scheduler shared by many timers.
+Instead of polling a timer to find out whether its rest ran out,
+the timer registers the instant when it happens and gets a callback.
+DeadlineScheduler keeps deadlines in a heap (O(log n) insert) and cancels
+lazily (O(1) cancel, compacted when cancelled entries dominate the heap),
+serviced by a single background thread.
+Times are integer nanoseconds of the scheduler's clock (time.monotonic_ns by default).
+"""
+import heapq
+from itertools import count
+from threading import Condition, Thread
+from time import monotonic_ns
+from typing import Callable, Optional
+
+from rationalbreaks.clocks import NS_PER_SECOND
+
+
+class Deadline:
+    """Handle returned by DeadlineScheduler.schedule, can be used to cancel the callback."""
+    __slots__ = ("when", "callback", "cancelled", "fired")
+
+    def __init__(self, when: int, callback: Callable[[], None]):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+        self.fired = False
+
+    def active(self) -> bool:
+        return not (self.cancelled or self.fired)
+
+
+class DeadlineScheduler:
+    """Runs callbacks once their deadline passed, from one background thread.
+    The thread is started lazily by the first schedule call, unless autostart is False,
+    in which case run_due has to be called by the owner (e.g. from an event loop or tests).
+    """
+    def __init__(self, clock: Callable[[], int] = monotonic_ns, autostart: bool = True):
+        self._clock = clock
+        self._autostart = autostart
+        self._heap = []  # [when, sequence, Deadline]
+        self._sequence = count()
+        self._cancelled = 0
+        self._condition = Condition()
+        self._thread = None
+        self._running = False
+        self.errors = 0  # callbacks that raised
+
+    def schedule(self, when: int, callback: Callable[[], None]) -> Deadline:
+        """Registers callback for the absolute time when, in nanoseconds of the scheduler clock."""
+        deadline = Deadline(when, callback)
+        with self._condition:
+            heapq.heappush(self._heap, (when, next(self._sequence), deadline))
+            if self._autostart and not self._running:
+                self.start()
+            if self._heap[0][2] is deadline:
+                self._condition.notify()  # new earliest deadline
+        return deadline
+
+    def schedule_in(self, delay: int, callback: Callable[[], None]) -> Deadline:
+        return self.schedule(self._clock() + delay, callback)
+
+    def cancel(self, deadline: Optional[Deadline]) -> bool:
+        """Cancels a pending deadline. Returns False if it already fired or got cancelled."""
+        if deadline is None:
+            return False
+        with self._condition:
+            if not deadline.active():
+                return False
+            deadline.cancelled = True
+            self._cancelled += 1
+            if self._cancelled > len(self._heap) // 2:
+                self._compact()
+            return True
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._heap) - self._cancelled
+
+    def run_due(self, now: Optional[int] = None) -> int:
+        """Runs the callbacks of all deadlines passed by now. Returns the number of callbacks run.
+        A callback that raises is logged and counted in errors, the other callbacks and the
+        scheduler thread carry on.
+        """
+        now = self._clock() if now is None else now
+        ran = 0
+        for deadline in self._pop_due(now):
+            try:
+                deadline.callback()
+            except Exception:  # pylint: disable=broad-exception-caught  # counted and logged, the other callbacks still run
+                self.errors += 1
+                _log_callback_error(deadline)
+            ran += 1
+        return ran
+
+    def start(self) -> None:
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._thread = Thread(target=self._run, name="DeadlineScheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _pop_due(self, now: int) -> list:
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                deadline = heapq.heappop(self._heap)[2]
+                if deadline.cancelled:
+                    self._cancelled -= 1
+                    continue
+                deadline.fired = True
+                due.append(deadline)
+        return due
+
+    def _compact(self) -> None:
+        self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+        heapq.heapify(self._heap)
+        self._cancelled = 0
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+                timeout = self._heap[0][0] - self._clock() if self._heap else None
+                if timeout is None or timeout > 0:
+                    self._condition.wait(timeout / NS_PER_SECOND if timeout is not None else None)
+                    continue
+            self.run_due()
+
+
+def _log_callback_error(deadline: Deadline) -> None:
+    import logging  # only once a callback failed, the core imports no logging
+
+    logging.getLogger(__name__).exception("Callback %r of a deadline raised", deadline.callback)
@@ -0,0 +1,147 @@
+"""
+This module holds the sound bank used for alarms.
+SoundBank memory-maps sound files on first use and keeps them keyed by file name,
+so reading a sound never copies it into the Python heap.
+Sounds can be exported to the directory they are served from, optionally transcoded
+to a compact PCM WAV (mono, lower sample rate, 8 or 16 bit) at startup.
+"""
+import mmap
+import wave
+from array import array
+from os import makedirs, path, replace
+from shutil import copyfile
+from threading import Lock
+from typing import Optional
+
+
+class SoundBank:
+    """Lazily loaded, memory-mapped sound files of a directory, keyed by file name."""
+    def __init__(self, directory: str = "resources"):
+        self.directory = directory
+        self._sounds = {}  # file name -> (open file, mmap)
+        self._lock = Lock()
+
+    def get(self, name: str) -> memoryview:
+        """Returns the bytes of a sound file, mapping it into memory on first access."""
+        with self._lock:
+            if name not in self._sounds:
+                sound_file = open(self.path(name), "rb")  # pylint: disable=consider-using-with  # closed by close()
+                self._sounds[name] = (sound_file, mmap.mmap(sound_file.fileno(), 0, access=mmap.ACCESS_READ))
+            return memoryview(self._sounds[name][1])
+
+    def path(self, name: str) -> str:
+        return path.join(self.directory, name)
+
+    def loaded(self) -> list:
+        return list(self._sounds)
+
+    def export(self, name: str, directory: str,
+               sample_rate: Optional[int] = None,
+               mono: bool = False,
+               sample_width: Optional[int] = None) -> str:
+        """Writes name into directory, transcoded if any option is given.
+        Transcoded files get the options in their name (e.g. ring_1-mono-22050hz-8bit.wav).
+        Nothing is written if the exported file is newer than the source.
+        :param sample_rate: Target frames per second, e.g. 22050 (only integer fractions of the source rate)
+        :param mono: Mix all channels down to one
+        :param sample_width: Target bytes per sample, 1 or 2
+        :return: path of the exported file
+        """
+        options = (["mono"] if mono else []) \
+            + ([f"{sample_rate}hz"] if sample_rate else []) \
+            + ([f"{8 * sample_width}bit"] if sample_width else [])
+        stem, extension = path.splitext(name)
+        exported = path.join(directory, "-".join([stem] + options) + extension)
+        source = self.path(name)
+        if path.exists(exported) and path.getmtime(exported) >= path.getmtime(source):
+            return exported
+        makedirs(directory, exist_ok=True)
+        partial = exported + ".partial"
+        if options:
+            self._transcode(name, partial, sample_rate, mono, sample_width)
+        else:
+            copyfile(source, partial)
+        replace(partial, exported)  # readers never see a half written file
+        return exported
+
+    def close(self) -> None:
+        with self._lock:
+            for sound_file, mapped in self._sounds.values():
+                mapped.close()
+                sound_file.close()
+            self._sounds.clear()
+
+    def __contains__(self, name: str) -> bool:
+        return path.exists(self.path(name))
+
+    def _transcode(self, name: str, target: str, sample_rate: Optional[int], mono: bool,
+                   sample_width: Optional[int]) -> None:
+        # wave needs a file object, the mapped bytes are read without a copy through memoryview
+        with wave.open(_MemoryReader(self.get(name)), "rb") as source:
+            params = source.getparams()
+            if params.sampwidth != 2:
+                raise ValueError("Only 16 bit PCM sounds can be transcoded")
+            samples = array("h")
+            samples.frombytes(source.readframes(params.nframes))
+
+        channels = params.nchannels
+        if mono and channels > 1:
+            samples = _mix_down(samples, channels)
+            channels = 1
+
+        frame_rate = params.framerate
+        if sample_rate is not None and sample_rate < frame_rate:
+            if frame_rate % sample_rate:
+                raise ValueError(f"sample_rate has to divide {frame_rate}")
+            samples = _decimate(samples, channels, frame_rate // sample_rate)
+            frame_rate = sample_rate
+
+        width = sample_width or 2
+        if width == 1:
+            data = bytes((sample >> 8) + 128 for sample in samples)  # 8 bit WAV is unsigned
+        elif width == 2:
+            data = samples.tobytes()
+        else:
+            raise ValueError("sample_width has to be 1 or 2")
+
+        with wave.Wave_write(target) as output:
+            output.setnchannels(channels)
+            output.setsampwidth(width)
+            output.setframerate(frame_rate)
+            output.writeframes(data)
+
+
+def _mix_down(samples: array, channels: int) -> array:
+    channel_samples = [samples[channel::channels] for channel in range(channels)]
+    return array("h", (sum(frame) // channels for frame in zip(*channel_samples)))
+
+
+def _decimate(samples: array, channels: int, factor: int) -> array:
+    """Keeps every factor-th frame, averaged with the skipped ones to limit aliasing"""
+    decimated_channels = []
+    for channel in range(channels):
+        channel_samples = samples[channel::channels]
+        groups = [channel_samples[offset::factor] for offset in range(factor)]
+        decimated_channels.append([sum(group) // factor for group in zip(*groups)])
+    return array("h", (sample for frame in zip(*decimated_channels) for sample in frame))
+
+
+class _MemoryReader:
+    """Minimal binary file interface over a memoryview, as needed by wave.open"""
+    def __init__(self, data: memoryview):
+        self._data = data
+        self._position = 0
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._data) if size < 0 else min(self._position + size, len(self._data))
+        chunk = self._data[self._position:end].tobytes()
+        self._position = end
+        return chunk
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, position: int, whence: int = 0) -> int:
+        base = (0, self._position, len(self._data))[whence]
+        self._position = base + position
+        return self._position
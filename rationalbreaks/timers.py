@@ -6,32 +6,117 @@ are the interfaces.
 There is also a SimpleTime class that is returned by one of the methods.
 SimpleTime class is to allow easy display and storage of granual time variables.
 """
-from datetime import datetime, timedelta
-from typing import Optional, Union
-from copy import deepcopy
+from datetime import timedelta
+from enum import IntEnum
+from fractions import Fraction
+from math import ceil
+from typing import Callable, Optional, Tuple, Union
+
+from rationalbreaks.clocks import DEFAULT_CLOCK, Clock, ns_to_timedelta, timedelta_to_ns
+from rationalbreaks.history import CycleHistory
+from rationalbreaks.formatting import PRECISION_STEP_NS, Precision, format_duration_ns, format_many
+from rationalbreaks.scheduler import DeadlineScheduler
+
+# Work:rest ratios are kept as integer fractions (e.g. 1.25 -> 5/4) of at most this denominator,
+# exact for ratios of up to 6 decimal places
+RATIO_MAX_DENOMINATOR = 10 ** 6
+# ratios accepted by the web app, the CLI and the API
+RATIO_MIN = 0.1
+RATIO_MAX = 100.0
+
+
+class TimerStatus(IntEnum):
+    """Status of RatioNalTimer, str() gives the label shown to users"""
+    NOT_STARTED = 0
+    WORKING = 1
+    RESTING = 2
+
+    def __str__(self) -> str:
+        return STATUS_LABELS[self]
+
+
+STATUS_LABELS = ("Not started", "Working", "Resting")
+NOT_STARTED, WORKING, RESTING = TimerStatus.NOT_STARTED, TimerStatus.WORKING, TimerStatus.RESTING
+# action -> statuses it is allowed in (None: always), for the web app, the CLI and the API.
+# Anything else is refused or ignored, e.g. a stale double click. mute_alarm only exists in the web app.
+TRANSITIONS = {"start": (NOT_STARTED,), "rest": (WORKING,), "continue_work": (RESTING,), "reset": None,
+               "mute_alarm": (RESTING,)}
+
+
+def transition_allowed(action: str, status: str) -> bool:
+    """Whether action is allowed in status, a label of STATUS_LABELS (as returned by RatioNalTimer.status)"""
+    allowed = TRANSITIONS[action]
+    return allowed is None or TimerStatus(STATUS_LABELS.index(status)) in allowed
+
+
+def check_ratio(ratio) -> float:
+    """Validates a ratio given by a user, see RATIO_MIN and RATIO_MAX
+    :raises ValueError: not a number in the range
+    """
+    if isinstance(ratio, bool) or not isinstance(ratio, (int, float)) or not RATIO_MIN <= ratio <= RATIO_MAX:
+        raise ValueError(f"ratio has to be a number from {RATIO_MIN:g} to {RATIO_MAX:g}")
+    return float(ratio)
+
+
+def ratio_fraction(ratio: float) -> Fraction:
+    """Integer fraction of a ratio, rest is calculated with it without float division
+    :raises ValueError: ratio not positive or too small to be kept as a fraction
+    """
+    try:
+        fraction = Fraction(float(ratio)).limit_denominator(RATIO_MAX_DENOMINATOR)
+    except OverflowError:
+        raise ValueError(f"Invalid ratio: {ratio}") from None
+    if fraction <= 0:
+        raise ValueError(f"ratio has to be positive and at least 1/{RATIO_MAX_DENOMINATOR}, got {ratio}")
+    return fraction
 
 
 class SimpleTime:
     """This class exists to convert timedelta to easily displayable units.
     Assumes that timedelta is positive.
+    Units are only calculated when one of them (or the string) is first accessed.
     """
+    __slots__ = ("timedelta", "_units")
 
     def __init__(self, time: timedelta):
         self.timedelta = time
-        days, hours, minutes, full_seconds, centi_seconds = self._slice_to_time_units()
-        self.days = days
-        self.hours = hours
-        self.minutes = minutes
-        self.seconds = full_seconds + centi_seconds / 100
-        self.full_seconds = full_seconds
-        self.centi_seconds = centi_seconds
+        self._units = None
 
-    def to_string(self):
-        return str(self)
+    @property
+    def days(self) -> int:
+        return self._time_units()[0]
 
-    def to_timedelta(self):
-        tdelta = deepcopy(self.timedelta)
-        return tdelta
+    @property
+    def hours(self) -> int:
+        return self._time_units()[1]
+
+    @property
+    def minutes(self) -> int:
+        return self._time_units()[2]
+
+    @property
+    def seconds(self) -> float:
+        units = self._time_units()
+        return units[3] + units[4] / 100
+
+    @property
+    def full_seconds(self) -> int:
+        return self._time_units()[3]
+
+    @property
+    def centi_seconds(self) -> int:
+        return self._time_units()[4]
+
+    def to_string(self, precision: Precision = Precision.CENTISECONDS) -> str:
+        return format_duration_ns(timedelta_to_ns(self.timedelta), precision)
+
+    def to_timedelta(self) -> timedelta:
+        return self.timedelta  # timedelta is immutable, no need to copy
+
+    def _time_units(self) -> (int, int, int, int, int):
+        if self._units is None:
+            self._units = self._slice_to_time_units()
+        return self._units
 
     def _slice_to_time_units(self) -> (int, int, int, int, int):
         secs_per_day, secs_per_hour, secs_per_minute = 86400, 3600, 60  # constants
@@ -46,68 +131,144 @@ class SimpleTime:
         return days, int(hours), int(minutes), full_seconds, centi_seconds
 
     def __str__(self) -> str:
-        if self.days == 1:
-            return f"{self.days} day {self.hours}:" \
-                   f"{self.minutes}:{self.full_seconds}:{self.centi_seconds}"
-        if self.days > 1:
-            return f"{self.days} days {self.hours}:" \
-                   f"{self.minutes}:{self.full_seconds}:{self.centi_seconds}"
-        if self.hours > 0:
-            return f"{self.hours:02}:" \
-                   f"{self.minutes:02}:{self.full_seconds:02}:{self.centi_seconds:02}"
-        return f"{self.minutes:02}:{self.full_seconds:02}:{self.centi_seconds:02}"
+        return format_duration_ns(timedelta_to_ns(self.timedelta))
+
+
+class TimerSnapshot:
+    """Immutable view of a timer, every value calculated from the same clock reading.
+    Work and rest are kept in nanoseconds, the work/rest properties convert to timedelta.
+    cycle_start_ns (clock time) identifies the running cycle, unlike cycles it is not reused after a reset.
+    """
+    __slots__ = ("status", "work_ns", "rest_ns", "rest_consumed", "cycles", "taken_at_ns", "cycle_start_ns")
+    status: str
+    work_ns: int
+    rest_ns: int
+    rest_consumed: bool
+    cycles: int
+    taken_at_ns: int
+    cycle_start_ns: int
+
+    def __init__(self, status: str, work_ns: int, rest_ns: int,
+                 rest_consumed: bool, cycles: int, taken_at_ns: int, cycle_start_ns: int = 0):
+        for name, value in zip(self.__slots__, (status, work_ns, rest_ns, rest_consumed, cycles, taken_at_ns,
+                                                cycle_start_ns)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TimerSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("TimerSnapshot is immutable")
+
+    @property
+    def work(self) -> timedelta:
+        return ns_to_timedelta(self.work_ns)
+
+    @property
+    def rest(self) -> timedelta:
+        return ns_to_timedelta(self.rest_ns)
+
+    def work_and_rest_time(self, use_simpletime: bool = True) -> Union[timedelta, SimpleTime]:
+        """Same as RatioNalTimer.work_and_rest_time, without reading the clock again"""
+        if use_simpletime:
+            return SimpleTime(self.work), SimpleTime(self.rest)
+        return self.work, self.rest
+
+    def formatted(self, precision: Precision = Precision.CENTISECONDS) -> Tuple[str, str]:
+        """Work and rest as display strings, without building SimpleTime objects"""
+        formatted = format_many((self.work_ns, self.rest_ns), precision)
+        return formatted[0], formatted[1]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, TimerSnapshot):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __hash__(self) -> int:
+        return hash(tuple(getattr(self, name) for name in self.__slots__))
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"TimerSnapshot({values})"
 
 
 class RatioNalTimer:
     """Main class that measures time after start is triggered and calculates the "deserved" rest
     based on a specified ratio (defaults to 3 -> One third of the work time can be used as rest).
     Can be stopped and restarted for breaks, time passed and available rest can be polled.
+    Time is read from an injectable clock (monotonic by default) and kept as integer nanoseconds,
+    conversion to timedelta happens only in the returned values.
+    If a DeadlineScheduler is passed, the moment the rest runs out is registered on rest()
+    instead of being recalculated by every all_rest_consumed() call, and the optional
+    on_rest_consumed callback is called from the scheduler when it passes.
+    Only the start of the running cycle is kept, pass a CycleHistory to record every transition.
     """
-    def __init__(self, ratio: Optional[float] = None):
-        self._ratio = float(ratio) if ratio is not None else float(3)
-        self._status = "Not started"
-        self._cycle_timestamps = []
-        self._current_cycle_time = timedelta(0)
-        self._saved_work = timedelta(0)
-        self._saved_rest = timedelta(0)
+    __slots__ = ("_clock", "_ratio", "_ratio_numerator", "_ratio_denominator", "_status",
+                 "_cycle_start", "_cycles", "_saved_work", "_saved_rest", "_history",
+                 "_scheduler", "_on_rest_consumed", "_rest_deadline", "_rest_consumed")
+
+    def __init__(self,
+                 ratio: Optional[float] = None,
+                 clock: Optional[Clock] = None,
+                 scheduler: Optional[DeadlineScheduler] = None,
+                 on_rest_consumed: Optional[Callable[[], None]] = None,
+                 history: Optional[CycleHistory] = None):
+        self._clock = clock if clock is not None else DEFAULT_CLOCK
+        self._set_ratio(ratio if ratio is not None else 3)
+        self._status = NOT_STARTED
+        self._cycle_start = 0
+        self._cycles = 0  # number of cycles (work or rest) started since the last reset
+        self._history = history
+        self._saved_work = 0
+        self._saved_rest = 0
+        self._scheduler = scheduler
+        self._on_rest_consumed = on_rest_consumed
+        self._rest_deadline = None
+        self._rest_consumed = False
 
     def start(self) -> None:
-        self._cycle_timestamps.append(datetime.now())
-        self._status = "Working"
+        self._begin_cycle(self._clock.now_ns(), WORKING)
 
     def rest(self) -> None:
-        self._save_cycle_work()
-        self._save_cycle_rest()
-        self._cycle_timestamps.append(datetime.now())
-        self._status = "Resting"
+        now = self._clock.now_ns()
+        self._save_cycle_work(now)
+        self._save_cycle_rest(now)
+        self._begin_cycle(now, RESTING)
+        self._schedule_rest_deadline()
 
     def continue_work(self) -> None:
-        self._save_cycle_rest()
+        self._cancel_rest_deadline()
+        self._save_cycle_rest(self._clock.now_ns())
         self.start()
 
     def get_ratio(self) -> float:
         return self._ratio
 
     def set_ratio(self, new_ratio: float = 3) -> None:
-        converted_to_float = float(new_ratio)
-        self._ratio = converted_to_float
+        self._set_ratio(new_ratio)
 
     def status(self) -> str:
-        return self._status
+        return STATUS_LABELS[self._status]
 
     def work_time(self) -> timedelta:
-        if self._status == "Working":
-            return self._saved_work + self._calculate_cycle_time()
-        if self._status == "Resting":
+        return ns_to_timedelta(self.work_time_ns())
+
+    def rest_time(self) -> timedelta:
+        return ns_to_timedelta(self.rest_time_ns())
+
+    def work_time_ns(self, now: Optional[int] = None) -> int:
+        if self._status is WORKING:
+            return self._saved_work + self._calculate_cycle_time(now)
+        if self._status is RESTING:
             return self._saved_work
         # no cycle is running --> use saved only
         return self._saved_work
 
-    def rest_time(self) -> timedelta:
-        if self._status == "Working":
-            return self._saved_rest + (self._calculate_cycle_time() / self._ratio)
-        if self._status == "Resting":
-            return self._calculate_remaining_rest()
+    def rest_time_ns(self, now: Optional[int] = None) -> int:
+        if self._status is WORKING:
+            return self._saved_rest + self._work_to_rest(self._calculate_cycle_time(now))
+        if self._status is RESTING:
+            return self._calculate_remaining_rest(now)
         # no cycle is running --> use saved only
         return self._saved_rest
 
@@ -120,29 +281,152 @@ class RatioNalTimer:
             return SimpleTime(self.work_time()), SimpleTime(self.rest_time())
         return self.work_time(), self.rest_time()
 
+    def snapshot(self) -> TimerSnapshot:
+        """Reads the clock once and returns status, work, rest, rest consumed flag and cycle count."""
+        now = self._clock.now_ns()
+        rest = self.rest_time_ns(now)
+        cycles = self._cycles
+        return TimerSnapshot(status=STATUS_LABELS[self._status],
+                             work_ns=self.work_time_ns(now),
+                             rest_ns=rest,
+                             rest_consumed=cycles > 0 and rest == 0,
+                             cycles=cycles,
+                             taken_at_ns=now,
+                             cycle_start_ns=self._cycle_start)
+
+    def export_state(self, now: Optional[int] = None) -> dict:
+        """State of the timer as plain values, independent of the clock's origin.
+        The running cycle is stored as time elapsed since its start, as of now.
+        """
+        now = self._clock.now_ns() if now is None else now
+        return {"status": int(self._status),
+                "ratio": self._ratio,
+                "saved_work_ns": self._saved_work,
+                "saved_rest_ns": self._saved_rest,
+                "cycles": self._cycles,
+                "cycle_elapsed_ns": now - self._cycle_start if self._cycles else 0}
+
+    def load_state(self, state: dict, now: Optional[int] = None) -> None:
+        """Restores a state created by export_state, the running cycle continues from now."""
+        now = self._clock.now_ns() if now is None else now
+        self._cancel_rest_deadline()
+        self._set_ratio(state["ratio"])
+        self._status = TimerStatus(state["status"])
+        self._saved_work = state["saved_work_ns"]
+        self._saved_rest = state["saved_rest_ns"]
+        self._cycles = state["cycles"]
+        self._cycle_start = now - state["cycle_elapsed_ns"]
+        if self._status is RESTING:
+            self._schedule_rest_deadline()
+
     def reset(self) -> None:
-        self._status = "Not started"
-        self._cycle_timestamps = []
-        self._current_cycle_time = timedelta(0)
-        self._saved_work = timedelta(0)
-        self._saved_rest = timedelta(0)
+        self._cancel_rest_deadline()
+        self._status = NOT_STARTED
+        self._cycle_start = 0
+        self._cycles = 0
+        self._saved_work = 0
+        self._saved_rest = 0
+        if self._history is not None:
+            self._history.append(self._clock.now_ns(), NOT_STARTED)
 
     def all_rest_consumed(self) -> bool:
-        has_rest_started = bool(self._cycle_timestamps)  # 0 timestamp implies timer not started
-        has_time_expired = self.rest_time() == timedelta(0)
+        if self._rest_deadline is not None:
+            return self._rest_consumed  # set by the scheduler, no need to recalculate
+        has_rest_started = self._cycles > 0  # 0 cycles implies timer not started
+        has_time_expired = self.rest_time_ns() == 0
         is_consumed = has_rest_started and has_time_expired
         return is_consumed
 
-    def _calculate_cycle_time(self) -> timedelta:
-        time_passed = datetime.now() - self._cycle_timestamps[-1]
+    def history(self) -> Optional[CycleHistory]:
+        return self._history
+
+    def _begin_cycle(self, now: int, status: TimerStatus) -> None:
+        self._cycle_start = now
+        self._cycles += 1
+        self._status = status
+        if self._history is not None:
+            self._history.append(now, status)
+
+    def _set_ratio(self, ratio: float) -> None:
+        fraction = ratio_fraction(ratio)
+        self._ratio = float(ratio)
+        self._ratio_numerator = fraction.numerator
+        self._ratio_denominator = fraction.denominator
+
+    def _work_to_rest(self, work_ns: int) -> int:
+        return work_ns * self._ratio_denominator // self._ratio_numerator
+
+    def _calculate_cycle_time(self, now: Optional[int] = None) -> int:
+        now = self._clock.now_ns() if now is None else now
+        time_passed = now - self._cycle_start
         return time_passed
 
-    def _save_cycle_work(self):
-        self._saved_work += self._calculate_cycle_time()
+    def _save_cycle_work(self, now: Optional[int] = None) -> None:
+        self._saved_work += self._calculate_cycle_time(now)
+
+    def _calculate_remaining_rest(self, now: Optional[int] = None) -> int:
+        remaining_rest = self._saved_rest - self._calculate_cycle_time(now)
+        return remaining_rest if remaining_rest >= 0 else 0
+
+    def _save_cycle_rest(self, now: Optional[int] = None) -> None:
+        self._saved_rest = self.rest_time_ns(now)
+
+    def _schedule_rest_deadline(self) -> None:
+        if self._scheduler is None:
+            return
+        self._cancel_rest_deadline()
+        self._rest_consumed = False
+        self._rest_deadline = self._scheduler.schedule_in(self._calculate_remaining_rest(),
+                                                          self._rest_deadline_passed)
 
-    def _calculate_remaining_rest(self) -> timedelta:
-        remaining_rest = self._saved_rest - self._calculate_cycle_time()
-        return remaining_rest if remaining_rest >= timedelta(0) else timedelta(0)
+    def _cancel_rest_deadline(self) -> None:
+        if self._rest_deadline is not None:
+            self._scheduler.cancel(self._rest_deadline)
+        self._rest_deadline = None
+        self._rest_consumed = False
 
-    def _save_cycle_rest(self) -> None:
-        self._saved_rest = self.rest_time()
+    def _rest_deadline_passed(self) -> None:
+        self._rest_consumed = True
+        if self._on_rest_consumed is not None:
+            self._on_rest_consumed()
+
+    def __getstate__(self) -> dict:
+        # scheduler and its deadlines belong to the running process, they are not persisted
+        state = {name: getattr(self, name) for name in RatioNalTimer.__slots__}
+        state.update(_scheduler=None, _on_rest_consumed=None, _rest_deadline=None, _rest_consumed=False)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+def describe_timer(timer_id: str, timer: RatioNalTimer) -> dict:
+    """Values of a timer as plain JSON types, as answered by the API and printed by the CLI"""
+    snapshot = timer.snapshot()
+    work, rest = snapshot.formatted()
+    return {"timer": timer_id,
+            "status": snapshot.status,
+            "work_ns": snapshot.work_ns,
+            "rest_ns": snapshot.rest_ns,
+            "work": work,
+            "rest": rest,
+            "rest_consumed": snapshot.rest_consumed,
+            "cycles": snapshot.cycles,
+            "ratio": timer.get_ratio()}
+
+
+def ns_until_display_change(snapshot: TimerSnapshot, ratio: float,
+                            precision: Precision = Precision.CENTISECONDS) -> Optional[int]:
+    """Nanoseconds until work or rest, shown with precision, change next.
+    While working the rest grows 1/ratio as fast as the work, while resting it counts down.
+    :return: None if neither of them is moving
+    """
+    step = PRECISION_STEP_NS[precision]
+    if snapshot.status == "Working":
+        work_wait = step - snapshot.work_ns % step
+        rest_wait = ceil((step - snapshot.rest_ns % step) * ratio)
+        return min(work_wait, rest_wait)
+    if snapshot.status == "Resting" and snapshot.rest_ns > 0:
+        return snapshot.rest_ns % step + 1
+    return None
@@ -1,13 +1,39 @@
-"""Run this file to kick off streamlit frontend locally on your browser"""
+"""Run this file to kick off streamlit frontend locally on your browser
 
+    python st_run_local.py --profile cprofile --rate 0.05
+profiles a share of the reruns into profiles/, see frontend/profiling.py
+"""
+
+import argparse
 import sys
 from os import path
+from typing import Optional
+
+from frontend import profiling
 
-from streamlit.web import cli as stcli
 
-def main():
+def main(profile: Optional[str] = None,
+         rate: float = profiling.DEFAULT_RATE,
+         tick_rate: float = 0.0,
+         profile_dir: str = profiling.DEFAULT_DIRECTORY,
+         keep: int = profiling.DEFAULT_KEEP):
+    """:param profile: "cprofile" or "stack" profiles a rate share of the script runs, and a tick_rate
+    share of the server side clock ticks, into profile_dir (see frontend.profiling). None does not profile.
+    """
+    from streamlit.web import cli as stcli  # only when the app is started, importing this file stays cheap
+
+    if profile is not None:
+        profiling.RunProfiler(profile_dir, mode=profile, rate=rate, tick_rate=tick_rate, keep=keep).install()
     sys.argv = ["streamlit", "run", path.join("streamlit_ui.py")]
     sys.exit(stcli.main())
 
+
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=profiling.MODES, help="profile script runs, off by default")
+    parser.add_argument("--rate", type=float, default=profiling.DEFAULT_RATE, help="share of the runs profiled")
+    parser.add_argument("--tick-rate", type=float, default=0.0, help="share of the clock loop ticks profiled")
+    parser.add_argument("--profile-dir", default=profiling.DEFAULT_DIRECTORY)
+    parser.add_argument("--keep", type=int, default=profiling.DEFAULT_KEEP, help="most recent profiles kept")
+    args = parser.parse_args()
+    main(args.profile, args.rate, args.tick_rate, args.profile_dir, args.keep)
@@ -3,119 +3,132 @@ File to run for front-end web-application based on streamlit.
 Imports elements from st_front_objects
 Control flow overlaps st_front_objects module and this file
 """
-from time import sleep
+from os import environ
 
 import streamlit as st
 
 from frontend import st_front_objects
+from rationalbreaks.formatting import Precision
+from rationalbreaks.timers import RATIO_MAX, RATIO_MIN
+
+# False falls back to the server side display_timers loop, RATIONALBREAKS_CLOCK=server selects it
+CLIENT_SIDE_CLOCK = environ.get("RATIONALBREAKS_CLOCK", "client") != "server"
+CLOCK_RESYNC_SECONDS = 60
+
+st_front_objects.record_script_run()
+st_front_objects.session_reaper()  # evicts timers of closed sessions, once per process
+st_front_objects.metrics_endpoint()  # localhost:RATIONALBREAKS_METRICS_PORT/metrics, if set
 
 st.markdown(st_front_objects.FORMAT_BUTTONS_HTML, unsafe_allow_html=True)
 
 
-timer = st_front_objects.RatioNalTimerStreamlit()  # cached
-control = st_front_objects.StatusControl(timer)
-alarm = st_front_objects.Alarm()  # cached
+timer = st_front_objects.session_timer()  # cached per session
+control = st_front_objects.StatusControl(timer,
+                                         log=st_front_objects.event_log(),
+                                         timer_id=st_front_objects.session_timer_id())
+alarm = st_front_objects.Alarm(transcode={"mono": True, "sample_rate": 22050})  # cached
 
-sessions = {"status": "Not started", "rest_consumed": False,
+sessions = {"status": timer.status(), "rest_consumed": False,
             "alert": {"play_sound": True, "muted": False},
+            "display_precision": Precision.CENTISECONDS,
             "settings_clicked": False,
             "reset_clicked": False}
 for state, value in sessions.items():
     if state not in st.session_state.keys():
         st.session_state[state] = value
+# the timer may be shared with other tabs, its status is the one shown
+st.session_state["status"] = timer.status()
+
+# One clock read serves the alarm and the display of this run
+snapshot = timer.snapshot()
 
 # Initiating player element here (JS)
 # This pushes down the other buttons a bit, should be on top or bottom
-alarm.load_player_html()
+alarm.load_player_html(snapshot=snapshot, on_mute=st_front_objects.alarm_muted)
 
-# centering all elements
-left, center, right = st.columns(3)
+# hidden tabs and idle users need (almost) no clock updates, a change reruns the script
+page = st_front_objects.page_activity()
+
+
+# Sections below are fragments: interacting with one only reruns that section.
+# Callbacks whose change shows elsewhere (e.g. a new ratio) request a full app run instead.
+# A fragment run never interrupts a full run, and the server side clock loop keeps the full run going
+# while the page is visible: with it, the sections are plain parts of the app and a click reruns it all.
+section = st.fragment if CLIENT_SIDE_CLOCK else lambda function: function
 
-with center:
-    # Settings section
-    settings_container = st.container(border=False)
-    settings_widget1, settings_widget2, settings_widget3, settings_widget4 = \
-        (settings_container.empty() for i in range(4))
 
+@section
+def settings_section():
+    # a fragment is its own container, widgets are written directly (every placeholder costs a delta generator)
+    st_front_objects.begin_fragment()
     if st.session_state.settings_clicked is False:
-        if settings_widget1.button("Settings"):
-            st.session_state.settings_clicked = True
-            st.rerun()
+        st.button("Settings", on_click=st_front_objects.set_session_state, kwargs={"settings_clicked": True})
     else:
-        if settings_widget1.button("Hide settings"):
-            st.session_state.settings_clicked = False
-            st.rerun()
+        st.button("Hide settings", on_click=st_front_objects.set_session_state, kwargs={"settings_clicked": False})
 
         current_ratio = control.get_timer_ratio()
         current_value = st.session_state.alert["play_sound"]
-        new_ratio = settings_widget2.number_input("Work:Rest ratio",
-                                                  min_value=0.1,
-                                                  max_value=100.00,
-                                                  value=current_ratio)
+        st.number_input("Work:Rest ratio",
+                        min_value=RATIO_MIN,
+                        max_value=RATIO_MAX,
+                        value=current_ratio,
+                        key="new_ratio")
+
+        st.toggle("Alarm if rest consumed", value=current_value, key="alarm_sound")
+
+        # coarser clocks change, and so send updates, less often
+        st.selectbox("Clock precision",
+                     options=list(Precision),
+                     index=int(st.session_state.display_precision),
+                     format_func=lambda precision: precision.name.lower(),
+                     key="new_precision")
 
-        alarm_sound = settings_widget3.toggle("Alarm if rest consumed", value=current_value)
+        st.button("Save settings", on_click=control.save_settings)
 
-        if settings_widget4.button("Save settings"):
-            control.set_ratio(new_ratio)
-            st.session_state["alert"]["play_sound"] = alarm_sound
-            st.rerun()
 
-    # Status section
-    status_container = st.container()
-    status_widget1 = status_container.empty()
+@section
+def reset_section():
+    st_front_objects.begin_fragment()
+    if not st.session_state["reset_clicked"]:
+        st.button("Reset timers", on_click=st_front_objects.set_session_state, kwargs={"reset_clicked": True})
+
+    else:
+        st.write("Are you sure you want to reset?")
+        st.button("Confirm", on_click=control.confirm_reset)
+        st.button("Cancel", on_click=st_front_objects.set_session_state, kwargs={"reset_clicked": False})
+
+
+# the browser ticks the clock, the server only resyncs it every CLOCK_RESYNC_SECONDS, while the page is visible
+@st.fragment(run_every=CLOCK_RESYNC_SECONDS if CLIENT_SIDE_CLOCK and page["visible"] else None)
+def clock_section():
+    fragment_run = st_front_objects.begin_fragment()
+    if CLIENT_SIDE_CLOCK:
+        # a full run shares the snapshot of the alarm, a fragment run reads the clock again
+        clock_snapshot = timer.snapshot() if fragment_run else snapshot
+        st_front_objects.display_client_timers(timer_instance=timer, snapshot=clock_snapshot)
+    else:
+        work_time_display = st.empty()
+        rest_time_display = st.empty()
+        st_front_objects.display_timers(timer_instance=timer,
+                                        work_time_display=work_time_display,
+                                        rest_time_display=rest_time_display,
+                                        page=page
+                                        )
+
 
-    if st.session_state.status == "Not started":
-        if status_widget1.button("Start"):
-            control.start()
-            st.rerun()
+# centering all elements
+left, center, right = st.columns(3)
 
-    elif st.session_state.status == "Working":
-        if status_widget1.button("Rest"):
-            control.rest()
-            st.rerun()
+with center:
+    settings_section()
 
-    elif st.session_state.status == "Resting":
-        if status_widget1.button("Continue"):
-            control.continue_work()
-            st.rerun()
+    # Status section: buttons follow the transition table of StatusControl.
+    # Not a fragment, a transition changes every section
+    label, action = control.STATUS_BUTTONS[st.session_state.status]
+    st.button(label, on_click=control.transition, args=(action,))
 
-    # Reset section
-    reset_container = st.container(border=False)
-    reset_widget1, reset_widget2, reset_widget3 = (reset_container.empty() for i in range(3))
+    reset_section()
 
-    if not st.session_state["reset_clicked"]:
-        if reset_widget1.button("Reset timers"):
-            st.session_state["reset_clicked"] = True
-            st.rerun()
+    # Alarm: ringing and its mute button are in the alarm player (client side)
 
-    else:
-        reset_widget1.write("Are you sure you want to reset?")
-        if reset_widget2.button("Confirm"):
-            control.reset()
-            st.session_state["reset_clicked"] = False
-            st.rerun()
-        if reset_widget3.button("Cancel"):
-            st.session_state["reset_clicked"] = False
-            st.rerun()
-
-    # Alarm section
-    # Alarm: mute button
-    alarm_container = st.container()
-    alarm_widget1 = st.empty()
-    if st.session_state["rest_consumed"] and not st.session_state.alert["muted"]:
-        if alarm_widget1.button("Mute alarm"):
-            control.mute_alarm()
-            st.rerun()
-
-    # Alarm: We are looping here while alarm is playing
-    while st.session_state["rest_consumed"] and not st.session_state.alert["muted"]:
-        sleep(1)
-        st.rerun()
-
-    # Display
-    work_time_display = st.empty()
-    rest_time_display = st.empty()
-    st_front_objects.display_timers(timer_instance=timer,
-                                    work_time_display=work_time_display,
-                                    rest_time_display=rest_time_display
-                                    )
+    clock_section()
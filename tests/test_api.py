@@ -0,0 +1,229 @@
+import asyncio
+import json
+from os import path
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase, TestCase, main as unittest_main
+from unittest.mock import MagicMock
+
+from rationalbreaks import metrics
+from rationalbreaks.api import ApiError, TimerApi, serve, _parse_head, _response
+from rationalbreaks.clocks import VirtualClock
+from rationalbreaks.eventlog import EventLog
+from rationalbreaks.registry import TimerRegistry
+from rationalbreaks.timers import RatioNalTimer
+
+
+class TestTimerApi(TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.api = TimerApi(TimerRegistry(factory=lambda: RatioNalTimer(clock=self.clock)))
+
+    def request(self, method: str, target: str, body=None):
+        return self.api.handle(method, target, json.dumps(body).encode() if body is not None else b"")
+
+    def test_snapshot_and_actions(self):
+        # Case 1: new timer
+        status, snapshot = self.request("GET", "/timers/editor")
+        self.assertEqual(status, 200)
+        self.assertEqual(snapshot["status"], "Not started")
+        self.assertEqual(snapshot["timer"], "editor")
+
+        # Case 2: actions return the new snapshot
+        self.request("POST", "/timers/editor/start")
+        self.clock.advance(30)
+        status, snapshot = self.request("POST", "/timers/editor/rest")
+        self.assertEqual((status, snapshot["status"]), (200, "Resting"))
+        self.assertEqual(snapshot["work_ns"], 30_000_000_000)
+        self.assertEqual(snapshot["rest"], "00:10:00")
+        status, snapshot = self.request("POST", "/timers/editor/continue")
+        self.assertEqual(snapshot["status"], "Working")
+
+        # Case 3: action not allowed in the current status
+        status, error = self.request("POST", "/timers/editor/start")
+        self.assertEqual(status, 409)
+        self.assertIn("Working", error["error"])
+
+        # Case 4: reset is always allowed, ids are url decoded
+        status, snapshot = self.request("POST", "/timers/editor/reset")
+        self.assertEqual(snapshot["status"], "Not started")
+        self.assertEqual(self.request("GET", "/timers/status%20bar?x=1")[1]["timer"], "status bar")
+
+    def test_ratio(self):
+        status, snapshot = self.request("POST", "/timers/a/ratio", {"ratio": 4})
+        self.assertEqual((status, snapshot["ratio"]), (200, 4.0))
+
+        # Case 2: invalid values
+        for body in ({"ratio": 0}, {"ratio": 0.004}, {"ratio": 101}, {"ratio": "4"}, {"ratio": True}, {}, [4]):
+            self.assertEqual(self.request("POST", "/timers/a/ratio", body)[0], 400, body)
+        self.assertEqual(self.api.handle("POST", "/timers/a/ratio", b"{")[0], 400)
+
+    def test_routing_errors(self):
+        self.assertEqual(self.request("GET", "/nothing")[0], 404)
+        self.assertEqual(self.request("POST", "/timers/a/fly")[0], 404)
+        self.assertEqual(self.request("POST", "/timers/a")[0], 405)
+        self.assertEqual(self.request("GET", "/timers/a/start")[0], 405)
+        self.assertEqual(self.request("GET", "/batch")[0], 405)
+
+        # Case 2: an invalid action creates no timer
+        self.assertEqual(self.request("POST", "/timers/typo/ratio", {"ratio": 0})[0], 400)
+        self.assertEqual(self.api.registry.keys(), [])
+
+    def test_batch(self):
+        status, results = self.request("POST", "/batch", [{"timer": "a", "action": "start"},
+                                                          {"timer": "b"},
+                                                          {"timer": "b", "action": "rest"},
+                                                          {"action": "start"},
+                                                          {"timer": "c", "action": {}},
+                                                          {"timer": "a", "action": "ratio", "ratio": 2}])
+        self.assertEqual(status, 200)
+        self.assertEqual([result.get("status") for result in results],
+                         ["Working", "Not started", 409, 400, 400, "Working"])
+        self.assertEqual(results[5]["ratio"], 2.0)
+        self.assertNotIn("c", self.api.registry)
+
+        # Case 2: not a list, too many operations
+        self.assertEqual(self.request("POST", "/batch", {"timer": "a"})[0], 400)
+        self.api.max_batch = 1
+        self.assertEqual(self.request("POST", "/batch", [{"timer": "a"}, {"timer": "b"}])[0], 413)
+
+    def test_event_log(self):
+        with TemporaryDirectory() as directory:
+            log = EventLog(path.join(directory, "events.sqlite3"))
+            api = TimerApi(event_log=log)
+            api.act("shared", "start")
+            api.act("shared", "ratio", 5)
+            log.flush(timeout=5)
+
+            # Case 1: the log rebuilds the timer, e.g. in the web app or after a restart
+            self.assertEqual(log.replay("shared").get_ratio(), 5.0)
+            restarted = TimerApi(event_log=log)
+            self.assertEqual(restarted.snapshot("shared")["status"], "Working")
+            log.close()
+
+    def test_slow_event_log(self):
+        log = MagicMock(spec=EventLog)
+        log.changed_elsewhere.return_value = True
+        log.flush.return_value = False
+        api = TimerApi(TimerRegistry(), event_log=log, flush_timeout=0.01)
+
+        # the event loop waits flush_timeout at most, the client is told to try again
+        self.assertEqual(api.handle("POST", "/timers/a/start", b"")[0], 503)
+        log.flush.assert_called_once_with(0.01)
+        self.assertNotIn("a", api.registry)
+
+    def test_other_writer(self):
+        with TemporaryDirectory() as directory:
+            log = EventLog(path.join(directory, "events.sqlite3"))
+            self.addCleanup(log.close)
+            web_log = EventLog(log.db_path)  # e.g. the web app, in another process
+            self.addCleanup(web_log.close)
+            api = TimerApi(event_log=log)
+            api.act("shared", "start")
+            api.act("shared", "ratio", 5)
+            log.flush(timeout=5)
+
+            # Case 1: the own events of the api do not replay the timer
+            self.assertEqual(api.snapshot("shared")["status"], "Working")
+            self.assertEqual(api.registry.loads, 0)
+
+            # Case 2: a transition logged by another writer is seen, the next action starts from it
+            web_log.append("shared", "rest")
+            web_log.flush(timeout=5)
+            self.assertEqual(api.snapshot("shared")["status"], "Resting")
+            self.assertEqual(api.act("shared", "continue")["status"], "Working")
+            self.assertEqual(api.registry.loads, 1)
+
+            # Case 3: what the api logged is what the other writer replays
+            log.flush(timeout=5)
+            replayed = web_log.replay("shared")
+            self.assertEqual((replayed.status(), replayed.get_ratio()), ("Working", 5.0))
+            self.assertFalse(api.event_log.changed_elsewhere("shared"))
+
+            # Case 4: the log forgets the timers the registry lets go of
+            api.registry.evict("shared")
+            self.assertEqual((log._replayed, log._committed, log._since_snapshot), ({}, {}, {}))
+
+    def test_metrics(self):
+        applied = metrics.TRANSITIONS.value(("start", "applied"))
+        ignored = metrics.TRANSITIONS.value(("continue_work", "ignored"))
+        metrics.enable()
+        try:
+            self.request("POST", "/timers/a/start")
+            self.request("POST", "/timers/a/continue")
+        finally:
+            metrics.disable()
+
+        # Case 1: transitions are counted by timer method, the text is sent as it is
+        status, text = self.request("GET", "/metrics")
+        self.assertEqual(status, 200)
+        self.assertIn(f'rationalbreaks_transitions_total{{action="start",result="applied"}} {applied + 1:g}\n'.encode(),
+                      text)
+        self.assertEqual(metrics.TRANSITIONS.value(("continue_work", "ignored")), ignored + 1)
+        self.assertIn(b"Content-Type: text/plain; version=0.0.4", _response(200, text, keep_alive=True))
+
+        # Case 2: disabled, nothing is counted
+        self.request("POST", "/timers/b/start")
+        self.assertEqual(metrics.TRANSITIONS.value(("start", "applied")), applied + 1)
+        self.assertEqual(self.request("POST", "/metrics")[0], 405)
+
+    def test_parse_head(self):
+        head = b"POST /batch HTTP/1.1\r\nHost: x\r\ncontent-length: 12"
+        self.assertEqual(_parse_head(head), ("POST", "/batch", True, 12))
+        # Case 2: connection handling of HTTP/1.1 and 1.0
+        self.assertFalse(_parse_head(b"GET / HTTP/1.1\r\nConnection: close")[2])
+        self.assertFalse(_parse_head(b"GET / HTTP/1.0")[2])
+        self.assertTrue(_parse_head(b"GET / HTTP/1.0\r\nConnection: keep-alive")[2])
+        # Case 3: rejected heads
+        for head, status in ((b"GET /", 400), (b"GET / HTTP/1.1\r\nContent-Length: -1", 400),
+                             (b"GET / HTTP/1.1\r\nTransfer-Encoding: chunked", 501),
+                             (b"GET / HTTP/1.1\r\nContent-Length: 99999999", 413)):
+            with self.assertRaises(ApiError) as raised:
+                _parse_head(head)
+            self.assertEqual(raised.exception.status, status)
+
+
+class TestServer(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = await serve(TimerApi(), port=0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def read_response(self, reader):
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+        return int(head[9:12]), json.loads(await reader.readexactly(length)), head
+
+    async def test_keep_alive_and_pipelining(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        # Case 1: two pipelined requests, the second with a body split across writes
+        body = json.dumps({"ratio": 2}).encode()
+        writer.write(b"POST /timers/a/start HTTP/1.1\r\nContent-Length: 0\r\n\r\n"
+                     b"POST /timers/a/ratio HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body[:3])
+        await writer.drain()
+        writer.write(body[3:])
+        status, snapshot, _ = await self.read_response(reader)
+        self.assertEqual((status, snapshot["status"]), (200, "Working"))
+        status, snapshot, _ = await self.read_response(reader)
+        self.assertEqual((status, snapshot["ratio"]), (200, 2.0))
+
+        # Case 2: same connection, closed on request
+        writer.write(b"GET /timers/a HTTP/1.1\r\nConnection: close\r\n\r\n")
+        status, snapshot, head = await self.read_response(reader)
+        self.assertIn(b"Connection: close", head)
+        self.assertEqual(await reader.read(), b"")
+        writer.close()
+
+    async def test_bad_request(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(b"nonsense\r\n\r\n")
+        status, error, _ = await self.read_response(reader)
+        self.assertEqual(status, 400)
+        self.assertEqual(await reader.read(), b"")
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -0,0 +1,129 @@
+from unittest import TestCase, main as unittest_main
+from random import Random
+
+import numpy as np
+
+from rationalbreaks.batch import BLOCK_SIZE, MAX_SHARED_DIVISOR, BatchRatioNalTimer
+from rationalbreaks.clocks import VirtualClock
+from rationalbreaks.timers import RatioNalTimer
+
+SECOND = 1_000_000_000
+
+
+class TestBatchRatioNalTimer(TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.batch = BatchRatioNalTimer(4, ratio=2, clock=self.clock)
+
+    def test_init(self):
+        self.assertEqual(len(self.batch), 4)
+        np.testing.assert_array_equal(self.batch.status(), [0, 0, 0, 0])
+        np.testing.assert_array_equal(self.batch.get_ratio(), [2, 2, 2, 2])
+
+        # Case 2: added timers get their own ratio
+        indices = self.batch.add(2, ratio=5)
+        np.testing.assert_array_equal(indices, [4, 5])
+        self.assertEqual(self.batch.get_ratio(5), 5)
+
+    def test_snapshot(self):
+        self.batch.start([0, 1, 2])
+        self.clock.advance(60)
+        self.batch.rest([1, 2])
+        self.clock.advance(20)
+        self.batch.continue_work(2)
+        self.clock.advance(40)
+        snapshot = self.batch.snapshot()
+
+        np.testing.assert_array_equal(snapshot.status, [1, 2, 1, 0])
+        np.testing.assert_array_equal(snapshot.work_ns // SECOND, [120, 60, 100, 0])
+        np.testing.assert_array_equal(snapshot.rest_ns // SECOND, [60, 0, 30, 0])
+        np.testing.assert_array_equal(snapshot.rest_consumed, [False, True, False, False])
+
+        # Case 2: single timer view
+        self.assertEqual(snapshot[2].status, "Working")
+        self.assertEqual(snapshot[2].rest_ns, 30 * SECOND)
+
+    def test_reset_and_ratio(self):
+        self.batch.start(slice(None))
+        self.clock.advance(30)
+        self.batch.reset(np.array([0, 3]))
+        self.batch.set_ratio([1, 2], [3, 1.5])
+        snapshot = self.batch.snapshot()
+
+        np.testing.assert_array_equal(snapshot.work_ns // SECOND, [0, 30, 30, 0])
+        np.testing.assert_array_equal(snapshot.rest_ns // SECOND, [0, 10, 20, 0])
+        np.testing.assert_array_equal(snapshot.cycles, [0, 1, 1, 0])
+
+    def test_element_wise_division(self):
+        """Ratios whose numerators have a too large common multiple are divided element-wise"""
+        ratios = [7.3, 9.7, 8.9, 8.3, 7.9]
+        timers = [RatioNalTimer(ratio, clock=self.clock) for ratio in ratios]
+        batch = BatchRatioNalTimer(len(ratios), clock=self.clock)
+        batch.set_ratio(slice(None), ratios)
+        self.assertGreater(np.lcm.reduce(batch._ratio_numerator), MAX_SHARED_DIVISOR)
+
+        batch.start(slice(None))
+        for timer in timers:
+            timer.start()
+        self.clock.advance(12345.678)
+        snapshot = batch.snapshot()
+        for i, timer in enumerate(timers):
+            self.assertEqual(snapshot[i], timer.snapshot())
+
+    def test_fine_ratios(self):
+        """Ratios with large fractions are exact and do not overflow over long work periods"""
+        ratios = [2.718281, 0.1, 99.999999, 1 / 3]
+        timers = [RatioNalTimer(ratio, clock=self.clock) for ratio in ratios]
+        batch = BatchRatioNalTimer(len(ratios), clock=self.clock)
+        batch.set_ratio(slice(None), ratios)
+        batch.start(slice(None))
+        for timer in timers:
+            timer.start()
+        self.clock.advance(90 * 24 * 3600 + 0.123456789)
+        snapshot = batch.snapshot()
+        for i, timer in enumerate(timers):
+            self.assertEqual(snapshot[i], timer.snapshot())
+        self.assertEqual(int(snapshot.rest_ns[1]), int(snapshot.work_ns[1]) * 10)
+
+        # Case 2: a ratio too small for a fraction is refused before anything changes
+        with self.assertRaises(ValueError):
+            batch.set_ratio([0, 1], [3, 1e-9])
+        np.testing.assert_array_equal(batch.get_ratio(), ratios)
+
+    def test_blocks(self):
+        """Timers in every block are calculated, including a partial last block"""
+        batch = BatchRatioNalTimer(BLOCK_SIZE * 2 + 3, ratio=4, clock=self.clock)
+        batch.start(np.arange(0, len(batch), 2))
+        self.clock.advance(40)
+        snapshot = batch.snapshot()
+
+        self.assertEqual(len(snapshot), BLOCK_SIZE * 2 + 3)
+        np.testing.assert_array_equal(snapshot.rest_ns[-4:] // SECOND, [0, 10, 0, 10])
+        self.assertEqual(int(np.count_nonzero(snapshot.work_ns)), BLOCK_SIZE + 2)
+
+    def test_matches_ratio_nal_timer(self):
+        """Random transitions applied to both engines give the same snapshots"""
+        random = Random(10)
+        clock = VirtualClock(start_ns=1_700_000_000 * SECOND)
+        size = 50
+        ratios = [random.choice([1, 1.5, 2, 3, 7.3, 0.33]) for _ in range(size)]
+        timers = [RatioNalTimer(ratio, clock=clock) for ratio in ratios]
+        batch = BatchRatioNalTimer(size, clock=clock)
+        batch.set_ratio(slice(None), ratios)
+        actions = {"start": (0, 1, 2), "rest": (1, 2), "continue_work": (1, 2), "reset": (0, 1, 2)}
+
+        for _ in range(300):
+            action = random.choice(list(actions))
+            selected = [i for i in random.sample(range(size), 10) if batch.status(i) in actions[action]]
+            getattr(batch, action)(selected)
+            for i in selected:
+                getattr(timers[i], action)()
+            clock.advance_ns(random.randrange(0, 120 * SECOND))
+
+            snapshot = batch.snapshot()
+            for i, timer in enumerate(timers):
+                self.assertEqual(snapshot[i], timer.snapshot())
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -0,0 +1,96 @@
+import io
+import json
+import os
+from contextlib import redirect_stderr, redirect_stdout
+from os import path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main as unittest_main
+
+from benchmarks import cli_startup
+from rationalbreaks.cli import main, tui
+from rationalbreaks.clocks import VirtualClock
+from rationalbreaks.eventlog import EventLog
+from rationalbreaks.timers import RatioNalTimer
+
+
+class TestCli(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.db_path = path.join(self.directory.name, "events.sqlite3")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_cli(self, *args) -> (int, str, str):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            code = main(["--db", self.db_path, "--timer", "desk", *args])
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def test_commands(self):
+        # Case 1: every process continues the logged timer
+        self.assertEqual(self.run_cli("start")[0], 0)
+        self.assertEqual(self.run_cli("ratio", "4")[0], 0)
+        code, out, _ = self.run_cli("rest")
+        self.assertEqual(code, 0)
+        self.assertTrue(out.startswith("Resting"))
+        state = json.loads(self.run_cli("status", "--json")[1])
+        self.assertEqual((state["timer"], state["status"], state["ratio"], state["cycles"]), ("desk", "Resting", 4.0, 2))
+
+        # Case 2: action not allowed, nothing logged
+        code, _, err = self.run_cli("rest")
+        self.assertEqual(code, 1)
+        self.assertIn("Cannot rest while Resting", err)
+        self.assertEqual(self.run_cli("ratio", "0")[0], 1)
+        self.assertEqual(self.run_cli("ratio", "0.004")[0], 1)  # below the range of the web app
+
+        # Case 3: usage errors
+        for args in (("ratio",), ("status", "4"), ("fly",)):
+            with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+                self.run_cli(*args)
+
+    def test_shared_with_web_app(self):
+        # the web app logs the transitions of its timers to the same database
+        with EventLog(self.db_path) as log:
+            log.append("desk", "start")
+            log.append("desk", "set_ratio", 2.0)
+        self.assertEqual(json.loads(self.run_cli("status", "--json")[1])["ratio"], 2.0)
+
+        self.run_cli("rest")
+        with EventLog(self.db_path) as log:
+            self.assertEqual(log.replay("desk").status(), "Resting")
+
+    def test_tui(self):
+        read_end, write_end = os.pipe()
+        os.write(write_end, b" xssq")  # start, reset, start, start again (not allowed), quit
+        os.close(write_end)
+        output = io.StringIO()
+        with EventLog(self.db_path) as log, open(read_end) as keys:
+            tui(log, "desk", RatioNalTimer(), stdin=keys, stdout=output)
+        self.assertEqual([line.split()[0] for line in output.getvalue().split("\r")[1:]],
+                         ["Not", "Working", "Not", "Working"])
+        with EventLog(self.db_path) as log:
+            self.assertEqual(log.replay("desk").status(), "Working")
+
+        # Case 2: the bell rings once when the rest runs out, input ending quits
+        read_end, write_end = os.pipe()
+        os.write(write_end, b"  ")  # start and rest while the clock stands still, no rest was earned
+        os.close(write_end)
+        output = io.StringIO()
+        with EventLog(self.db_path) as log, open(read_end) as keys:
+            tui(log, "other", RatioNalTimer(clock=VirtualClock()), stdin=keys, stdout=output)
+        self.assertEqual(output.getvalue().count("\a"), 1)
+        self.assertIn("rest is over", output.getvalue())
+
+
+class TestStartup(TestCase):
+    def test_cold_start(self):
+        # none of the heavy dependencies of the web app and the API,
+        # the time against BUDGET_MS is checked by python -m benchmarks.cli_startup, too noisy for a test
+        result = cli_startup.run(runs=1)
+        for heavy in ("streamlit", "asyncio", "numpy"):
+            self.assertNotIn(heavy, result["modules"])
+
+
+if __name__ == '__main__':
+    unittest_main()
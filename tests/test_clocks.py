@@ -0,0 +1,48 @@
+from unittest import TestCase, main as unittest_main
+from datetime import timedelta
+
+from rationalbreaks.clocks import (MonotonicClock, VirtualClock,
+                                   ns_to_timedelta, timedelta_to_ns)
+
+
+class TestMonotonicClock(TestCase):
+    def test_now_ns(self):
+        clock = MonotonicClock()
+        first = clock.now_ns()
+        self.assertIsInstance(first, int)
+        self.assertGreaterEqual(clock.now_ns(), first)
+
+
+class TestVirtualClock(TestCase):
+    def setUp(self):
+        self.clock = VirtualClock(start_ns=100)
+
+    def test_advance(self):
+        # Case 1: seconds
+        self.assertEqual(self.clock.advance(1.5), 1_500_000_100)
+
+        # Case 2: timedelta
+        self.assertEqual(self.clock.advance(timedelta(microseconds=1)), 1_500_001_100)
+
+        # Case 3: nanoseconds
+        self.assertEqual(self.clock.advance_ns(1), 1_500_001_101)
+        self.assertEqual(self.clock.now_ns(), 1_500_001_101)
+
+        # Case 4: going backwards
+        with self.assertRaises(ValueError):
+            self.clock.advance(-1)
+        with self.assertRaises(ValueError):
+            self.clock.advance_ns(-1)
+
+
+class TestConversions(TestCase):
+    def test_round_trip(self):
+        time = timedelta(days=2, seconds=5, microseconds=7)
+        self.assertEqual(ns_to_timedelta(timedelta_to_ns(time)), time)
+
+        # sub microsecond part is truncated
+        self.assertEqual(ns_to_timedelta(1999), timedelta(microseconds=1))
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -0,0 +1,142 @@
+from unittest import TestCase, main as unittest_main
+from tempfile import TemporaryDirectory
+from os import path
+import sqlite3
+
+from rationalbreaks.clocks import VirtualClock
+from rationalbreaks.eventlog import EventLog, apply_event
+from rationalbreaks.timers import RatioNalTimer
+
+SECOND = 1_000_000_000
+
+
+class TestApplyEvent(TestCase):
+    def test_apply_event(self):
+        timer = RatioNalTimer(clock=VirtualClock())
+        apply_event(timer, "start")
+        self.assertEqual(timer.status(), "Working")
+        apply_event(timer, "set_ratio", 2)
+        self.assertEqual(timer.get_ratio(), 2)
+
+        with self.assertRaises(ValueError):
+            apply_event(timer, "stop")
+
+
+class TestEventLog(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.db_path = path.join(self.directory.name, "events.sqlite3")
+        self.clock = VirtualClock(start_ns=1_700_000_000 * SECOND)
+        self.log = EventLog(self.db_path, snapshot_every=10, wall_clock=self.clock.now_ns)
+
+    def tearDown(self):
+        self.log.close()
+        self.directory.cleanup()
+
+    def test_wal_mode(self):
+        with sqlite3.connect(self.db_path) as connection:
+            self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_append_and_flush(self):
+        self.log.append("t1", "start")
+        self.log.append("t2", "start")
+        self.assertTrue(self.log.flush(timeout=5))
+
+        self.assertEqual(self.log.written, 2)
+        self.assertEqual(sorted(self.log.timer_ids()), ["t1", "t2"])
+
+        # Case 2: invalid action, or a ratio the timers refuse
+        with self.assertRaises(ValueError):
+            self.log.append("t1", "stop")
+        for ratio in (0.0, -1, None, "4", float("inf")):
+            with self.assertRaises(ValueError):
+                self.log.append("t1", "set_ratio", ratio)
+
+    def test_failing_batch(self):
+        # Case 1: a batch that cannot be committed is dropped and logged, the writer carries on
+        with sqlite3.connect(self.db_path) as connection:
+            connection.execute("ALTER TABLE events RENAME TO moved")
+        with self.assertLogs("rationalbreaks.eventlog", "ERROR"):
+            self.log.append("t1", "start")
+            self.assertTrue(self.log.flush(timeout=5))
+        self.assertEqual((self.log.dropped, self.log.written), (1, 0))
+        with sqlite3.connect(self.db_path) as connection:
+            connection.execute("ALTER TABLE moved RENAME TO events")
+        self.log.append("t1", "start")
+        self.assertTrue(self.log.flush(timeout=5))
+        self.assertEqual(self.log.written, 1)
+
+        # Case 2: an event that cannot be replayed only fails the snapshot, the events are kept
+        log = EventLog(self.db_path, snapshot_every=2)
+        self.addCleanup(log.close)
+        with sqlite3.connect(self.db_path) as connection:
+            connection.execute("INSERT INTO events (timer_id, ts, action, value) VALUES ('t2', 0, 'set_ratio', 0)")
+        with self.assertLogs("rationalbreaks.eventlog", "ERROR"):
+            log.append("t2", "start")
+            self.assertTrue(log.flush(timeout=5))
+        log.append("t2", "rest")
+        self.assertTrue(log.flush(timeout=5))
+        self.assertEqual(log.written, 2)
+
+    def test_replay(self):
+        # Case 1: nothing logged
+        self.assertIsNone(self.log.replay("t1"))
+
+        # Case 2: work 60s at ratio 2, rest 10s, server "restarts" 5s later
+        self.log.append("t1", "set_ratio", 2.0)
+        self.log.append("t1", "start")
+        self.clock.advance(60)
+        self.log.append("t1", "rest")
+        self.clock.advance(10)
+        self.log.flush(timeout=5)
+        self.clock.advance(5)
+
+        timer_clock = VirtualClock()
+        timer = self.log.replay("t1", clock=timer_clock)
+
+        snapshot = timer.snapshot()
+        self.assertEqual(snapshot.status, "Resting")
+        self.assertEqual(snapshot.work_ns, 60 * SECOND)
+        self.assertEqual(snapshot.rest_ns, 15 * SECOND)
+        self.assertEqual(timer.get_ratio(), 2)
+        self.assertEqual(self.log.last_replayed_events, 3)
+
+        # Case 3: the rebuilt timer keeps running on its own clock
+        timer_clock.advance(15)
+        self.assertTrue(timer.all_rest_consumed())
+
+    def test_snapshot_bounds_replay(self):
+        """A year of 40 transitions a day replays at most snapshot_every events"""
+        self.log.append("t1", "start")
+        for _ in range(365 * 20):
+            self.clock.advance(15 * 60)
+            self.log.append("t1", "rest")
+            self.clock.advance(3 * 60)
+            self.log.append("t1", "continue_work")
+        self.log.append("t1", "reset")
+        self.log.append("t1", "start")
+        self.clock.advance(30)
+        self.log.flush(timeout=30)
+
+        timer = self.log.replay("t1")
+
+        self.assertLessEqual(self.log.last_replayed_events, self.log.snapshot_every)
+        self.assertEqual(timer.status(), "Working")
+        self.assertEqual(timer.snapshot().work_ns // SECOND, 30)
+
+    def test_reopen(self):
+        self.log.append("t1", "start")
+        self.log.close()
+        self.clock.advance(30)
+
+        with EventLog(self.db_path, wall_clock=self.clock.now_ns) as reopened:
+            timer = reopened.replay("t1")
+            self.assertEqual(timer.snapshot().work_ns // SECOND, 30)
+
+        # closed log does not accept events
+        with self.assertRaises(RuntimeError):
+            self.log.append("t1", "rest")
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -0,0 +1,179 @@
+import asyncio
+import json
+from unittest import IsolatedAsyncioTestCase, main as unittest_main
+
+from rationalbreaks.api import TimerApi, serve
+from rationalbreaks.clocks import VirtualClock
+from rationalbreaks.registry import TimerRegistry
+from rationalbreaks.timers import RatioNalTimer
+
+
+class FakeTransport:
+    """Records written events, pending bytes are set by the test"""
+    def __init__(self):
+        self.written = []
+        self.pending = 0
+        self.closing = False
+
+    def write(self, data: bytes) -> None:
+        self.written.append(data)
+
+    def get_write_buffer_size(self) -> int:
+        return self.pending
+
+    def is_closing(self) -> bool:
+        return self.closing
+
+    def abort(self) -> None:
+        self.closing = True
+
+    def events(self) -> list:
+        """(event name, data) of every event written"""
+        parsed = []
+        for data in self.written:
+            if data.startswith(b"event: "):
+                lines = data.decode().split("\n")
+                parsed.append((lines[0][len("event: "):], json.loads(lines[2][len("data: "):])))
+        return parsed
+
+
+class TestTimerEvents(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.api = TimerApi(TimerRegistry(factory=lambda: RatioNalTimer(clock=self.clock)))
+        self.events = self.api.events
+
+    async def test_transitions(self):
+        first, second, other = FakeTransport(), FakeTransport(), FakeTransport()
+        subscribers = [self.events.subscribe("a", first), self.events.subscribe("a", second),
+                       self.events.subscribe("b", other)]
+
+        # Case 1: current values on subscription, then one event per transition
+        self.api.act("a", "start")
+        self.clock.advance(3)
+        self.api.act("a", "rest")
+        self.assertEqual([name for name, _ in first.events()], ["snapshot", "transition", "transition"])
+        self.assertEqual(first.written[1:], second.written[1:])  # encoded once for everyone
+        self.assertEqual(first.events()[-1][1]["rest_ns"], 1_000_000_000)
+        self.assertEqual([name for name, _ in other.events()], ["snapshot"])
+
+        # Case 2: no event without a transition, e.g. for a failed action
+        self.api.handle("POST", "/timers/a/rest", b"")
+        self.assertEqual(len(first.events()), 3)
+
+        # Case 3: unsubscribed
+        self.events.unsubscribe(subscribers[1])
+        self.api.act("a", "reset")
+        self.assertEqual(len(second.events()), 3)
+        self.assertEqual(self.events.stats()["subscribers"], 2)
+
+        self.events.unsubscribe(subscribers[0])
+        self.events.unsubscribe(subscribers[2])
+        self.assertEqual(self.events.stats(), {"subscribers": 0, "timers": 0, "sent": 8, "evictions": 0})
+
+    async def test_rest_consumed(self):
+        transport = FakeTransport()
+        subscriber = self.events.subscribe("a", transport)
+        self.api.act("a", "start")
+        self.clock.advance(0.15)
+        self.api.act("a", "rest")  # 50 ms of rest
+
+        self.clock.advance(0.05)
+        await asyncio.sleep(0.1)
+        name, state = transport.events()[-1]
+        self.assertEqual(name, "rest_consumed")
+        self.assertTrue(state["rest_consumed"])
+
+        # Case 2: continuing before the deadline cancels it
+        self.api.act("a", "continue")
+        self.clock.advance(0.15)
+        self.api.act("a", "rest")
+        self.api.act("a", "continue")
+        self.clock.advance(0.05)
+        await asyncio.sleep(0.1)
+        self.assertEqual([name for name, _ in transport.events()][-3:], ["transition"] * 3)
+        self.events.unsubscribe(subscriber)
+
+    async def test_milestones(self):
+        minute, two_minutes, none = FakeTransport(), FakeTransport(), FakeTransport()
+        subscribers = [self.events.subscribe("a", minute, milestone_ns=60_000_000_000),
+                       self.events.subscribe("a", two_minutes, milestone_ns=120_000_000_000),
+                       self.events.subscribe("a", none)]
+        self.api.act("a", "start")
+        loop = asyncio.get_running_loop()
+
+        # Case 1: deadlines are rescheduled until the work time really reaches the milestone
+        self.clock.advance(60)
+        loop.call_soon(self.events._milestone_deadline, "a", 60_000_000_000)
+        loop.call_soon(self.events._milestone_deadline, "a", 120_000_000_000)
+        await asyncio.sleep(0)
+        self.assertEqual(minute.events()[-1][0], "milestone")
+        self.assertEqual(minute.events()[-1][1]["milestone_ns"], 60_000_000_000)
+        self.assertEqual(two_minutes.events()[-1][0], "transition")
+        self.assertNotIn("milestone", [name for name, _ in none.events()])
+
+        # Case 2: a milestone is announced once
+        loop.call_soon(self.events._milestone_deadline, "a", 60_000_000_000)
+        await asyncio.sleep(0)
+        self.assertEqual([name for name, _ in minute.events()].count("milestone"), 1)
+
+        # Case 3: after a reset the count starts again
+        self.api.act("a", "reset")
+        self.api.act("a", "start")
+        self.clock.advance(60)
+        loop.call_soon(self.events._milestone_deadline, "a", 60_000_000_000)
+        await asyncio.sleep(0)
+        self.assertEqual([name for name, _ in minute.events()].count("milestone"), 2)
+        for subscriber in subscribers:
+            self.events.unsubscribe(subscriber)
+
+    async def test_slow_consumer(self):
+        slow, fast = FakeTransport(), FakeTransport()
+        self.events.max_pending_bytes = 10_000
+        self.events.subscribe("a", slow)
+        fast_subscriber = self.events.subscribe("a", fast)
+
+        slow.pending = 9_900
+        self.api.act("a", "start")
+        self.assertTrue(slow.closing)
+        self.assertEqual(self.events.stats()["evictions"], 1)
+        self.assertEqual(self.events.stats()["subscribers"], 1)
+
+        # the others still get every event
+        self.api.act("a", "rest")
+        self.assertEqual([name for name, _ in fast.events()], ["snapshot", "transition", "transition"])
+        self.events.unsubscribe(fast_subscriber)
+
+
+class TestEventStream(IsolatedAsyncioTestCase):
+    async def test_event_stream(self):
+        api = TimerApi()
+        server = await serve(api, port=0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /timers/a/events?milestone=25 HTTP/1.1\r\n\r\n")
+        head = await reader.readuntil(b"\r\n\r\n")
+        self.assertIn(b"text/event-stream", head)
+        self.assertTrue((await reader.readuntil(b"\n\n")).startswith(b"event: snapshot"))
+
+        # Case 1: transition pushed
+        api.act("a", "start")
+        self.assertTrue((await reader.readuntil(b"\n\n")).startswith(b"event: transition"))
+
+        # Case 2: closing the connection unsubscribes
+        writer.close()
+        await writer.wait_closed()
+        await asyncio.sleep(0.05)
+        self.assertEqual(api.events.stats()["subscribers"], 0)
+
+        # Case 3: invalid milestone
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /timers/a/events?milestone=0 HTTP/1.1\r\n\r\n")
+        self.assertIn(b" 400 ", await reader.readuntil(b"\r\n"))
+        writer.close()
+        server.close()
+        await server.wait_closed()
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -0,0 +1,58 @@
+from unittest import TestCase, main as unittest_main
+from datetime import timedelta
+
+from rationalbreaks.clocks import timedelta_to_ns
+from rationalbreaks.formatting import Precision, format_duration_ns, format_many
+
+
+def to_ns(**kwargs) -> int:
+    return timedelta_to_ns(timedelta(**kwargs))
+
+
+class TestFormatDurationNs(TestCase):
+    def test_centiseconds(self):
+        # Case 1: under an hour
+        self.assertEqual(format_duration_ns(to_ns(minutes=4, seconds=5, milliseconds=67)), "04:05:06")
+
+        # Case 2: hours
+        self.assertEqual(format_duration_ns(to_ns(hours=13, minutes=4, seconds=5)), "13:04:05:00")
+
+        # Case 3: one day, unpadded like SimpleTime
+        self.assertEqual(format_duration_ns(to_ns(days=1, hours=1, minutes=4, seconds=5)), "1 day 1:4:5:0")
+
+        # Case 4: more days
+        self.assertEqual(format_duration_ns(to_ns(days=3, seconds=7, milliseconds=990)), "3 days 0:0:7:99")
+
+        # Case 5: zero and negative
+        self.assertEqual(format_duration_ns(0), "00:00:00")
+        self.assertEqual(format_duration_ns(-5), "00:00:00")
+
+    def test_seconds(self):
+        self.assertEqual(format_duration_ns(to_ns(minutes=4, seconds=5, milliseconds=670), Precision.SECONDS),
+                         "04:05")
+        self.assertEqual(format_duration_ns(to_ns(hours=2, seconds=5), Precision.SECONDS), "02:00:05")
+        self.assertEqual(format_duration_ns(to_ns(days=2, seconds=5), Precision.SECONDS), "2 days 0:0:5")
+
+    def test_minutes(self):
+        self.assertEqual(format_duration_ns(to_ns(minutes=4, seconds=59), Precision.MINUTES), "00:04")
+        self.assertEqual(format_duration_ns(to_ns(hours=2, minutes=3, seconds=5), Precision.MINUTES), "02:03")
+        self.assertEqual(format_duration_ns(to_ns(days=1, minutes=3), Precision.MINUTES), "1 day 0:3")
+
+    def test_plain_int_precision(self):
+        self.assertEqual(format_duration_ns(to_ns(seconds=5), 1), "00:05")
+
+
+class TestFormatMany(TestCase):
+    def test_matches_format_duration_ns(self):
+        durations = [-1, 0, 9_999_999, to_ns(minutes=59, seconds=59, milliseconds=999),
+                     to_ns(hours=1), to_ns(hours=23, minutes=1), to_ns(days=4, milliseconds=10)]
+        for precision in Precision:
+            expected = [format_duration_ns(duration, precision) for duration in durations]
+            self.assertEqual(format_many(durations, precision), expected)
+
+    def test_empty(self):
+        self.assertEqual(format_many([]), [])
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -0,0 +1,72 @@
+from unittest import TestCase, main as unittest_main
+from unittest.mock import MagicMock
+from array import array
+
+from rationalbreaks.history import CycleHistory, DROP, SPILL
+
+
+class TestCycleHistory(TestCase):
+    def setUp(self):
+        self.history = CycleHistory(capacity=3)
+
+    def test_init(self):
+        self.assertEqual(len(self.history), 0)
+        self.assertIsNone(self.history.last())
+        self.assertEqual(self.history.overflow, DROP)
+
+        # Case 2: invalid values
+        with self.assertRaises(ValueError):
+            CycleHistory(capacity=0)
+        with self.assertRaises(ValueError):
+            CycleHistory(overflow="keep")
+        with self.assertRaises(ValueError):
+            CycleHistory(overflow=SPILL)
+
+    def test_append(self):
+        self.history.append(10, 1)
+        self.history.append(20, 2)
+
+        self.assertEqual(len(self.history), 2)
+        self.assertEqual(list(self.history), [(10, 1), (20, 2)])
+        self.assertEqual(self.history.last(), (20, 2))
+        self.assertIsInstance(self.history.timestamps(), array)
+
+    def test_drop_oldest(self):
+        for timestamp in range(5):
+            self.history.append(timestamp, timestamp % 3)
+
+        self.assertEqual(len(self.history), 3)
+        self.assertEqual(list(self.history.timestamps()), [2, 3, 4])
+        self.assertEqual(list(self.history.codes()), [2, 0, 1])
+        self.assertEqual(self.history.last(), (4, 1))
+        self.assertEqual(self.history.dropped, 2)
+
+    def test_spill(self):
+        sink = MagicMock()
+        history = CycleHistory(capacity=2, overflow=SPILL, sink=sink)
+        for timestamp in range(3):
+            history.append(timestamp, 1)
+
+        # Case 1: full buffer is passed to the sink
+        sink.assert_called_once_with(array("q", [0, 1]), array("b", [1, 1]))
+        self.assertEqual(list(history), [(2, 1)])
+        self.assertEqual(history.spilled, 2)
+        self.assertEqual(history.dropped, 0)
+
+        # Case 2: explicit flush
+        history.flush()
+        sink.assert_called_with(array("q", [2]), array("b", [1]))
+        self.assertEqual(len(history), 0)
+
+        # Case 3: nothing to flush
+        history.flush()
+        self.assertEqual(sink.call_count, 2)
+
+    def test_clear(self):
+        self.history.append(1, 1)
+        self.history.clear()
+        self.assertEqual(list(self.history), [])
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -0,0 +1,37 @@
+from os import path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main as unittest_main
+
+from benchmarks import hot_paths
+
+
+class TestHotPaths(TestCase):
+    def test_run_and_baseline(self):
+        results = hot_paths.run(seconds=0.002, rounds=2, selected=["SimpleTime", "tick[Working]"])
+        self.assertEqual(set(results), {"SimpleTime()", "str(SimpleTime())", "display_timers tick[Working]"})
+        for result in results.values():
+            self.assertGreater(result["ops_per_second"], 0)
+            self.assertGreater(result["relative"], 0)
+
+        with TemporaryDirectory() as directory:
+            baseline_path = path.join(directory, "baseline.json")
+            hot_paths.save(results, baseline_path)
+            baseline = hot_paths.load(baseline_path)
+        self.assertEqual(baseline["cases"], results)
+        self.assertEqual(baseline["environment"], hot_paths.environment())
+
+    def test_compare(self):
+        baseline = {"a": {"ops_per_second": 100, "relative": 1.0},
+                    "b": {"ops_per_second": 100, "relative": 2.0},
+                    "gone": {"ops_per_second": 100, "relative": 1.0}}
+        results = {"a": {"ops_per_second": 50, "relative": 0.8},  # -20 %
+                   "b": {"ops_per_second": 50, "relative": 1.8},  # -10 %, the raw drop is machine drift
+                   "new": {"ops_per_second": 1, "relative": 0.1}}
+        regressions = hot_paths.compare(baseline, results, max_regression=15)
+        self.assertEqual(list(regressions), ["a"])
+        self.assertAlmostEqual(regressions["a"], -20)
+        self.assertEqual(hot_paths.compare(baseline, results, max_regression=5).keys(), {"a", "b"})
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -0,0 +1,43 @@
+import subprocess
+import sys
+from unittest import TestCase, main as unittest_main
+
+from benchmarks import import_time
+
+
+class TestImports(TestCase):
+    def test_core_budget(self):
+        # CORE_BUDGET_MS is checked by python -m benchmarks.import_time, the test keeps a margin for loaded machines
+        total_ms, modules = import_time.core_ms(runs=3)
+        self.assertLess(total_ms, import_time.TEST_BUDGET_MS,
+                        f"import rationalbreaks took {total_ms:.1f} ms (-X importtime, median)")
+
+        # Case 2: nothing of the package outside the core, no heavy dependency
+        self.assertEqual({name for name in modules if name.startswith("rationalbreaks")}, import_time.CORE_MODULES)
+        for heavy in ("numpy", "streamlit", "asyncio", "sqlite3"):
+            self.assertNotIn(heavy, modules)
+
+    def test_lazy_names(self):
+        # a fresh interpreter, this one has imported everything already
+        code = ("import sys, rationalbreaks\n"
+                "assert 'numpy' not in sys.modules\n"
+                "assert rationalbreaks.BatchRatioNalTimer.__module__ == 'rationalbreaks.batch'\n"
+                "assert 'numpy' in sys.modules\n"
+                "assert rationalbreaks.api.TimerApi is rationalbreaks.TimerApi\n"
+                "assert 'BatchRatioNalTimer' in dir(rationalbreaks)\n"
+                "try:\n"
+                "    rationalbreaks.nothing\n"
+                "except AttributeError:\n"
+                "    pass\n"
+                "else:\n"
+                "    raise AssertionError('no AttributeError')\n")
+        subprocess.run([sys.executable, "-c", code], cwd=import_time.ROOT, check=True)
+
+    def test_entry_points(self):
+        # main.py starts the web app, importing it must not import Streamlit
+        code = "import sys, main; assert 'streamlit' not in sys.modules"
+        subprocess.run([sys.executable, "-c", code], cwd=import_time.ROOT, check=True)
+
+
+if __name__ == '__main__':
+    unittest_main()
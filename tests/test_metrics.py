@@ -0,0 +1,92 @@
+from unittest import TestCase, main as unittest_main
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from benchmarks import metrics_overhead
+from rationalbreaks import metrics
+from rationalbreaks.metrics import Counter, Gauge, Histogram, Registry
+
+
+class TestMetrics(TestCase):
+    def test_render(self):
+        registry = Registry()
+        counter = registry.add(Counter("transitions_total", "Transitions", ("action", "result")))
+        gauge = registry.add(Gauge("sessions", "Sessions", ("status",),
+                                   collect=lambda: {("Working",): 2, ("Resting",): 1}))
+        histogram = registry.add(Histogram("latency_seconds", "Latency", buckets=(0.01, 0.1)))
+
+        # Case 1: samples of every metric, sorted by label values
+        counter.inc(("start", "applied"))
+        counter.inc(("start", "applied"))
+        counter.inc(("rest", 'say "hi"\n'))
+        for value in (0.005, 0.01, 0.05, 3.0):
+            histogram.observe(value)
+        self.assertEqual(registry.render(), "\n".join([
+            "# HELP transitions_total Transitions",
+            "# TYPE transitions_total counter",
+            'transitions_total{action="rest",result="say \\"hi\\"\\n"} 1',
+            'transitions_total{action="start",result="applied"} 2',
+            "# HELP sessions Sessions",
+            "# TYPE sessions gauge",
+            'sessions{status="Resting"} 1',
+            'sessions{status="Working"} 2',
+            "# HELP latency_seconds Latency",
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{le="0.01"} 2',
+            'latency_seconds_bucket{le="0.1"} 3',
+            'latency_seconds_bucket{le="+Inf"} 4',
+            "latency_seconds_sum 3.065",
+            "latency_seconds_count 4",
+        ]) + "\n")
+        self.assertEqual(counter.value(("start", "applied")), 2)
+        self.assertEqual(histogram.count(), 4)
+
+        # Case 2: a gauge without collect shows what was set
+        gauge.collect = None
+        gauge.set(5, ("Working",))
+        self.assertIn('sessions{status="Working"} 5\n', gauge.render())
+
+        # Case 3: names are unique
+        with self.assertRaises(ValueError):
+            registry.add(Counter("sessions", "Again"))
+
+    def test_serve(self):
+        registry = Registry()
+        registry.add(Counter("served_total", "Served")).inc()
+        server = metrics.serve(0, registry=registry)
+        try:
+            self.assertTrue(metrics.enabled)
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+            with urlopen(url + "/metrics") as response:
+                self.assertEqual(response.headers["Content-Type"], metrics.CONTENT_TYPE)
+                self.assertIn("served_total 1\n", response.read().decode())
+
+            # Case 2: nothing else is served
+            with self.assertRaises(HTTPError) as raised:
+                urlopen(url + "/")
+            self.assertEqual(raised.exception.code, 404)
+        finally:
+            server.shutdown()
+            server.server_close()
+            metrics.disable()
+
+    def test_default_registry(self):
+        text = metrics.render()
+        for name in ("rationalbreaks_display_iterations_total", "rationalbreaks_display_tick_latency_seconds",
+                     "rationalbreaks_display_sleep_overshoot_seconds", "rationalbreaks_reruns_total",
+                     "rationalbreaks_transitions_total", "rationalbreaks_transition_seconds",
+                     "rationalbreaks_alarm_triggers_total", "rationalbreaks_alarm_mutes_total",
+                     "rationalbreaks_sessions"):
+            self.assertIn(f"# TYPE {name} ", text)
+
+
+class TestOverhead(TestCase):
+    def test_disabled_overhead(self):
+        result = metrics_overhead.run(seconds=0.005, rounds=3)
+        self.assertFalse(metrics.enabled)
+        for name, case in result["cases"].items():
+            self.assertLess(case["disabled_percent"], metrics_overhead.BUDGET_PERCENT, name)
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -0,0 +1,170 @@
+import json
+from os import environ, listdir, path
+from tempfile import TemporaryDirectory
+from time import sleep
+from types import SimpleNamespace
+from unittest import TestCase, main as unittest_main
+from unittest.mock import patch
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from frontend import profiling
+from frontend.profiling import RunProfiler
+from rationalbreaks.eventlog import EventLog
+
+APP_FILE = path.join(path.dirname(path.dirname(path.abspath(__file__))), "streamlit_ui.py")
+
+
+def _profiled(profiler: RunProfiler, function, kind: str = "run"):
+    sample = profiler.start(kind)
+    try:
+        function()
+    finally:
+        profiler.finish(sample)
+    return sample
+
+
+class TestProfiler(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_widget_label(self):
+        class StatusControl:
+            def transition(self, action):
+                pass
+
+        # Case 1: the callback of the widget, with its arguments
+        metadata = SimpleNamespace(callback=StatusControl().transition, callback_args=("rest",),
+                                   callback_kwargs={"source": "button"})
+        self.assertEqual(profiling.widget_label("$$ID-abc-None", metadata),
+                         "TestProfiler.test_widget_label.<locals>.StatusControl.transition('rest', source='button')")
+
+        # Case 2: no callback, the key of the widget, else its id
+        self.assertEqual(profiling.widget_label("$$ID-abc-timer_clock", SimpleNamespace(callback=None)),
+                         "timer_clock")
+        self.assertEqual(profiling.widget_label("$$ID-abc-None"), "$$ID-abc-None")
+
+    def test_rotation(self):
+        profiler = RunProfiler(self.directory.name, keep=2, index_size=2)
+        for duration in (0.05, 0, 0.03, 0, 0):
+            _profiled(profiler, lambda: sleep(duration))
+        profiler.flush()
+
+        # Case 1: the index lists the slowest runs, slowest first
+        index = profiling.read_index(self.directory.name)
+        self.assertEqual(len(index), 2)
+        self.assertGreaterEqual(index[0]["ms"], index[1]["ms"])
+        self.assertGreaterEqual(index[1]["ms"], 30)
+        self.assertGreater(index[0]["ms"], index[0]["cpu_ms"])
+
+        # Case 2: the profiles of the index and the most recent ones are kept
+        kept = {entry["file"] for entry in index} | set(profiler._recent)
+        self.assertEqual(len(kept), 4)
+        self.assertEqual(set(listdir(self.directory.name)), kept | {profiling.INDEX_FILE})
+        self.assertIn("run", profiling.format_index(index))
+
+        # Case 3: a new profiler carries on with the index of the directory
+        self.assertEqual(RunProfiler(self.directory.name).index, index)
+
+    def test_nested(self):
+        profiler = RunProfiler(self.directory.name)
+        sample = profiler.start("run")
+        try:
+            # Case 1: a thread is profiled once at a time
+            self.assertIsNone(profiler.start("tick"))
+            self.assertIsNone(profiling.start_tick())  # not installed
+        finally:
+            profiler.finish(sample)
+
+        # Case 2: a sample finished where the clock loop started is not finished again
+        profiler.finish(sample)
+        profiler.flush()
+        self.assertEqual(len(profiling.read_index(self.directory.name)), 1)
+
+    def test_stack_mode(self):
+        profiler = RunProfiler(self.directory.name, mode="stack", interval=0.001)
+        _profiled(profiler, lambda: sleep(0.05))
+        profiler.flush()
+        entry, = profiling.read_index(self.directory.name)
+        self.assertEqual((entry["mode"], entry["functions"]), ("stack", []))
+        with open(path.join(self.directory.name, entry["file"])) as file:
+            lines = file.read().splitlines()
+        # collapsed stacks, outermost call first, with their number of samples
+        self.assertTrue(lines)
+        self.assertTrue(any("<lambda>" in line for line in lines))
+        self.assertGreater(sum(int(line.rsplit(" ", 1)[1]) for line in lines), 10)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            RunProfiler(self.directory.name, mode="perf")
+        with self.assertRaises(ValueError):
+            RunProfiler(self.directory.name, rate=2)
+
+
+class TestAppProfiling(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.log = EventLog(path.join(self.directory.name, "events.sqlite3"))
+        self.addCleanup(self.log.close)
+        self.addCleanup(st.cache_resource.clear)  # the timer registry holds on to the event log
+        patcher = patch('frontend.st_front_objects.event_log', return_value=self.log)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.dict(environ, RATIONALBREAKS_CACHE=path.join(self.directory.name, "cache"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.profiles = path.join(self.directory.name, "profiles")
+        self.profiler = RunProfiler(self.profiles, rate=1.0, tick_rate=1.0).install()
+        self.addCleanup(self.profiler.uninstall)
+
+    def test_reruns(self):
+        app = AppTest.from_file(APP_FILE, default_timeout=10).run()
+        next(button for button in app.button if button.label == "Start").click().run()
+        self.profiler.flush()
+
+        # Case 1: every run is profiled, with the widget that triggered it
+        index = profiling.read_index(self.profiles)
+        self.assertEqual(len(index), 2)
+        click, = [entry for entry in index if entry["widgets"]]
+        self.assertEqual(click["widgets"], ["StatusControl.transition('start')"])
+        self.assertEqual(click["kind"], "run")
+
+        # Case 2: the functions of the app which took the longest
+        functions = [function["function"] for function in click["functions"]]
+        self.assertTrue(functions[0].startswith("streamlit_ui.py:"), functions)
+        self.assertEqual({function.split(":")[0] for function in functions}, set(profiling.APP_FILES))
+        with open(path.join(self.profiles, profiling.INDEX_FILE)) as file:
+            self.assertEqual(json.load(file)["slowest"], index)
+
+        # Case 3: uninstalled, runs are not profiled
+        self.profiler.uninstall()
+        app.run()
+        self.profiler.flush()
+        self.assertEqual(len(profiling.read_index(self.profiles)), 2)
+        self.assertFalse(profiling.enabled)
+
+    def test_ticks(self):
+        # Case 1: ticks are profiled one by one, installed
+        self.assertEqual((profiling.enabled, profiling.tick_rate), (True, 1.0))
+        sample = profiling.start_tick()
+        profiling.finish_tick(sample)
+        self.profiler.flush()
+        entry, = profiling.read_index(self.profiles)
+        self.assertEqual((entry["kind"], entry["mode"]), ("tick", "cprofile"))
+
+        # Case 2: a run stops being profiled where the clock loop starts
+        sample = self.profiler.start("run")
+        profiling.run_ends_here()
+        self.assertTrue(sample.until_clock_loop)
+        tick = profiling.start_tick()
+        self.assertIsNotNone(tick)
+        profiling.finish_tick(tick)
+        self.profiler.flush()
+        self.assertEqual(len(profiling.read_index(self.profiles)), 3)
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -0,0 +1,206 @@
+from unittest import TestCase, main as unittest_main
+from tempfile import TemporaryDirectory
+from os import chmod, listdir, path, stat
+import json
+
+from rationalbreaks.clocks import VirtualClock
+
+from rationalbreaks.registry import TimerRegistry
+from rationalbreaks.timers import RatioNalTimer
+
+
+class FakeClock:
+    """Returns a manually advanced time in seconds"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTimerRegistry(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.registry = TimerRegistry(capacity=2, ttl=10, clock=self.clock)
+
+    def test_init(self):
+        self.assertEqual(len(self.registry), 0)
+        self.assertEqual(self.registry.capacity, 2)
+
+        # Case 2: invalid capacity
+        with self.assertRaises(ValueError):
+            TimerRegistry(capacity=0)
+
+    def test_get_hit_and_miss(self):
+        # Case 1: first access creates the timer
+        timer = self.registry.get("session_a")
+        self.assertIsInstance(timer, RatioNalTimer)
+        self.assertEqual(self.registry.misses, 1)
+        self.assertEqual(self.registry.hits, 0)
+
+        # Case 2: same key returns the same instance
+        self.assertIs(self.registry.get("session_a"), timer)
+        self.assertEqual(self.registry.hits, 1)
+
+        # Case 3: different key gets its own timer
+        self.assertIsNot(self.registry.get("session_b"), timer)
+        self.assertEqual(self.registry.misses, 2)
+
+    def test_lru_eviction(self):
+        timer_a = self.registry.get("a")
+        self.registry.get("b")
+        self.registry.get("a")  # "b" is now least recently used
+        self.registry.get("c")
+
+        self.assertIn("a", self.registry)
+        self.assertNotIn("b", self.registry)
+        self.assertIn("c", self.registry)
+        self.assertIs(self.registry.peek("a"), timer_a)
+        self.assertEqual(self.registry.evictions, 1)
+
+    def test_ttl_expiry(self):
+        self.registry.get("a")
+        self.clock.now = 5
+        self.registry.get("b")
+
+        # Case 1: only "a" is idle for longer than ttl
+        self.clock.now = 12
+        self.assertEqual(self.registry.evict_expired(), 1)
+        self.assertNotIn("a", self.registry)
+        self.assertIn("b", self.registry)
+
+        # Case 2: expiry also happens lazily on access
+        self.clock.now = 30
+        self.registry.get("c")
+        self.assertEqual(self.registry.keys(), ["c"])
+        self.assertEqual(self.registry.expirations, 2)
+
+        # Case 3: no ttl, nothing expires
+        registry = TimerRegistry(capacity=2, clock=self.clock)
+        registry.get("a")
+        self.clock.now = 10 ** 6
+        self.assertEqual(registry.evict_expired(), 0)
+
+    def test_spill_and_restore(self):
+        with TemporaryDirectory() as spill_dir:
+            registry = TimerRegistry(capacity=1, spill_dir=spill_dir, clock=self.clock)
+            started = registry.get("a")
+            started.set_ratio(5)
+            started.start()
+
+            # Case 1: started timer is spilled on eviction
+            registry.get("b")
+            self.assertEqual(registry.spills, 1)
+            self.assertEqual(len(listdir(spill_dir)), 1)
+
+            # Case 2: timer that was not started is not spilled
+            registry.get("a")
+            self.assertEqual(registry.spills, 1)
+
+            # Case 3: spilled timer is restored with its state
+            restored = registry.peek("a")
+            self.assertEqual(registry.restores, 1)
+            self.assertEqual(restored.status(), "Working")
+            self.assertEqual(restored.get_ratio(), 5)
+            self.assertEqual(listdir(spill_dir), [])
+
+    def test_spill_format(self):
+        with TemporaryDirectory() as directory:
+            spill_dir = path.join(directory, "spill")
+            clock = VirtualClock()
+            registry = TimerRegistry(capacity=1, spill_dir=spill_dir, clock=self.clock,
+                                     factory=lambda: RatioNalTimer(clock=clock))
+            self.assertEqual(stat(spill_dir).st_mode & 0o777, 0o700)
+            registry.get("a").start()
+            clock.advance(10)
+
+            # Case 1: plain JSON state, no code
+            registry.get("b")
+            spill_file, = listdir(spill_dir)
+            with open(path.join(spill_dir, spill_file)) as spilled:
+                state = json.load(spilled)
+            self.assertEqual((state["status"], state["cycle_elapsed_ns"]), (1, 10 * 10 ** 9))
+
+            # Case 2: the running cycle goes on while spilled, on a new clock origin as well
+            state["spilled_at_ns"] -= 5 * 10 ** 9
+            with open(path.join(spill_dir, spill_file), "w") as spilled:
+                json.dump(state, spilled)
+            clock.advance(1000)
+            self.assertAlmostEqual(registry.get("a").work_time_ns(), 15 * 10 ** 9, delta=10 ** 9)
+
+            # Case 3: a directory others can write to is refused
+            chmod(spill_dir, 0o777)
+            with self.assertRaises(PermissionError):
+                TimerRegistry(spill_dir=spill_dir)
+
+    def test_loader(self):
+        loaded = RatioNalTimer(7)
+        registry = TimerRegistry(loader=lambda key: loaded if key == "known" else None)
+
+        # Case 1: loader rebuilds the timer
+        self.assertIs(registry.get("known"), loaded)
+        self.assertEqual(registry.loads, 1)
+
+        # Case 2: loader has nothing, factory creates a new one
+        self.assertIsNot(registry.get("unknown"), loaded)
+        self.assertEqual(registry.stats()["loads"], 1)
+
+        # Case 3: what the loader knows wins over an older spill, which is dropped
+        with TemporaryDirectory() as spill_dir:
+            registry = TimerRegistry(capacity=1, spill_dir=spill_dir,
+                                     loader=lambda key: loaded if key == "known" else None)
+            registry.get("known").start()
+            registry.get("other")
+            self.assertEqual(len(listdir(spill_dir)), 1)
+            self.assertIs(registry.get("known"), loaded)
+            self.assertEqual((registry.restores, listdir(spill_dir)), (0, []))
+
+    def test_unloader(self):
+        unloaded = []
+        registry = TimerRegistry(capacity=2, ttl=10, clock=self.clock, unloader=unloaded.append)
+        for key in ("a", "b", "c"):
+            registry.get(key)
+
+        # Case 1: every way out of memory is reported, LRU eviction, evict, discard and expiry
+        registry.evict("b")
+        registry.discard("c")
+        registry.discard("c")  # not in memory anymore, nothing to report
+        registry.get("d")
+        self.clock.now = 20
+        registry.evict_expired()
+        self.assertEqual(unloaded, ["a", "b", "c", "d"])
+
+    def test_discard(self):
+        self.registry.get("a")
+        self.registry.discard("a")
+        self.assertNotIn("a", self.registry)
+        self.assertEqual(self.registry.evictions, 0)
+
+    def test_evict(self):
+        with TemporaryDirectory() as spill_dir:
+            registry = TimerRegistry(capacity=2, spill_dir=spill_dir, clock=self.clock)
+            registry.get("a").start()
+
+            # Case 1: started timer is spilled and restored on the next access
+            self.assertTrue(registry.evict("a"))
+            self.assertNotIn("a", registry)
+            self.assertEqual(registry.evictions, 1)
+            self.assertEqual(registry.get("a").status(), "Working")
+            self.assertEqual(registry.restores, 1)
+
+            # Case 2: unknown key
+            self.assertFalse(registry.evict("b"))
+            self.assertEqual(registry.evictions, 1)
+
+    def test_stats(self):
+        self.registry.get("a")
+        self.registry.get("a")
+        stats = self.registry.stats()
+        self.assertEqual(stats["size"], 1)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+
+if __name__ == '__main__':
+    unittest_main()
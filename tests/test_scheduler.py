@@ -0,0 +1,121 @@
+from unittest import TestCase, main as unittest_main
+from unittest.mock import MagicMock
+from threading import Event
+from random import Random
+
+from rationalbreaks.scheduler import DeadlineScheduler
+
+
+class FakeClock:
+    """Returns a manually advanced time in nanoseconds"""
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDeadlineScheduler(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = DeadlineScheduler(clock=self.clock, autostart=False)
+
+    def test_run_due(self):
+        callbacks = [MagicMock() for _ in range(3)]
+        for when, callback in zip((5, 1, 3), callbacks):
+            self.scheduler.schedule(when, callback)
+
+        # Case 1: nothing is due yet
+        self.assertEqual(self.scheduler.run_due(), 0)
+
+        # Case 2: only deadlines before now run
+        self.clock.now = 3
+        self.assertEqual(self.scheduler.run_due(), 2)
+        callbacks[1].assert_called_once()
+        callbacks[2].assert_called_once()
+        callbacks[0].assert_not_called()
+        self.assertEqual(self.scheduler.pending(), 1)
+
+        # Case 3: a fired deadline is not run again
+        self.clock.now = 10
+        self.assertEqual(self.scheduler.run_due(), 1)
+        self.assertEqual(self.scheduler.run_due(), 0)
+        callbacks[1].assert_called_once()
+
+    def test_failing_callback(self):
+        failing = MagicMock(side_effect=PermissionError("spill"))
+        callback = MagicMock()
+        self.scheduler.schedule(1, failing)
+        self.scheduler.schedule(2, callback)
+
+        # Case 1: the error is logged, the other callbacks of the batch still run
+        self.clock.now = 2
+        with self.assertLogs("rationalbreaks.scheduler", level="ERROR"):
+            self.assertEqual(self.scheduler.run_due(), 2)
+        callback.assert_called_once()
+        self.assertEqual(self.scheduler.errors, 1)
+
+    def test_schedule_in(self):
+        self.clock.now = 100
+        deadline = self.scheduler.schedule_in(5, MagicMock())
+        self.assertEqual(deadline.when, 105)
+
+    def test_cancel(self):
+        callback = MagicMock()
+        deadline = self.scheduler.schedule(1, callback)
+
+        # Case 1: cancelling a pending deadline
+        self.assertTrue(self.scheduler.cancel(deadline))
+        self.assertEqual(self.scheduler.pending(), 0)
+
+        # Case 2: cancelling again or cancelling None
+        self.assertFalse(self.scheduler.cancel(deadline))
+        self.assertFalse(self.scheduler.cancel(None))
+
+        # Case 3: cancelled callback never runs
+        self.clock.now = 2
+        self.assertEqual(self.scheduler.run_due(), 0)
+        callback.assert_not_called()
+
+        # Case 4: fired deadline can not be cancelled
+        fired = self.scheduler.schedule(2, callback)
+        self.scheduler.run_due()
+        self.assertFalse(self.scheduler.cancel(fired))
+
+    def test_many_deadlines(self):
+        rng = Random(1)
+        fired = []
+        deadlines = [self.scheduler.schedule(rng.randrange(1000), lambda i=i: fired.append(i))
+                     for i in range(20000)]
+        cancelled = set(range(0, 20000, 3))
+        for i in cancelled:
+            self.scheduler.cancel(deadlines[i])
+        self.assertEqual(self.scheduler.pending(), 20000 - len(cancelled))
+
+        self.clock.now = 1000
+        self.scheduler.run_due()
+
+        self.assertEqual(len(fired), 20000 - len(cancelled))
+        self.assertFalse(cancelled & set(fired))
+        self.assertEqual(self.scheduler.pending(), 0)
+
+    def test_background_thread(self):
+        scheduler = DeadlineScheduler()
+        fired = Event()
+        scheduler.schedule_in(10_000_000, fired.set)
+        try:
+            self.assertTrue(fired.wait(2))
+
+            # Case 2: the thread survives a failing callback, later deadlines fire
+            fired.clear()
+            with self.assertLogs("rationalbreaks.scheduler", level="ERROR"):
+                scheduler.schedule_in(0, MagicMock(side_effect=RuntimeError))
+                scheduler.schedule_in(10_000_000, fired.set)
+                self.assertTrue(fired.wait(2))
+            self.assertTrue(scheduler._thread.is_alive())
+        finally:
+            scheduler.stop()
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import random
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase, TestCase, main as unittest_main
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+from benchmarks import session_load
+from benchmarks.session_load import SimulatedSession
+
+
+class _Connection:
+    """Stands in for the websocket of a session, keeps what was sent"""
+    def __init__(self):
+        self.sent = []
+
+    def write_message(self, data: bytes, binary: bool = False) -> None:
+        self.sent.append(BackMsg.FromString(data).rerun_script)
+
+    def close(self) -> None:
+        pass
+
+
+def _button(label: str, widget_id: str, fragment_id: str = "") -> ForwardMsg:
+    message = ForwardMsg()
+    message.delta.fragment_id = fragment_id
+    message.delta.new_element.button.label = label
+    message.delta.new_element.button.id = widget_id
+    return message
+
+
+def _component(name: str, widget_id: str, args: dict, fragment_id: str = "") -> ForwardMsg:
+    message = ForwardMsg()
+    message.delta.fragment_id = fragment_id
+    instance = message.delta.new_element.component_instance
+    instance.component_name = f"frontend.st_front_objects.{name}"
+    instance.id = widget_id
+    instance.json_args = json.dumps(args)
+    return message
+
+
+class TestHelpers(TestCase):
+    def test_frame_bytes(self):
+        self.assertEqual(session_load.frame_bytes(100, masked=False), 102)
+        self.assertEqual(session_load.frame_bytes(100, masked=True), 106)
+        self.assertEqual(session_load.frame_bytes(200, masked=False), 204)
+        self.assertEqual(session_load.frame_bytes(70000, masked=False), 70010)
+
+    def test_clock_seconds(self):
+        self.assertAlmostEqual(session_load.clock_seconds("00:05:23"), 5.23)
+        self.assertAlmostEqual(session_load.clock_seconds("01:02:03:45"), 3723.45)
+
+    def test_tick_lateness(self):
+        # Case 1: every stretch is measured against its own most punctual tick
+        ticks = [(1, 10.0, 0.0), (1, 10.6, 0.5), (1, 11.0, 1.0), (2, 50.0, 1.0), (2, 50.5, 1.5)]
+        self.assertEqual([round(lateness) for lateness in session_load.tick_lateness(ticks)], [0, 100, 0, 0, 0])
+
+        # Case 2: percentiles of few values
+        self.assertIsNone(session_load.percentiles([]))
+        self.assertEqual(session_load.percentiles([7.0]), {50: 7.0, 90: 7.0, 99: 7.0})
+
+
+class TestSimulatedSession(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.window = {"open": True}
+        self.session = SimulatedSession(random.Random(0), {"work": (1, 2), "rest": (1, 2), "mute": 1.0,
+                                                           "hidden": False}, self.window)
+        self.session.connection = _Connection()
+
+    async def test_rerun_requests(self):
+        session = self.session
+        page = ForwardMsg()
+        page.page_info_changed.query_string = "timer=abc"
+        session.handle(page, 0.0)
+        session.handle(_button("Start", "start-id"), 0.0)
+        session.handle(_button("Settings", "settings-id", fragment_id="settings"), 0.0)
+        session.handle(_component("page_activity", "page-id", {"idle_after": 300}), 0.0)
+        self.assertEqual(session.status_label, "Start")
+
+        # Case 1: a click triggers its button, in the fragment of the button
+        session.send("click", "settings", trigger="settings-id")
+        sent = session.connection.sent[-1]
+        self.assertEqual((sent.query_string, sent.fragment_id), ("timer=abc", "settings"))
+        self.assertEqual([(widget.id, widget.trigger_value) for widget in sent.widget_states.widgets],
+                         [("settings-id", True)])
+
+        # Case 2: component values are sent again with every later rerun, triggers are not
+        session.set_value("page_activity", {"visible": False, "idle": False}, "tab")
+        session.send("click", trigger="start-id")
+        widgets = session.connection.sent[-1].widget_states.widgets
+        self.assertEqual([widget.id for widget in widgets], ["page-id", "start-id"])
+        self.assertEqual(json.loads(widgets[0].json_value), {"visible": False, "idle": False})
+        self.assertEqual(session.stats["interactions"], {"click": 2, "mute": 0, "tab": 1})
+
+        # Case 3: the next status button ends the click
+        session.clicked_at = 0.0
+        session.handle(_button("Rest", "rest-id"), 0.25)
+        self.assertEqual(session.status_label, "Rest")
+        self.assertEqual(session.stats["click_ms"], [250.0])
+
+    async def test_components(self):
+        session = self.session
+        # Case 1: the alarm rings when told to and is muted, with the ring of this rest period
+        session.handle(_component("alarm_player", "alarm-id", {"play": True, "arm_in": None, "ring": 2}), 0.0)
+        self.assertTrue(session.ringing)
+        session._mute()
+        sent = session.connection.sent[-1]
+        self.assertEqual([(widget.id, widget.json_value) for widget in sent.widget_states.widgets],
+                         [("alarm-id", "2")])
+        self.assertEqual(session.stats["interactions"]["mute"], 1)
+
+        # Case 2: the clock reports the end of the rest in its fragment, once its rest ran out
+        session.handle(_component("timer_clock", "clock-id", {"status": "Resting", "work": 9.0, "rest": 0.01},
+                                  fragment_id="clock"), 0.0)
+        self.assertIsNotNone(session.rest_report)
+        await asyncio.sleep(0.05)
+        self.assertEqual((session.connection.sent[-1].fragment_id, session.cause), ("clock", "rest over"))
+        session.close()
+
+
+class TestSessionLoad(TestCase):
+    def test_run(self):
+        result = session_load.run(sessions=2, seconds=5, ramp_up=1, work=(1, 2), rest=(0.5, 1), seed=1)
+        self.assertEqual(result["errors"], [])
+        self.assertGreater(result["interactions"]["click"], 0)
+        self.assertGreaterEqual(result["runs_per_interaction"], 1)
+        self.assertGreater(result["received_bytes_per_session_minute"], 0)
+        self.assertIsNotNone(result["click_ms"])
+
+
+class TestServerClock(IsolatedAsyncioTestCase):
+    """The display_timers loop keeps the full run going while the page is visible"""
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        port = session_load._free_port()
+        self.server = session_load._start_server(port, os.path.join(directory.name, "events.sqlite3"), "server")
+        self.addCleanup(self.server.wait)
+        self.addCleanup(self.server.terminate)
+        self.url = f"ws://{session_load.HOST}:{port}/_stcore/stream"
+
+    async def click(self, session: SimulatedSession, label: str, shown: str) -> None:
+        """Clicks the button label, until the button shown is drawn"""
+        widget_id, fragment_id = session.buttons.pop(label)
+        session.buttons.clear()
+        session.send("click", fragment_id, trigger=widget_id)
+        while shown not in session.buttons:
+            await asyncio.sleep(0.05)
+
+    async def test_panels(self):
+        session = SimulatedSession(random.Random(0), {"work": (1, 2), "rest": (1, 2), "mute": 0.0,
+                                                      "hidden": False}, {"open": True})
+        await session.connect(self.url)
+        self.addCleanup(session.close)
+        await asyncio.wait_for(session.status_changed.wait(), 30)
+        # the clock loop runs from here on, every click has to stop it
+        for label, shown in (("Start", "Rest"), ("Settings", "Hide settings"), ("Hide settings", "Settings"),
+                             ("Reset timers", "Confirm"), ("Cancel", "Reset timers"), ("Reset timers", "Confirm"),
+                             ("Confirm", "Start")):
+            await asyncio.wait_for(self.click(session, label, shown), 10)
+        self.assertEqual(session.stats["errors"], [])
+
+
+if __name__ == '__main__':
+    unittest_main()
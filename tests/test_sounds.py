@@ -0,0 +1,88 @@
+from unittest import TestCase, main as unittest_main
+from tempfile import TemporaryDirectory
+from array import array
+from os import makedirs, path
+import wave
+
+from rationalbreaks.sounds import SoundBank
+
+
+def write_wav(file_path: str, samples: list, channels: int = 2, frame_rate: int = 44100):
+    with wave.open(file_path, "wb") as output:
+        output.setnchannels(channels)
+        output.setsampwidth(2)
+        output.setframerate(frame_rate)
+        output.writeframes(array("h", samples).tobytes())
+
+
+class TestSoundBank(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.sounds = path.join(self.directory.name, "resources")
+        self.served = path.join(self.directory.name, "served")
+        self.bank = SoundBank(self.sounds)
+        # 4 stereo frames: left 100, 300, 500, 700 right 300, 500, 700, 900
+        makedirs(self.sounds)
+        write_wav(path.join(self.sounds, "ring.wav"), [100, 300, 300, 500, 500, 700, 700, 900])
+
+    def tearDown(self):
+        self.bank.close()
+        self.directory.cleanup()
+
+    def test_get(self):
+        # Case 1: nothing is loaded before the first access
+        self.assertEqual(self.bank.loaded(), [])
+        self.assertIn("ring.wav", self.bank)
+
+        # Case 2: file bytes are mapped on access
+        data = self.bank.get("ring.wav")
+        with open(path.join(self.sounds, "ring.wav"), "rb") as sound_file:
+            self.assertEqual(data.tobytes(), sound_file.read())
+        self.assertEqual(self.bank.loaded(), ["ring.wav"])
+        data.release()
+
+        # Case 3: missing file
+        self.assertNotIn("missing.wav", self.bank)
+        with self.assertRaises(FileNotFoundError):
+            self.bank.get("missing.wav")
+
+    def test_export_copy(self):
+        exported = self.bank.export("ring.wav", self.served)
+
+        self.assertEqual(exported, path.join(self.served, "ring.wav"))
+        with open(exported, "rb") as exported_file, open(self.bank.path("ring.wav"), "rb") as source:
+            self.assertEqual(exported_file.read(), source.read())
+
+    def test_export_transcoded(self):
+        # Case 1: mono, half sample rate
+        exported = self.bank.export("ring.wav", self.served, mono=True, sample_rate=22050)
+        self.assertEqual(path.basename(exported), "ring-mono-22050hz.wav")
+        with wave.open(exported) as result:
+            self.assertEqual(result.getnchannels(), 1)
+            self.assertEqual(result.getframerate(), 22050)
+            # frames mixed to 200, 400, 600, 800, then pairs averaged
+            self.assertEqual(array("h", result.readframes(2)).tolist(), [300, 700])
+
+        # Case 2: 8 bit
+        exported = self.bank.export("ring.wav", self.served, sample_width=1)
+        with wave.open(exported) as result:
+            self.assertEqual(result.getsampwidth(), 1)
+            self.assertEqual(result.getnframes(), 4)
+
+        # Case 3: invalid options
+        with self.assertRaises(ValueError):
+            self.bank.export("ring.wav", self.served, sample_rate=30000)
+
+    def test_export_up_to_date(self):
+        exported = self.bank.export("ring.wav", self.served, mono=True)
+        with open(exported, "wb") as changed:
+            changed.write(b"kept")
+
+        # exported file is newer than the source -> not written again
+        self.bank.export("ring.wav", self.served, mono=True)
+        with open(exported, "rb") as result:
+            self.assertEqual(result.read(), b"kept")
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -1,10 +1,16 @@
+import subprocess
+import sys
 from unittest import TestCase, main as unittest_main
 from unittest.mock import patch, Mock, MagicMock
 
-from os import path
+from os import environ, listdir, path, stat, utime
+from tempfile import TemporaryDirectory
 
 from frontend import st_front_objects
-from rationalbreaks.timers import RatioNalTimer
+from rationalbreaks import metrics
+from rationalbreaks.clocks import VirtualClock
+from rationalbreaks.formatting import Precision
+from rationalbreaks.timers import RatioNalTimer, TimerSnapshot, transition_allowed
 
 
 class TestRationalTimerStreamlit(TestCase):
@@ -14,47 +20,158 @@ class TestRationalTimerStreamlit(TestCase):
         self.assertIsInstance(timer, RatioNalTimer)
 
 
-class TestAlarm(TestCase):
+class TestSessionTimer(TestCase):
+    @patch('frontend.st_front_objects.timer_registry')
+    @patch('frontend.st_front_objects.get_script_run_ctx')
+    @patch('frontend.st_front_objects.st.query_params', new_callable=dict)
+    def test_session_timer(self, mock_query_params, mock_ctx, mock_registry):
+        mock_ctx.return_value.session_id = "session_1"
+        mock_registry.return_value.get.return_value = "timer of session_1"
+
+        # Case 1: no timer in the url -> session id is used and put into the url
+        timer = st_front_objects.session_timer()
+
+        mock_registry.return_value.get.assert_called_once_with("session_1")
+        self.assertEqual(timer, "timer of session_1")
+        self.assertEqual(mock_query_params["timer"], "session_1")
+
+        # Case 2: timer id from the url
+        mock_query_params["timer"] = "shared"
+        st_front_objects.session_timer()
+        mock_registry.return_value.get.assert_called_with("shared")
+        self.assertEqual(st_front_objects.session_timers()["session_1"], "shared")
+
+
+class TestSessionReaping(TestCase):
+    @patch('frontend.st_front_objects.timer_registry')
+    @patch('frontend.st_front_objects.session_timers')
+    def test_reap_sessions(self, mock_session_timers, mock_registry):
+        mock_session_timers.return_value = {"a": "timer_a", "b": "shared", "c": "shared", "d": "timer_d"}
+        active = {"c", "d"}
+
+        # Case 1: timer of a is evicted, the shared timer is still shown by c
+        reaped = st_front_objects.reap_sessions(lambda session_id: session_id in active)
+        self.assertEqual(reaped, 2)
+        mock_registry.return_value.evict.assert_called_once_with("timer_a")
+        self.assertEqual(mock_session_timers.return_value, {"c": "shared", "d": "timer_d"})
+
+        # Case 2: nothing left to reap
+        self.assertEqual(st_front_objects.reap_sessions(lambda session_id: session_id in active), 0)
+
+    @patch('frontend.st_front_objects.st.cache_resource', lambda x: x)
+    @patch('frontend.st_front_objects.rest_scheduler')
+    @patch('frontend.st_front_objects.Runtime')
+    def test_session_reaper(self, mock_runtime, mock_scheduler):
+        # Case 1: no server, no reaping
+        mock_runtime.exists.return_value = False
+        self.assertFalse(st_front_objects.session_reaper.__wrapped__())
+        mock_scheduler.return_value.schedule_in.assert_not_called()
+
+        # Case 2: reaping is scheduled and reschedules itself, even if it fails
+        mock_runtime.exists.return_value = True
+        self.assertTrue(st_front_objects.session_reaper.__wrapped__(interval_ns=5))
+        interval, reap = mock_scheduler.return_value.schedule_in.call_args.args
+        self.assertEqual(interval, 5)
+        with patch('frontend.st_front_objects.reap_sessions', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                reap()
+        self.assertEqual(mock_scheduler.return_value.schedule_in.call_count, 2)
+
     @patch('frontend.st_front_objects.st.cache_resource', lambda x: x)
-    @patch('frontend.st_front_objects.open')
-    @patch('frontend.st_front_objects.b64encode')
-    def setUp(self, b64enc_mock, mock_open):
-        mocked_file = MagicMock()
-        mocked_file.read.return_value = "Read audio file data"
-        mock_b64 = MagicMock()
-        mock_b64.decode.return_value = "Decoded b64"  # Expeted init value
-        b64enc_mock.return_value = mock_b64
-        mock_open.return_value = mocked_file
+    @patch('frontend.st_front_objects.metrics.serve')
+    @patch('frontend.st_front_objects.timer_registry')
+    @patch('frontend.st_front_objects.session_timers')
+    def test_metrics_endpoint(self, mock_session_timers, mock_registry, mock_serve):
+        # Case 1: no port configured, nothing served
+        with patch.dict('os.environ', {metrics.PORT_VARIABLE: ""}):
+            self.assertIsNone(st_front_objects.metrics_endpoint.__wrapped__())
+        mock_serve.assert_not_called()
+
+        # Case 2: served, sessions are counted by the status of their timer at every export
+        mock_serve.return_value.server_address = ("127.0.0.1", 9464)
+        mock_session_timers.return_value = {}
+        with patch.dict('os.environ', {metrics.PORT_VARIABLE: "9464"}):
+            self.assertEqual(st_front_objects.metrics_endpoint.__wrapped__(), 9464)
+        mock_serve.assert_called_once_with(9464)
+        mock_session_timers.return_value.update(a="working", b="working", c="gone")  # read at every export
+        working = RatioNalTimer()
+        working.start()
+        mock_registry.return_value.peek.side_effect = {"working": working}.get
+        self.assertEqual(metrics.SESSIONS.collect(), {("Working",): 2, ("Evicted",): 1})
+        metrics.SESSIONS.collect = None
+
+    @patch('frontend.st_front_objects._page_activity')
+    def test_page_activity(self, mock_component):
+        # Case 1: nothing reported yet
+        mock_component.return_value = None
+        self.assertEqual(st_front_objects.page_activity(), {"visible": True, "idle": False})
+        mock_component.assert_called_once_with(idle_after=300, key="page_activity", default=None)
+
+        # Case 2: reported by the browser
+        mock_component.return_value = {"visible": False, "idle": False}
+        self.assertFalse(st_front_objects.page_activity()["visible"])
+
 
+class TestAlarm(TestCase):
+    @patch('frontend.st_front_objects.st.cache_resource', lambda x: x)
+    @patch('frontend.st_front_objects.sound_bank')
+    def setUp(self, mock_sound_bank):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_dir = directory.name
+        patcher = patch.dict(environ, RATIONALBREAKS_CACHE=self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(st_front_objects.alarm_player.clear)
+        mock_sound_bank.return_value.export.return_value = path.join("somewhere", "sounds", "ring_1.wav")
         self.alarm = st_front_objects.Alarm()
 
     def test_init_values(self):
         default_path_elements = "resources", "ring_1.wav"
         expected_path = path.join(*default_path_elements)
-        expected_audio_base64 = "Decoded b64"  # from setUP
 
         self.assertEqual(self.alarm.soundfile, expected_path)
-        self.assertEqual(self.alarm.audio_base64, expected_audio_base64)
-
-    @patch('frontend.st_front_objects.open')
-    @patch('frontend.st_front_objects.b64encode')
-    def test_encode_audio(self, b64enc_mock, mock_open):
-        mocked_file = MagicMock()
-        mock_file_read_value = "Read audio file data"
-        mocked_file.read.return_value = mock_file_read_value
-        mock_b64 = MagicMock()
-        decoded_value = "Decoded b64"
-        mock_b64.decode.return_value = decoded_value  # Expeted init value
-        b64enc_mock.return_value = mock_b64
-        mock_open.return_value.__enter__.return_value = mocked_file
-
-        returned_value = self.alarm.encode_audio()
-
-        mock_open.assert_called_with(self.alarm.soundfile, "rb")
-        mocked_file.read.assert_called_once()
-        b64enc_mock.assert_called_with(mock_file_read_value)
-        mock_b64.decode.assert_called_once()
-        self.assertEqual(returned_value, decoded_value)
+        self.assertEqual(self.alarm.sound_url, "sounds/ring_1.wav")
+
+    @patch('frontend.st_front_objects.sound_bank')
+    def test_publish_audio(self, mock_sound_bank):
+        mock_bank = mock_sound_bank.return_value
+        mock_bank.export.return_value = path.join("somewhere", "sounds", "ring_1-mono-22050hz.wav")
+
+        # Case 1: sound is exported into the alarm player component
+        returned_value = self.alarm.publish_audio({"mono": True, "sample_rate": 22050})
+
+        mock_sound_bank.assert_called_with("resources")
+        mock_bank.export.assert_called_once_with("ring_1.wav",
+                                                 path.join(self.cache_dir, "alarm_player", "sounds"),
+                                                 mono=True, sample_rate=22050)
+        self.assertEqual(returned_value, "sounds/ring_1-mono-22050hz.wav")
+
+        # Case 2: no transcoding options
+        self.alarm.publish_audio()
+        self.assertEqual(mock_bank.export.call_args.kwargs, {})
+
+    def test_served_component(self):
+        with TemporaryDirectory() as cache_dir:
+            # Case 1: the player is served from a copy in the cache, the sound is exported next to it
+            served = st_front_objects.served_component("alarm_player", cache_dir)
+            self.assertEqual(served, path.join(cache_dir, "alarm_player"))
+            self.assertEqual(listdir(served), ["index.html"])
+            self.assertEqual(st_front_objects.alarm_player(self.cache_dir)[0],
+                             path.join(self.cache_dir, "alarm_player"))
+
+            # Case 2: an up to date copy is not written again
+            copy = path.join(served, "index.html")
+            utime(copy, (0, 4_000_000_000))
+            st_front_objects.served_component("alarm_player", cache_dir)
+            self.assertEqual(stat(copy).st_mtime, 4_000_000_000)
+
+            # Case 3: importing the module writes nothing, the player is copied on first use
+            unused = path.join(cache_dir, "unused")
+            subprocess.run([sys.executable, "-c", "import frontend.st_front_objects"], check=True,
+                           cwd=path.dirname(path.dirname(path.abspath(__file__))),
+                           env=dict(environ, RATIONALBREAKS_CACHE=unused))
+            self.assertFalse(path.exists(unused))
 
     @patch('frontend.st_front_objects.st.session_state')
     def test_trigger_audio(self, mock_session_state):
@@ -115,105 +232,113 @@ class TestAlarm(TestCase):
         returned_value = self.alarm.trigger_audio()
         self.assertEqual(returned_value, expected_value)
 
-    @patch('frontend.st_front_objects.st.components.v1.html')
+        # Case 9: snapshot overrides session_state rest_consumed
+        mock_session_state.alert = {"play_sound": True, "muted": False}
+        mock_session_state.rest_consumed = False
+        snapshot = TimerSnapshot("Resting", 30, 0, True, 2, 30)
+        self.assertEqual(self.alarm.trigger_audio(snapshot), "true")
+
+        # Case 10: consumed snapshot that is not resting does not trigger
+        snapshot = TimerSnapshot("Working", 0, 0, True, 1, 0)
+        self.assertEqual(self.alarm.trigger_audio(snapshot), "false")
+
+    @patch('frontend.st_front_objects._alarm_player')
     @patch('frontend.st_front_objects.st.session_state')
-    # @patch.object(st_front_objects.Alarm, 'trigger_audio')
-    def test_load_player_html(self, mock_session_state, st_html_mock):
-        # Case 1: default refresh; trigger is true -> alarm will play
+    def test_load_player_html(self, mock_session_state, mock_player):
+        # Case 1: trigger is true -> alarm plays once for this rest period
         mock_session_state.alert = {"play_sound": True, "muted": False}
         mock_session_state.rest_consumed = True
-        alarm = st_front_objects.Alarm()
-        expected_string = \
-            f"""
-            <script src="https://cdnjs.cloudflare.com/ajax/libs/howler/2.2.3/howler.min.js">
-            </script>
-            <script>
-            const sound = new Howl({{
-                src: ['data:audio/wav;base64,{self.alarm.audio_base64}']
-            }});
-    
-            // Monitor Streamlit for playback trigger
-            const checkPlayback = () => {{
-                const playAudio = true;
-                if (playAudio) {{
-                    sound.play();
-                }}
-            }};
-    
-            // Poll the server for updates every "refresh_frequency" ms
-            setInterval(checkPlayback, 1000);
-            </script>
-            """
-        alarm.load_player_html()
-        st_html_mock.assert_called_with(expected_string, height=1)
-
-        # Case 2: default refresh; trigger is false -> alarm will NOT play
-        mock_session_state.alert = {"play_sound": True, "muted": False}
+        self.alarm.load_player_html()
+        mock_player.assert_called_with(sound="sounds/ring_1.wav", play=True, arm_in=None, ring=0,
+                                       key="alarm_player", default=None, on_change=None)
+
+        # Case 2: trigger is false -> alarm will NOT play
         mock_session_state.rest_consumed = False
-        alarm = st_front_objects.Alarm()
-        expected_string = \
-            f"""
-            <script src="https://cdnjs.cloudflare.com/ajax/libs/howler/2.2.3/howler.min.js">
-            </script>
-            <script>
-            const sound = new Howl({{
-                src: ['data:audio/wav;base64,{self.alarm.audio_base64}']
-            }});
-    
-            // Monitor Streamlit for playback trigger
-            const checkPlayback = () => {{
-                const playAudio = false;
-                if (playAudio) {{
-                    sound.play();
-                }}
-            }};
-    
-            // Poll the server for updates every "refresh_frequency" ms
-            setInterval(checkPlayback, 1000);
-            </script>
-            """
-        alarm.load_player_html()
-        st_html_mock.assert_called_with(expected_string, height=1)
-
-        # Case 3: set refresh value; trigger is true -> alarm will play
+        self.alarm.load_player_html()
+        mock_player.assert_called_with(sound="sounds/ring_1.wav", play=False, arm_in=None, ring=0,
+                                       key="alarm_player", default=None, on_change=None)
+
+        # Case 3: resting with rest left -> player is armed with the time left
+        snapshot = TimerSnapshot("Resting", 60 * 10 ** 9, 15 * 10 ** 9, False, 2, 0, cycle_start_ns=7_000_123_456)
+        self.alarm.load_player_html(snapshot=snapshot)
+        mock_player.assert_called_with(sound="sounds/ring_1.wav", play=False, arm_in=15.0, ring=7_000_123,
+                                       key="alarm_player", default=None, on_change=None)
+
+        # Case 4: resting, but muted -> not armed
+        mock_session_state.alert = {"play_sound": True, "muted": True}
+        self.alarm.load_player_html(snapshot=snapshot)
+        self.assertIsNone(mock_player.call_args.kwargs["arm_in"])
+
+        # Case 5: rest consumed while resting -> pushed by the server
         mock_session_state.alert = {"play_sound": True, "muted": False}
-        mock_session_state.rest_consumed = True
-        alarm = st_front_objects.Alarm()
-        expected_string = \
-            f"""
-            <script src="https://cdnjs.cloudflare.com/ajax/libs/howler/2.2.3/howler.min.js">
-            </script>
-            <script>
-            const sound = new Howl({{
-                src: ['data:audio/wav;base64,{self.alarm.audio_base64}']
-            }});
-    
-            // Monitor Streamlit for playback trigger
-            const checkPlayback = () => {{
-                const playAudio = true;
-                if (playAudio) {{
-                    sound.play();
-                }}
-            }};
-    
-            // Poll the server for updates every "refresh_frequency" ms
-            setInterval(checkPlayback, 500);
-            </script>
-            """
-        alarm.load_player_html(refresh_frequency=500)
-        st_html_mock.assert_called_with(expected_string, height=1)
+        snapshot = TimerSnapshot("Resting", 60 * 10 ** 9, 0, True, 2, 0, cycle_start_ns=7_000_123_456)
+        self.alarm.load_player_html(snapshot=snapshot)
+        mock_player.assert_called_with(sound="sounds/ring_1.wav", play=True, arm_in=None, ring=7_000_123,
+                                       key="alarm_player", default=None, on_change=None)
+
+        # Case 6: mute callback is passed to the player
+        on_mute = Mock()
+        self.alarm.load_player_html(snapshot=snapshot, on_mute=on_mute)
+        self.assertIs(mock_player.call_args.kwargs["on_change"], on_mute)
+
+        # Case 7: a rest period after a reset has a ring of its own, the player stays mounted across resets
+        clock = VirtualClock()
+        timer = RatioNalTimer(clock=clock)
+        rings = []
+        for methods in (("start", "rest"), ("continue_work", "reset", "start", "rest")):
+            for method in methods:
+                clock.advance(60)
+                getattr(timer, method)()
+            self.alarm.load_player_html(snapshot=timer.snapshot())
+            rings.append(mock_player.call_args.kwargs["ring"])
+        self.assertEqual(timer.snapshot().cycles, 2)
+        self.assertNotEqual(rings[0], rings[1])
+
+        # Case 7: the sound itself is never part of the per run payload
+        for call in mock_player.call_args_list:
+            self.assertLess(len(repr(call)), 250)
+
+    @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
+    def test_alarm_muted(self, mock_session_state):
+        mock_session_state["alert"] = {"play_sound": True, "muted": False}
+        st_front_objects.alarm_muted()
+        self.assertTrue(mock_session_state["alert"]["muted"])
 
 
 class TestStatusControl(TestCase):
 
     def setUp(self) -> None:
         self.mock_timer_instance = MagicMock()
+        # the mocked timer keeps the status of its last method
+        self.timer_status = "Not started"
+        for method, status in (("start", "Working"), ("rest", "Resting"), ("continue_work", "Working"),
+                               ("reset", "Not started")):
+            getattr(self.mock_timer_instance, method).side_effect = \
+                lambda status=status: setattr(self, "timer_status", status)
+        self.mock_timer_instance.status.side_effect = lambda: self.timer_status
         self.control = st_front_objects.StatusControl(self.mock_timer_instance)
 
     def test_init(self):
         mock_timer_instance = MagicMock()
         test_control = st_front_objects.StatusControl(mock_timer_instance)
         self.assertEqual(test_control.timer, mock_timer_instance)
+        self.assertIsNone(test_control.event_log)
+
+    @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
+    def test_event_log(self, mock_session_state):
+        mock_log = MagicMock()
+        mock_session_state["alert"] = {"play_sound": True, "muted": True}
+        control = st_front_objects.StatusControl(self.mock_timer_instance, log=mock_log, timer_id="t1")
+
+        control.start()
+        control.rest()
+        control.continue_work()
+        control.set_ratio(4)
+        control.reset()
+
+        self.assertEqual([c.args for c in mock_log.append.call_args_list],
+                         [("t1", "start", None), ("t1", "rest", None), ("t1", "continue_work", None),
+                          ("t1", "set_ratio", 4.0), ("t1", "reset", None)])
 
     @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
     def test_start(self, mock_session_state):
@@ -281,7 +406,142 @@ class TestStatusControl(TestCase):
 
         self.control.mute_alarm()
         self.assertEqual(mock_session_state["alert"]["muted"], expected_val_muted)
-        mock_st_rerun.assert_called_once()
+        mock_st_rerun.assert_not_called()
+
+    @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
+    def test_transition(self, mock_session_state):
+        mock_session_state["alert"] = {"play_sound": True, "muted": True}
+        mock_session_state["status"] = "Not started"
+
+        # Case 1: allowed transitions follow the table
+        for action, expected_status in (("start", "Working"), ("rest", "Resting"), ("continue_work", "Working"),
+                                        ("reset", "Not started")):
+            self.assertTrue(self.control.transition(action))
+            self.assertEqual(mock_session_state["status"], expected_status)
+
+        # Case 2: action not allowed in the status (e.g. stale button) is ignored
+        self.assertFalse(self.control.transition("rest"))
+        self.mock_timer_instance.rest.assert_called_once()
+        self.assertEqual(mock_session_state["status"], "Not started")
+
+        # Case 3: the status of the timer decides, not the one of a stale tab (another tab started the timer)
+        self.timer_status = "Working"
+        self.assertFalse(self.control.transition("start"))
+        self.assertTrue(self.control.transition("rest"))
+        self.assertEqual(mock_session_state["status"], "Resting")
+        self.assertTrue(self.control.transition("mute_alarm"))
+        self.mock_timer_instance.start.assert_called_once()
+
+        # Case 4: every call counts as one interaction
+        self.assertEqual(mock_session_state["rerun_metrics"]["interactions"], 8)
+
+        # Case 5: the table and the status buttons agree
+        for status, (_, action) in self.control.STATUS_BUTTONS.items():
+            self.assertTrue(transition_allowed(action, status))
+
+    @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
+    def test_transition_metrics(self, mock_session_state):
+        mock_session_state["alert"] = {"play_sound": True, "muted": True}
+        mock_session_state["status"] = "Not started"
+        applied = metrics.TRANSITIONS.value(("start", "applied"))
+        ignored = metrics.TRANSITIONS.value(("rest", "ignored"))
+        timed = metrics.TRANSITION_LATENCY.count(("start",))
+
+        # Case 1: disabled, nothing is counted
+        self.control.transition("start")
+        self.control.transition("reset")
+        self.assertEqual(metrics.TRANSITIONS.value(("start", "applied")), applied)
+
+        # Case 2: applied transitions are counted and timed, ignored ones only counted
+        metrics.enable()
+        try:
+            self.assertTrue(self.control.transition("start"))
+            self.assertFalse(self.control.transition("start"))
+            self.assertTrue(self.control.transition("rest"))
+            self.assertFalse(self.control.transition("rest"))
+        finally:
+            metrics.disable()
+        self.assertEqual(metrics.TRANSITIONS.value(("start", "applied")), applied + 1)
+        self.assertEqual(metrics.TRANSITIONS.value(("rest", "ignored")), ignored + 1)
+        self.assertEqual(metrics.TRANSITION_LATENCY.count(("start",)), timed + 1)
+        self.assertEqual(mock_session_state["status"], "Resting")
+
+    @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
+    def test_confirm_reset(self, mock_session_state):
+        mock_session_state.update(status="Working", reset_clicked=True, alert={"muted": False})
+
+        self.control.confirm_reset()
+
+        self.mock_timer_instance.reset.assert_called_once()
+        self.assertEqual(mock_session_state["status"], "Not started")
+        self.assertFalse(mock_session_state["reset_clicked"])
+
+    @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
+    def test_save_settings(self, mock_session_state):
+        mock_session_state.update(new_ratio=4.5, alarm_sound=False, new_precision=Precision.SECONDS,
+                                  alert={"play_sound": True, "muted": True})
+
+        self.control.save_settings()
+
+        self.mock_timer_instance.set_ratio.assert_called_once_with(4.5)
+        self.assertFalse(mock_session_state["alert"]["play_sound"])
+        self.assertEqual(mock_session_state["display_precision"], Precision.SECONDS)
+
+
+class TestRerunMetrics(TestCase):
+    @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
+    def test_rerun_metrics(self, mock_session_state):
+        # Case 1: first run
+        st_front_objects.record_script_run()
+        self.assertEqual(mock_session_state["rerun_metrics"], {"runs": 1, "fragment_runs": 0, "interactions": 0,
+                                                               "runs_since_interaction": 1})
+
+        # Case 2: callback, then the run it triggers
+        st_front_objects.set_session_state(settings_clicked=True)
+        st_front_objects.record_script_run()
+        self.assertTrue(mock_session_state["settings_clicked"])
+        self.assertEqual(st_front_objects.reruns_per_interaction(), 1)
+
+        # Case 3: an extra st.rerun() would show up as a second run
+        st_front_objects.record_script_run()
+        self.assertEqual(st_front_objects.reruns_per_interaction(), 2)
+        self.assertEqual(mock_session_state["rerun_metrics"]["runs"], 3)
+
+    @patch('frontend.st_front_objects.st.rerun')
+    @patch('frontend.st_front_objects.get_script_run_ctx')
+    @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
+    def test_begin_fragment(self, mock_session_state, mock_ctx, mock_rerun):
+        # Case 1: fragment as part of a full run
+        mock_ctx.return_value.fragment_ids_this_run = []
+        self.assertFalse(st_front_objects.begin_fragment())
+
+        # Case 2: fragment only run is counted, not as a full run
+        mock_ctx.return_value.fragment_ids_this_run = ["settings"]
+        st_front_objects.set_session_state(settings_clicked=True)
+        self.assertTrue(st_front_objects.begin_fragment())
+        self.assertEqual(mock_session_state["rerun_metrics"]["fragment_runs"], 1)
+        self.assertEqual(st_front_objects.reruns_per_interaction(), 0)
+        mock_rerun.assert_not_called()
+
+        # Case 3: requested by a callback -> full app run
+        st_front_objects.request_app_rerun()
+        st_front_objects.begin_fragment()
+        mock_rerun.assert_called_once_with(scope="app")
+
+        # Case 4: a full run clears the request
+        st_front_objects.request_app_rerun()
+        st_front_objects.record_script_run()
+        self.assertNotIn("app_rerun_requested", mock_session_state)
+
+        # Case 5: instrumented, the rerun is counted under the callback requesting it
+        reruns = metrics.RERUNS.value(("save_settings",))
+        metrics.enable()
+        try:
+            st_front_objects.request_app_rerun("save_settings")
+            st_front_objects.begin_fragment()
+        finally:
+            metrics.disable()
+        self.assertEqual(metrics.RERUNS.value(("save_settings",)), reruns + 1)
 
 
 class TestCheckRestConsumed(TestCase):
@@ -290,7 +550,7 @@ class TestCheckRestConsumed(TestCase):
         mock_timer = MagicMock()
 
         # Case 1: All rest consumed, not resting
-        mock_timer.all_rest_consumed.return_value = True
+        mock_timer.snapshot.return_value.rest_consumed = True
         mock_session_state["status"] = "Working"
         mock_session_state["rest_consumed"] = False
         expected_session_state_rest_consumed = False
@@ -301,7 +561,7 @@ class TestCheckRestConsumed(TestCase):
         self.assertEqual(check, expected_return)
 
         # Case 2: Not yet consumed all rest, resting is true
-        mock_timer.all_rest_consumed.return_value = False
+        mock_timer.snapshot.return_value.rest_consumed = False
         mock_session_state["status"] = "Resting"
         expected_session_state_rest_consumed = False
         expected_return = False
@@ -311,7 +571,7 @@ class TestCheckRestConsumed(TestCase):
         self.assertEqual(check, expected_return)
 
         # Case 3: Not yet consumed all rest, not resting
-        mock_timer.all_rest_consumed.return_value = False
+        mock_timer.snapshot.return_value.rest_consumed = False
         mock_session_state["status"] = "Working"
         expected_session_state_rest_consumed = False
         expected_return = False
@@ -321,7 +581,7 @@ class TestCheckRestConsumed(TestCase):
         self.assertEqual(check, expected_return)
 
         # Case 4: All rest consumed, resting is true
-        mock_timer.all_rest_consumed.return_value = True
+        mock_timer.snapshot.return_value.rest_consumed = True
         mock_session_state["status"] = "Resting"
         expected_session_state_rest_consumed = True
         expected_return = True
@@ -330,13 +590,193 @@ class TestCheckRestConsumed(TestCase):
         self.assertEqual(mock_session_state["rest_consumed"], expected_session_state_rest_consumed)
         self.assertEqual(check, expected_return)
 
+        # Case 5: passed snapshot is used instead of taking a new one
+        mock_timer.snapshot.reset_mock()
+        snapshot = MagicMock(rest_consumed=True)
+        check = st_front_objects.check_rest_consumed(mock_timer, snapshot)
+        mock_timer.snapshot.assert_not_called()
+        self.assertTrue(check)
+
 
 class TestDisplayTimers(TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.timer = RatioNalTimer(clock=self.clock)
+        self.work_display = MagicMock()
+        self.rest_display = MagicMock()
+        self.sleeps = []
+
+    def run_display(self, seconds: float, **kwargs) -> None:
+        """Runs display_timers for seconds of virtual time, sleeps advance the clock"""
+        end = self.clock.now_ns() + seconds * 1_000_000_000
+
+        def virtual_sleep(duration):
+            self.sleeps.append(duration)
+            self.clock.advance(duration)
+            if self.clock.now_ns() >= end:
+                raise StopIteration
+
+        with patch('frontend.st_front_objects.sleep', virtual_sleep):
+            with self.assertRaises(StopIteration):
+                st_front_objects.display_timers(self.timer, self.work_display, self.rest_display,
+                                                clock=self.clock, **kwargs)
+
+    def shown(self, display: MagicMock) -> list:
+        return [call.args[1] for call in display.metric.call_args_list]
+
+    def test_ns_until_display_change(self):
+        snapshot = TimerSnapshot(status="Working", work_ns=1_500_000_000, rest_ns=500_000_000,
+                                 rest_consumed=False, cycles=1, taken_at_ns=0)
+        # Case 1: work reaches the next second before rest (0.5 s of rest needs 1.5 s of work)
+        self.assertEqual(st_front_objects.ns_until_display_change(snapshot, 3, Precision.SECONDS), 500_000_000)
+        # Case 2: centiseconds, the work display changes first
+        self.assertEqual(st_front_objects.ns_until_display_change(snapshot, 3, Precision.CENTISECONDS), 10_000_000)
+
+        # Case 3: resting, rest counts down past the current second
+        snapshot = TimerSnapshot(status="Resting", work_ns=1_500_000_000, rest_ns=400_000_000,
+                                 rest_consumed=False, cycles=2, taken_at_ns=0)
+        self.assertEqual(st_front_objects.ns_until_display_change(snapshot, 3, Precision.SECONDS), 400_000_001)
+
+        # Case 4: nothing moves
+        snapshot = TimerSnapshot(status="Resting", work_ns=1_500_000_000, rest_ns=0,
+                                 rest_consumed=True, cycles=2, taken_at_ns=0)
+        self.assertIsNone(st_front_objects.ns_until_display_change(snapshot, 3, Precision.SECONDS))
+        snapshot = TimerSnapshot(status="Not started", work_ns=0, rest_ns=0,
+                                 rest_consumed=False, cycles=0, taken_at_ns=0)
+        self.assertIsNone(st_front_objects.ns_until_display_change(snapshot, 3, Precision.CENTISECONDS))
+
+    @patch('frontend.st_front_objects.check_rest_consumed')
+    @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
+    def test_display_timers(self, mock_session_state, mock_check_rest):
+        # Case 1: not started, values are sent once, later ticks send nothing
+        self.run_display(2)
+        self.assertEqual(self.shown(self.work_display), ["00:00:00"])
+        self.assertEqual(self.shown(self.rest_display), ["00:00:00"])
+        self.assertTrue(all(duration <= 0.25 for duration in self.sleeps))
+
+        # Case 2: working with seconds precision, one update per visible change
+        self.work_display.reset_mock()
+        self.rest_display.reset_mock()
+        self.timer.start()
+        self.run_display(6, precision=Precision.SECONDS)
+        self.assertEqual(self.shown(self.work_display), ["00:00", "00:01", "00:02", "00:03", "00:04", "00:05"])
+        self.assertEqual(self.shown(self.rest_display), ["00:00", "00:01"])
+
+        # Case 3: the precision chosen by the session wins
+        self.work_display.reset_mock()
+        mock_session_state["display_precision"] = Precision.MINUTES
+        self.run_display(60)
+        self.assertEqual(self.shown(self.work_display), ["00:00", "00:01"])
+
+        # Case 4: centiseconds are capped by update_per_sec
+        self.work_display.reset_mock()
+        mock_session_state["display_precision"] = Precision.CENTISECONDS
+        self.run_display(1, update_per_sec=10)
+        self.assertEqual(len(self.shown(self.work_display)), 10)
+
+    @patch('frontend.st_front_objects.check_rest_consumed')
+    @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
+    def test_page_activity(self, mock_session_state, mock_check_rest):
+        self.timer.start()
+        # Case 1: hidden page, values are shown once and the loop parks without sleeping
+        st_front_objects.display_timers(self.timer, self.work_display, self.rest_display,
+                                        clock=self.clock, page={"visible": False, "idle": False})
+        self.assertEqual(self.shown(self.work_display), ["00:00:00"])
+        self.assertEqual(self.sleeps, [])
+        mock_check_rest.assert_called_once()
+
+        # Case 2: idle user, only minutes are shown, whatever the session precision
+        self.work_display.reset_mock()
+        mock_session_state["display_precision"] = Precision.CENTISECONDS
+        self.run_display(121, page={"visible": True, "idle": True})
+        self.assertEqual(self.shown(self.work_display), ["00:00", "00:01", "00:02"])
+
+    @patch('frontend.st_front_objects.check_rest_consumed')
+    @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
+    def test_drift_correction(self, mock_session_state, mock_check_rest):
+        # rendering takes 30 ms, the sleeps get shorter instead of the ticks drifting
+        rendered_at = []
+
+        def slow_metric(*args):
+            rendered_at.append(self.clock.now_ns())
+            self.clock.advance(0.03)
+
+        self.work_display.metric.side_effect = slow_metric
+        self.timer.start()
+        self.run_display(100.01, precision=Precision.SECONDS)
+        self.assertEqual(self.shown(self.work_display)[-1], "01:40")
+        self.assertEqual(rendered_at, [second * 1_000_000_000 for second in range(101)])
+
+    @patch('frontend.st_front_objects.check_rest_consumed')
+    @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
+    def test_display_metrics(self, mock_session_state, mock_check_rest):
+        iterations = metrics.DISPLAY_ITERATIONS.value()
+        overshoots = metrics.SLEEP_OVERSHOOT.count()
+        latencies = metrics.TICK_LATENCY.count()
+        self.timer.start()
+
+        # Case 1: disabled, nothing is counted
+        self.run_display(2, precision=Precision.SECONDS)
+        self.assertEqual(metrics.DISPLAY_ITERATIONS.value(), iterations)
+
+        # Case 2: every iteration and sleep is counted, every tick sending a change is timed
+        # from the moment it was planned; sleeps and rendering of a virtual clock take no time
+        self.work_display.reset_mock()
+        self.sleeps.clear()
+        metrics.enable()
+        try:
+            self.run_display(3, precision=Precision.SECONDS)
+        finally:
+            metrics.disable()
+        self.assertEqual(metrics.DISPLAY_ITERATIONS.value(), iterations + len(self.sleeps))
+        self.assertEqual(metrics.SLEEP_OVERSHOOT.count(), overshoots + len(self.sleeps) - 1)
+        self.assertEqual(metrics.TICK_LATENCY.count(), latencies + 2)
+        self.assertEqual(self.shown(self.work_display), ["00:02", "00:03", "00:04"])
+
+    @patch('frontend.st_front_objects.profiling')
+    @patch('frontend.st_front_objects.check_rest_consumed')
+    @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
+    def test_display_profiling(self, mock_session_state, mock_check_rest, mock_profiling):
+        # Case 1: profiling off, no tick is sampled
+        mock_profiling.enabled, mock_profiling.tick_rate = False, 0.0
+        self.run_display(1, precision=Precision.SECONDS)
+        mock_profiling.run_ends_here.assert_not_called()
+        mock_profiling.start_tick.assert_not_called()
+
+        # Case 2: the profile of the run ends at the loop, every tick is offered to the tick sampler
+        self.sleeps.clear()
+        mock_profiling.enabled, mock_profiling.tick_rate = True, 1.0
+        self.run_display(2, precision=Precision.SECONDS)
+        mock_profiling.run_ends_here.assert_called_once()
+        self.assertEqual(mock_profiling.start_tick.call_count, len(self.sleeps))
+        self.assertEqual(mock_profiling.finish_tick.call_args_list,
+                         [((mock_profiling.start_tick.return_value,),)] * len(self.sleeps))
+
+
+class TestDisplayClientTimers(TestCase):
+    def setUp(self):
+        self.timer = RatioNalTimer()
+
+    @patch('frontend.st_front_objects.st.rerun')
     @patch('frontend.st_front_objects.check_rest_consumed')
-    @patch('frontend.st_front_objects.st.empty')
+    @patch('frontend.st_front_objects._timer_clock')
     @patch('frontend.st_front_objects.st.session_state', new_callable=dict)
-    def test_display_timers(self, mock_check_rest_cons, mock_st_empty, mock_sessions_state):
-        timer_mock = MagicMock()
+    def test_display_client_timers(self, mock_session_state, mock_clock, mock_check_rest, mock_rerun):
+        # Case 1: base values are sent to the component, no rerun
+        mock_session_state["alert"] = {"play_sound": True, "muted": False}
+        mock_check_rest.return_value = False
+
+        st_front_objects.display_client_timers(self.timer)
+
+        mock_clock.assert_called_once_with(status="Not started", work=0.0, rest=0.0, ratio=3.0,
+                                           precision=0, key="timer_clock", default=None)
+        mock_rerun.assert_not_called()
+
+        # Case 2: rest consumed and alarm active -> no rerun, the alarm player rings by itself
+        mock_check_rest.return_value = True
+        st_front_objects.display_client_timers(self.timer)
+        mock_rerun.assert_not_called()
+        self.assertEqual(mock_check_rest.call_count, 2)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,68 @@
+from unittest import TestCase, main as unittest_main
+from unittest.mock import patch
+from tempfile import TemporaryDirectory
+from os import environ, path
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from rationalbreaks.eventlog import EventLog
+from rationalbreaks.formatting import Precision
+
+APP_FILE = path.join(path.dirname(path.dirname(path.abspath(__file__))), "streamlit_ui.py")
+
+
+class TestStreamlitUI(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.log = EventLog(path.join(self.directory.name, "events.sqlite3"))
+        patcher = patch('frontend.st_front_objects.event_log', return_value=self.log)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # the alarm sound is exported into the cache, not into the home directory
+        patcher = patch.dict(environ, RATIONALBREAKS_CACHE=path.join(self.directory.name, "cache"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(st.cache_resource.clear)
+        self.app = AppTest.from_file(APP_FILE, default_timeout=10)
+        self.app.run()
+
+    def tearDown(self):
+        self.log.close()
+        self.directory.cleanup()
+
+    def click(self, label: str) -> None:
+        next(button for button in self.app.button if button.label == label).click().run()
+
+    def runs_of_last_interaction(self) -> int:
+        return self.app.session_state["rerun_metrics"]["runs_since_interaction"]
+
+    def test_one_run_per_click(self):
+        for label, status in (("Start", "Working"), ("Rest", "Resting"), ("Continue", "Working")):
+            self.click(label)
+            self.assertEqual(self.app.session_state["status"], status)
+            self.assertEqual(self.runs_of_last_interaction(), 1, label)
+
+        for label in ("Settings", "Hide settings", "Reset timers", "Cancel", "Reset timers", "Confirm"):
+            self.click(label)
+            self.assertEqual(self.runs_of_last_interaction(), 1, label)
+
+        self.assertEqual(self.app.session_state["status"], "Not started")
+        self.assertEqual(self.app.session_state["rerun_metrics"]["interactions"], 9)
+
+    def test_save_settings(self):
+        self.click("Settings")
+        self.app.number_input(key="new_ratio").set_value(5.0)
+        self.app.toggle(key="alarm_sound").set_value(False)
+        self.app.selectbox(key="new_precision").set_value(Precision.SECONDS)
+        self.click("Save settings")
+
+        self.assertEqual(self.runs_of_last_interaction(), 1)
+        self.assertFalse(self.app.session_state["alert"]["play_sound"])
+        self.assertEqual(self.app.session_state["display_precision"], Precision.SECONDS)
+        self.log.flush(timeout=5)
+        self.assertEqual(self.log.replay(self.app.query_params["timer"][0]).get_ratio(), 5.0)
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -1,107 +1,98 @@
 from unittest import TestCase, main as unittest_main
 from unittest.mock import patch, Mock, MagicMock
 from datetime import timedelta
+import pickle
 
-from rationalbreaks.timers import RatioNalTimer, SimpleTime
+from rationalbreaks.clocks import VirtualClock
+from rationalbreaks.formatting import Precision
+from rationalbreaks.history import CycleHistory
+from rationalbreaks.scheduler import DeadlineScheduler
+from rationalbreaks.timers import (RATIO_MIN, TRANSITIONS, RatioNalTimer, SimpleTime, TimerSnapshot, TimerStatus,
+                                   check_ratio, transition_allowed)
 
 
 class TestRationalTimer(TestCase):
     """Setup for downstream tests
-    In tests representing time calculation with integer operations, as both use underlying __sub__ and __add__
-    operators, but integer tests are easier to follow and construct."""
+    Time is driven by a VirtualClock, internal values are integer nanoseconds."""
     def setUp(self):
-        self.timer = RatioNalTimer()
+        self.clock = VirtualClock()
+        self.timer = RatioNalTimer(clock=self.clock)
 
     def test_init(self):
         # Case 1: default ratio
         expected_ratio = 3
-        expected_status = "Not started"
-        expected_timestamps = []
+        expected_status = TimerStatus.NOT_STARTED
         self.assertEqual(self.timer._ratio, expected_ratio)
         self.assertEqual(self.timer._status, expected_status)
-        self.assertEqual(self.timer._cycle_timestamps, expected_timestamps)
-        self.assertEqual(self.timer._current_cycle_time, timedelta(0))
-        self.assertEqual(self.timer._saved_work, timedelta(0))
-        self.assertEqual(self.timer._saved_rest, timedelta(0))
+        self.assertEqual((self.timer._cycle_start, self.timer._cycles), (0, 0))
+        self.assertIsNone(self.timer.history())
+        self.assertEqual(self.timer._saved_work, 0)
+        self.assertEqual(self.timer._saved_rest, 0)
 
         # Case 2: testing with non-default ratio
         self._test_timer = RatioNalTimer(5)
         expected_ratio = 5
-        expected_status = "Not started"
-        expected_timestamps = []
         self.assertEqual(self._test_timer._ratio, expected_ratio)
         self.assertEqual(self._test_timer._status, expected_status)
-        self.assertEqual(self._test_timer._cycle_timestamps, expected_timestamps)
-        self.assertEqual(self._test_timer._current_cycle_time, timedelta(0))
-        self.assertEqual(self._test_timer._saved_work, timedelta(0))
-        self.assertEqual(self._test_timer._saved_rest, timedelta(0))
+        self.assertEqual(self._test_timer._cycles, 0)
+        self.assertEqual((self._test_timer._ratio_numerator, self._test_timer._ratio_denominator), (5, 1))
 
         # Case 3: non-integer ratio
         self._test_timer = RatioNalTimer(1.5)
         expected_ratio = 1.5
-        expected_status = "Not started"
-        expected_timestamps = []
         self.assertEqual(self._test_timer._ratio, expected_ratio)
-        self.assertEqual(self._test_timer._status, expected_status)
-        self.assertEqual(self._test_timer._cycle_timestamps, expected_timestamps)
-        self.assertEqual(self._test_timer._current_cycle_time, timedelta(0))
-        self.assertEqual(self._test_timer._saved_work, timedelta(0))
-        self.assertEqual(self._test_timer._saved_rest, timedelta(0))
+        self.assertEqual((self._test_timer._ratio_numerator, self._test_timer._ratio_denominator), (3, 2))
 
         # Case 4: invalid ratio
         passed_invalid_value = "abc"
         with self.assertRaises(ValueError):
             self._test_timer = RatioNalTimer(passed_invalid_value)
 
-    @patch('rationalbreaks.timers.datetime')
-    def test_start(self, mock_now):
+        # Case 5: default clock
+        self.assertIsNotNone(RatioNalTimer()._clock.now_ns())
+
+    def test_start(self):
         # Case 1: Using first time
-        expected_status = "Working"
-        time_value_for_mock = "mocked_datetime"
-        mock_now.now.return_value = time_value_for_mock
+        expected_status = TimerStatus.WORKING
+        self.clock.advance_ns(5)
 
         self.timer.start()
 
         self.assertEqual(self.timer._status, expected_status)
-        self.assertEqual(self.timer._cycle_timestamps, [time_value_for_mock])
+        self.assertEqual((self.timer._cycle_start, self.timer._cycles), (5, 1))
 
         # Case 2: Using again
-        self.timer._status = "Resting"
-        time_value_for_mock2 = "mocked_datetime 2"
-        mock_now.now.return_value = time_value_for_mock2
+        self.timer._status = TimerStatus.RESTING
+        self.clock.advance_ns(3)
 
         self.timer.start()
 
-        self.assertEqual(self.timer._cycle_timestamps, [time_value_for_mock, time_value_for_mock2])
+        self.assertEqual((self.timer._cycle_start, self.timer._cycles), (8, 2))
         self.assertEqual(self.timer._status, expected_status)
 
-    @patch('rationalbreaks.timers.RatioNalTimer._save_cycle_work')
-    @patch('rationalbreaks.timers.RatioNalTimer._save_cycle_rest')
-    @patch('rationalbreaks.timers.datetime')
-    def test_reset(self, datetime_mock, save_rest_mock, save_work_mock):
-        # setting up preconditions
-        self.timer._status = "Working"
-
-        # mock and expected values
-        expected_status = "Resting"
-        time_value_for_mock = "mocked_datetime"
-        datetime_mock.now.return_value = "mocked_datetime"
-        expected_time_values = self.timer._cycle_timestamps + [time_value_for_mock]
+    def test_rest(self):
+        self.timer.start()
+        self.clock.advance_ns(30)
 
         self.timer.rest()
 
-        # assertions
-        self.assertEqual(self.timer._cycle_timestamps, expected_time_values)
-        self.assertEqual(self.timer._status, expected_status)
-        save_work_mock.assert_called_once()
-        save_rest_mock.assert_called_once()
+        self.assertEqual((self.timer._cycle_start, self.timer._cycles), (30, 2))
+        self.assertEqual(self.timer._status, TimerStatus.RESTING)
+        self.assertEqual(self.timer._saved_work, 30)
+        self.assertEqual(self.timer._saved_rest, 10)
+
+    def test_continue_work(self):
+        self.timer.start()
+        self.clock.advance_ns(30)
+        self.timer.rest()
+        self.clock.advance_ns(4)
 
-    @patch('rationalbreaks.timers.RatioNalTimer._save_cycle_rest')
-    @patch('rationalbreaks.timers.RatioNalTimer.start')
-    def test_continue_work(self, mock_start, mock_save_rest):
         self.timer.continue_work()
-        mock_start.assert_called_once()
-        mock_save_rest.assert_called_once()
+
+        self.assertEqual(self.timer._status, TimerStatus.WORKING)
+        self.assertEqual((self.timer._cycle_start, self.timer._cycles), (34, 3))
+        self.assertEqual(self.timer._saved_rest, 6)
+        self.assertEqual(self.timer._saved_work, 30)
 
     def test_get_ratio(self):
         expected = self.timer._ratio
@@ -114,6 +105,7 @@ class TestRationalTimer(TestCase):
         input_ratio = float(2.5)
         self.timer.set_ratio(input_ratio)
         self.assertEqual(self.timer._ratio, input_ratio)
+        self.assertEqual((self.timer._ratio_numerator, self.timer._ratio_denominator), (5, 2))
 
         # Case 2: input int
         input_ratio = int(4)
@@ -130,143 +122,145 @@ class TestRationalTimer(TestCase):
         with self.assertRaises(ValueError):
             self.timer.set_ratio(input_ratio)
 
-    @patch('rationalbreaks.timers.datetime')
-    def test_calculate_cycle_time(self, datetime_mock):
-        # representing time calculation with integer operations
-        value_for_timestamp = 3
-        value_for_mock = 5
-        datetime_mock.now.return_value = value_for_mock
-        self.timer._cycle_timestamps.append(value_for_timestamp)
-
-        output = self.timer._calculate_cycle_time()
-
-        self.assertEqual(output, value_for_mock - value_for_timestamp)
-        datetime_mock.now.assert_called_once()
-
-    def _test_status(self):
-        self.assertEqual(self.timer.status(), self.timer._status)
-
-    @patch('rationalbreaks.timers.RatioNalTimer._calculate_cycle_time')
-    def _test_work_time(self, cycle_time_mock):
-        # representing time calculation with integer operations
+        # Case 5: ratios are kept exactly, small ones included
+        self.timer.set_ratio(7.3)
+        self.assertEqual((self.timer._ratio_numerator, self.timer._ratio_denominator), (73, 10))
+        self.timer.set_ratio(0.004)
+        self.timer.start()
+        self.clock.advance(1)
+        self.assertEqual(self.timer.snapshot().rest_ns, 250 * 10 ** 9)
+
+        # Case 6: ratios that can not be kept as a positive fraction are refused, the ratio is unchanged
+        for input_ratio in (0, 1e-7, -2, float("inf"), float("nan")):
+            with self.assertRaises(ValueError):
+                self.timer.set_ratio(input_ratio)
+        self.assertEqual(self.timer.get_ratio(), 0.004)
+
+    def test_check_ratio(self):
+        self.assertEqual(check_ratio(4), 4.0)
+        self.assertEqual(check_ratio(RATIO_MIN), RATIO_MIN)
+        for ratio in (0.004, 0, 100.5, "4", True, None, float("nan")):
+            with self.assertRaises(ValueError):
+                check_ratio(ratio)
+
+    def test_transition_allowed(self):
+        # Case 1: timer methods, in the statuses they are allowed in
+        for action in ("start", "rest", "continue_work"):
+            self.assertEqual(transition_allowed(action, self.timer.status()), action == "start")
+            self.assertTrue(hasattr(self.timer, action))
+        self.timer.start()
+        self.assertTrue(transition_allowed("rest", self.timer.status()))
+        self.assertFalse(transition_allowed("continue_work", self.timer.status()))
+
+        # Case 2: reset is always allowed, the table is keyed by TimerStatus
+        for status in TimerStatus:
+            self.assertTrue(transition_allowed("reset", str(status)))
+        self.assertTrue(all(isinstance(status, TimerStatus) for allowed in TRANSITIONS.values() if allowed
+                            for status in allowed))
+
+    def test_calculate_cycle_time(self):
+        self.timer._cycle_start = 3
+        self.clock.advance_ns(5)
+
+        # Case 1: reading the clock
+        self.assertEqual(self.timer._calculate_cycle_time(), 2)
+
+        # Case 2: passed time is used instead of the clock
+        self.assertEqual(self.timer._calculate_cycle_time(10), 7)
+
+    def test_status(self):
+        # Case 1: labels are returned for the internal status
+        self.assertEqual(self.timer.status(), "Not started")
+        self.timer._status = TimerStatus.WORKING
+        self.assertEqual(self.timer.status(), "Working")
+        self.timer._status = TimerStatus.RESTING
+        self.assertEqual(self.timer.status(), "Resting")
+
+        # Case 2: str() of the enum gives the label
+        self.assertEqual(str(TimerStatus.RESTING), "Resting")
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.timer, "__dict__"))
+        with self.assertRaises(AttributeError):
+            self.timer.unknown_attribute = 1
+
+    def test_work_time(self):
         # Case 1: Working
-        self.timer._status = "Working"
-        self.timer._saved_work = 0
-        value_for_mock = 5
-        expected = self.timer._saved_work + value_for_mock
-
-        output = self.timer.work_time()
+        self.timer._status = TimerStatus.WORKING
+        self.timer._saved_work = 4
+        self.timer._cycle_start = 0
+        self.clock.advance_ns(5)
 
-        self.assertEqual(output, expected)
-        cycle_time_mock.assert_called_once()
+        self.assertEqual(self.timer.work_time_ns(), 9)
 
         # Case 2: Resting
-        self.timer._status = "Resting"
-        expected = self.timer._saved_work
-
-        output = self.timer.work_time()
-
-        self.assertEqual(output, expected)
-        cycle_time_mock.assert_called_once()
+        self.timer._status = TimerStatus.RESTING
+        self.assertEqual(self.timer.work_time_ns(), 4)
 
         # Case 3: No cycle is ongoing
-        self.timer._status = "Not started"
-        expected = self.timer._saved_work
-        output = self.timer.work_time()
-        self.assertEqual(output, expected)
-        cycle_time_mock.assert_called_once()
+        self.timer._status = TimerStatus.NOT_STARTED
+        self.assertEqual(self.timer.work_time_ns(), 4)
+
+        # Case 4: timedelta at the API edge
+        self.timer._saved_work = 1_500_000_000
+        self.assertEqual(self.timer.work_time(), timedelta(seconds=1.5))
 
-    @patch('rationalbreaks.timers.RatioNalTimer._calculate_cycle_time')
-    def test_save_cycle_work(self, cycle_time_mock):
-        # representing time calculation with integer operations
+    def test_save_cycle_work(self):
         self.timer._saved_work = 3
-        value_for_mock = 5
-        cycle_time_mock.return_value = value_for_mock
-        expected = value_for_mock + self.timer._saved_work
+        self.timer._cycle_start = 0
+        self.clock.advance_ns(5)
 
         self.timer._save_cycle_work()
 
-        self.assertEqual(self.timer._saved_work, expected)
+        self.assertEqual(self.timer._saved_work, 8)
 
-    @patch('rationalbreaks.timers.RatioNalTimer._calculate_remaining_rest')
-    @patch('rationalbreaks.timers.RatioNalTimer._calculate_cycle_time')
-    def test_rest_time(self, mock_cycle_time, mock_remaining_rest):
-        # representing time calculation with integer operations
+    def test_rest_time(self):
         # Case 1: Working
-        self.timer._status = "Working"
+        self.timer._status = TimerStatus.WORKING
         self.timer._saved_rest = 3
-        value_for_time_mock = 5
-        mock_cycle_time.return_value = value_for_time_mock
-        expected = self.timer._saved_rest + value_for_time_mock / self.timer._ratio
+        self.timer._cycle_start = 0
+        self.clock.advance_ns(6)
 
-        output = self.timer.rest_time()
-
-        self.assertEqual(output, expected)
-        mock_cycle_time.assert_called_once()
-        mock_remaining_rest.assert_not_called()
+        self.assertEqual(self.timer.rest_time_ns(), 3 + 6 // 3)
 
         # Case 2: Resting
-        self.timer._status = "Resting"
-        self.timer._saved_rest = 3
-        value_for_time_mock = 5
-        mock_remaining_rest.return_value = value_for_time_mock
-        expected = value_for_time_mock
+        self.timer._status = TimerStatus.RESTING
+        self.assertEqual(self.timer.rest_time_ns(), 0)
+        self.timer._saved_rest = 9
+        self.assertEqual(self.timer.rest_time_ns(), 3)
 
-        output = self.timer.rest_time()
+        # Case 3: Not in cycle
+        self.timer._status = TimerStatus.NOT_STARTED
+        self.assertEqual(self.timer.rest_time_ns(), 9)
 
-        self.assertEqual(output, expected)
-        mock_cycle_time.assert_called_once()
-        mock_remaining_rest.assert_called_once()
+        # Case 4: timedelta at the API edge, integer division of work by ratio
+        self.timer._status = TimerStatus.WORKING
+        self.timer._saved_rest = 0
+        self.timer.set_ratio(1.5)
+        self.clock.advance(3)
+        self.assertEqual(self.timer.rest_time(), timedelta(seconds=2))
 
-        # Case 3: Not in cycle
-        self.timer._status = "Not started"
-        expected = self.timer._saved_rest
-        output = self.timer.rest_time()
-        self.assertEqual(output, expected)
-        mock_cycle_time.assert_called_once()
-        mock_remaining_rest.assert_called_once()
+    def test_calculate_remaining_rest(self):
+        self.timer._cycle_start = 0
+        self.clock.advance_ns(5)
 
-    @patch('rationalbreaks.timers.RatioNalTimer._calculate_cycle_time')
-    @patch('rationalbreaks.timers.timedelta')
-    def test_calculate_remaining_rest(self, mock_timedelta, mock_cycle_time):
-        # representing time calculation with integer operations
         # Case 1: More saved rest available than what got consumed in the cycle
         self.timer._saved_rest = 9
-        value_for_mock = 5
-        value_for_timedelta_mock = 0
-        mock_cycle_time.return_value = value_for_mock
-        mock_timedelta.return_value = value_for_timedelta_mock
-        expected = self.timer._saved_rest - value_for_mock
+        self.assertEqual(self.timer._calculate_remaining_rest(), 4)
 
-        output = self.timer._calculate_remaining_rest()
-
-        self.assertEqual(output, expected)
-        mock_cycle_time.assert_called_once()
-        mock_timedelta.assert_called_once()
-
-        # Case 1: Less saved rest available than what got consumed in the cycle
+        # Case 2: Less saved rest available than what got consumed in the cycle
         self.timer._saved_rest = 3
-        value_for_mock = 5
-        value_for_timedelta_mock = 0
-        mock_cycle_time.return_value = value_for_mock
-        mock_timedelta.return_value = value_for_timedelta_mock
-        expected = value_for_timedelta_mock
+        self.assertEqual(self.timer._calculate_remaining_rest(), 0)
 
-        output = self.timer._calculate_remaining_rest()
+    def test__save_cycle_rest(self):
+        self.timer._status = TimerStatus.WORKING
+        self.timer._saved_rest = 1
+        self.timer._cycle_start = 0
+        self.clock.advance_ns(9)
 
-        self.assertEqual(output, expected)
-        self.assertEqual(mock_cycle_time.call_count, 2)
-        self.assertEqual(mock_timedelta.call_count, 3)
-
-    @patch('rationalbreaks.timers.RatioNalTimer.rest_time')
-    def test__save_cycle_rest(self, mock_rest_time):
-        value_for_mock = "mock_time"
-        mock_rest_time.return_value = value_for_mock
         self.timer._save_cycle_rest()
-        expected = value_for_mock
 
-        self.assertEqual(self.timer._saved_rest, expected)
-        mock_rest_time.assert_called_once()
+        self.assertEqual(self.timer._saved_rest, 4)
 
     @patch('rationalbreaks.timers.SimpleTime')
     @patch('rationalbreaks.timers.RatioNalTimer.work_time')
@@ -275,8 +269,6 @@ class TestRationalTimer(TestCase):
         value_for_mock_work = "time1"
         value_for_mock_rest = "time2"
         value_for_mock_smpltm = ("smptime")
-        # mock_smpltm_instance = MagicMock()
-        # mock_smpltm_instance.__init__.return_value = value_for_mock_smpltm
         mock_smpltm.return_value = value_for_mock_smpltm
         mock_rest_time.return_value = value_for_mock_rest
         mock_work_time.return_value = value_for_mock_work
@@ -300,20 +292,192 @@ class TestRationalTimer(TestCase):
         mock_smpltm.assert_any_call(value_for_mock_work)
         mock_smpltm.assert_any_call(value_for_mock_rest)
 
-    @patch('rationalbreaks.timers.timedelta')
-    def test_reset(self, mock_timedelta):
-        value_for_timedelta = "tdelta"
-        mock_timedelta.return_value = value_for_timedelta
+    def test_reset(self):
+        self.timer.start()
+        self.clock.advance_ns(30)
+        self.timer.rest()
 
         expected_status = "Not started"
 
         self.timer.reset()
 
         self.assertEqual(self.timer.status(), expected_status)
-        self.assertEqual(self.timer._cycle_timestamps, [])
-        self.assertEqual(self.timer._current_cycle_time, value_for_timedelta)
-        self.assertEqual(self.timer._saved_work, value_for_timedelta)
-        self.assertEqual(self.timer._saved_rest, value_for_timedelta)
+        self.assertEqual((self.timer._cycle_start, self.timer._cycles), (0, 0))
+        self.assertEqual(self.timer._saved_work, 0)
+        self.assertEqual(self.timer._saved_rest, 0)
+
+    def test_all_rest_consumed(self):
+        # Case 1: not started
+        self.assertFalse(self.timer.all_rest_consumed())
+
+        # Case 2: resting with rest left
+        self.timer.start()
+        self.clock.advance(30)
+        self.timer.rest()
+        self.clock.advance(9)
+        self.assertFalse(self.timer.all_rest_consumed())
+
+        # Case 3: resting, rest used up
+        self.clock.advance(1)
+        self.assertTrue(self.timer.all_rest_consumed())
+
+    def test_wall_clock_independent(self):
+        """Full cycle driven only by the virtual clock"""
+        self.timer.start()
+        self.clock.advance(timedelta(minutes=45))
+        self.assertEqual(self.timer.work_and_rest_time(use_simpletime=False),
+                         (timedelta(minutes=45), timedelta(minutes=15)))
+        self.timer.rest()
+        self.clock.advance(timedelta(minutes=10))
+        self.assertEqual(self.timer.rest_time(), timedelta(minutes=5))
+
+    def test_snapshot(self):
+        # Case 1: not started
+        snapshot = self.timer.snapshot()
+        self.assertEqual(snapshot, TimerSnapshot("Not started", 0, 0, False, 0, 0))
+
+        # Case 2: working
+        self.timer.start()
+        self.clock.advance_ns(30)
+        snapshot = self.timer.snapshot()
+        self.assertEqual((snapshot.status, snapshot.work_ns, snapshot.rest_ns), ("Working", 30, 10))
+        self.assertFalse(snapshot.rest_consumed)
+        self.assertEqual(snapshot.cycles, 1)
+        self.assertEqual(snapshot.taken_at_ns, 30)
+
+        # Case 3: resting, rest used up
+        self.timer.rest()
+        self.clock.advance_ns(15)
+        snapshot = self.timer.snapshot()
+        self.assertEqual((snapshot.status, snapshot.work_ns, snapshot.rest_ns), ("Resting", 30, 0))
+        self.assertTrue(snapshot.rest_consumed)
+        self.assertEqual(snapshot.cycles, 2)
+
+    def test_snapshot_single_clock_read(self):
+        mock_clock = Mock()
+        mock_clock.now_ns.return_value = 0
+        timer = RatioNalTimer(clock=mock_clock)
+        timer.start()
+        mock_clock.now_ns.reset_mock()
+
+        timer.snapshot().work_and_rest_time()
+
+        mock_clock.now_ns.assert_called_once()
+
+    def test_history(self):
+        history = CycleHistory(capacity=3)
+        timer = RatioNalTimer(clock=self.clock, history=history)
+        timer.start()
+        self.clock.advance_ns(30)
+        timer.rest()
+        self.clock.advance_ns(5)
+        timer.continue_work()
+        self.clock.advance_ns(1)
+        timer.reset()
+
+        self.assertIs(timer.history(), history)
+        self.assertEqual(list(history), [(30, TimerStatus.RESTING), (35, TimerStatus.WORKING),
+                                         (36, TimerStatus.NOT_STARTED)])
+        self.assertEqual(history.dropped, 1)
+
+    def test_export_and_load_state(self):
+        self.timer.set_ratio(2)
+        self.timer.start()
+        self.clock.advance_ns(40)
+        self.timer.rest()
+        self.clock.advance_ns(5)
+
+        state = self.timer.export_state()
+        self.assertEqual(state, {"status": 2, "ratio": 2.0, "saved_work_ns": 40, "saved_rest_ns": 20,
+                                 "cycles": 2, "cycle_elapsed_ns": 5})
+
+        # Case 1: loaded on a clock with a different origin
+        other_clock = VirtualClock(start_ns=1000)
+        scheduler = DeadlineScheduler(clock=other_clock.now_ns, autostart=False)
+        restored = RatioNalTimer(clock=other_clock, scheduler=scheduler)
+        restored.load_state(state)
+        self.assertEqual(restored.snapshot().rest_ns, 15)
+        self.assertEqual(restored.export_state(), state)
+
+        # Case 2: a resting timer registers its remaining rest
+        self.assertEqual(restored._rest_deadline.when, 1015)
+
+    def test_pickle(self):
+        self.timer.start()
+        self.clock.advance_ns(30)
+        restored = pickle.loads(pickle.dumps(self.timer))
+        self.assertEqual(restored.work_time_ns(), 30)
+
+
+class TestTimerSnapshot(TestCase):
+    def setUp(self):
+        self.snapshot = TimerSnapshot("Working", 90_000_000_000, 30_000_000_000, False, 1, 5)
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.snapshot.status = "Resting"
+        with self.assertRaises(AttributeError):
+            del self.snapshot.work_ns
+        self.assertFalse(hasattr(self.snapshot, "__dict__"))
+
+    def test_work_and_rest_time(self):
+        # Case 1: timedelta
+        self.assertEqual(self.snapshot.work_and_rest_time(use_simpletime=False),
+                         (timedelta(seconds=90), timedelta(seconds=30)))
+
+        # Case 2: SimpleTime
+        work, rest = self.snapshot.work_and_rest_time()
+        self.assertEqual((str(work), str(rest)), ("01:30:00", "00:30:00"))
+
+    def test_formatted(self):
+        self.assertEqual(self.snapshot.formatted(), ("01:30:00", "00:30:00"))
+        self.assertEqual(self.snapshot.formatted(Precision.SECONDS), ("01:30", "00:30"))
+
+
+class TestRationalTimerScheduler(TestCase):
+    """Timer registering the end of its rest on a scheduler instead of being polled"""
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.scheduler = DeadlineScheduler(clock=self.clock.now_ns, autostart=False)
+        self.callback = MagicMock()
+        self.timer = RatioNalTimer(clock=self.clock, scheduler=self.scheduler,
+                                   on_rest_consumed=self.callback)
+
+    def test_rest_registers_deadline(self):
+        self.timer.start()
+        self.clock.advance_ns(30)
+        self.timer.rest()  # 30 worked -> 10 rest
+
+        self.assertEqual(self.scheduler.pending(), 1)
+        self.assertEqual(self.timer._rest_deadline.when, 40)
+
+        # Case 1: before the deadline
+        self.clock.advance_ns(9)
+        self.scheduler.run_due()
+        self.assertFalse(self.timer.all_rest_consumed())
+        self.callback.assert_not_called()
+
+        # Case 2: after the deadline
+        self.clock.advance_ns(1)
+        self.scheduler.run_due()
+        self.assertTrue(self.timer.all_rest_consumed())
+        self.callback.assert_called_once()
+
+    def test_continue_work_and_reset_cancel(self):
+        # Case 1: continue_work
+        self.timer.start()
+        self.timer.rest()
+        self.timer.continue_work()
+        self.assertEqual(self.scheduler.pending(), 0)
+        self.assertIsNone(self.timer._rest_deadline)
+
+        # Case 2: reset
+        self.timer.rest()
+        self.timer.reset()
+        self.assertEqual(self.scheduler.pending(), 0)
+        self.clock.advance_ns(100)
+        self.scheduler.run_due()
+        self.callback.assert_not_called()
 
 
 class TestSimpleTime(TestCase):
@@ -330,7 +494,8 @@ class TestSimpleTime(TestCase):
 
         smpltm = SimpleTime(timedelta(0))
 
-        mock_slice_time.assert_called_once()
+        # units are calculated lazily, once
+        mock_slice_time.assert_not_called()
         self.assertEqual(smpltm.timedelta, timedelta(0))
         self.assertEqual(smpltm.days, value_for_mock[0])
         self.assertEqual(smpltm.hours, value_for_mock[1])
@@ -338,12 +503,38 @@ class TestSimpleTime(TestCase):
         self.assertEqual(smpltm.full_seconds, value_for_mock[3])
         self.assertEqual(smpltm.centi_seconds, value_for_mock[4])
         self.assertEqual(smpltm.seconds, expected_seconds)
+        mock_slice_time.assert_called_once()
 
     def test__slice_to_time_units(self):
-        pass
+        smpltm = SimpleTime(timedelta(days=2, hours=3, minutes=4, seconds=5, microseconds=670000))
+        self.assertEqual(smpltm._slice_to_time_units(), (2, 3, 4, 5, 67))
 
     def test__str__(self):
-        pass
+        # Case 1: under an hour
+        self.assertEqual(str(SimpleTime(timedelta(minutes=4, seconds=5, microseconds=60000))), "04:05:06")
+
+        # Case 2: hours
+        self.assertEqual(str(SimpleTime(timedelta(hours=1, minutes=4, seconds=5))), "01:04:05:00")
+
+        # Case 3: one day
+        self.assertEqual(str(SimpleTime(timedelta(days=1, hours=1, minutes=4, seconds=5))), "1 day 1:4:5:0")
+
+        # Case 4: more days
+        self.assertEqual(str(SimpleTime(timedelta(days=3, seconds=7))), "3 days 0:0:7:0")
+
+    def test_to_string(self):
+        smpltm = SimpleTime(timedelta(hours=1, minutes=4, seconds=5, microseconds=120000))
+        self.assertEqual(smpltm.to_string(), "01:04:05:12")
+        self.assertEqual(smpltm.to_string(Precision.SECONDS), "01:04:05")
+        self.assertEqual(smpltm.to_string(Precision.MINUTES), "01:04")
+
+    def test_to_timedelta(self):
+        time = timedelta(seconds=3)
+        self.assertEqual(SimpleTime(time).to_timedelta(), time)
+
+    def test_slots(self):
+        smpltm = SimpleTime(timedelta(0))
+        self.assertFalse(hasattr(smpltm, "__dict__"))
 
 
 if __name__ == '__main__':